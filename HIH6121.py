@@ -2,20 +2,22 @@
 AditNW, May 2019
 '''
 
-import smbus
-import time
+from hardware import smbus  # or the simulated bus
+import clock  # sleeps are virtual in replays
+
+import RPiUtilities
 
 
 class HIH6121sensor(object):
     def __init__(self):
         # Get I2C bus
-        self.bus = smbus.SMBus(1)
+        self.bus = RPiUtilities.lockedBus(smbus.SMBus(1))
 
     def returnTempRH(self):
         '''returns data from HIH6121
         '''
         self.bus.write_quick(0x27)
-        time.sleep(0.1)
+        clock.sleep(0.1)
 
         # HIH6130 address, 0x27(39)
         # Read data back from 0x00(00), 4 bytes
@@ -29,7 +31,7 @@ class HIH6121sensor(object):
         fTemp = cTemp * 1.8 + 32
 
         # added due to OSErrors
-        time.sleep(0.1)
+        clock.sleep(0.1)
 
         return humidity, cTemp, fTemp
 
@@ -44,4 +46,4 @@ if __name__ == '__main__':
         print('Relative Humidity :', '{:.2f}'.format(humidity), '%')
         print('Temperature in Celsius :', '{:.2f}'.format(cTemp), 'C')
         print('Temperature in Fahrenheit :', '{:.2f}'.format(fTemp), 'F')
-        time.sleep(1)
\ No newline at end of file
+        clock.sleep(1)
\ No newline at end of file
@@ -29,13 +29,14 @@ I2CBUS = 1
 #ADDRESS = 0x23
 ADDRESS = config.LCDaddress
 
-import smbus
-from time import sleep
+from hardware import smbus  # or the simulated bus
+import RPiUtilities
+from clock import sleep  # virtual in replays
 
 class i2c_device:
    def __init__(self, addr, port=I2CBUS):
       self.addr = addr
-      self.bus = smbus.SMBus(port)
+      self.bus = RPiUtilities.lockedBus(smbus.SMBus(port))
 
 # Write a single command
    def write_cmd(self, cmd):
@@ -166,6 +167,22 @@ class lcd:
     for char in string:
       self.lcd_write(ord(char), Rs)
 
+   # put pre-encoded bytes (messageCatalog) with optional char positioning
+   def lcd_display_bytes(self, data, line=1, pos=0):
+    if line == 1:
+      pos_new = pos
+    elif line == 2:
+      pos_new = 0x40 + pos
+    elif line == 3:
+      pos_new = 0x14 + pos
+    elif line == 4:
+      pos_new = 0x54 + pos
+
+    self.lcd_write(0x80 + pos_new)
+
+    for code in data:
+      self.lcd_write(code, Rs)
+
    # clear lcd and set to home
    def lcd_clear(self):
       self.lcd_write(LCD_CLEARDISPLAY)
@@ -6,11 +6,82 @@
 """
 
 import os
+import sys
+import socket
+import threading
 
 # Rev 0 - transferred from config tested with weather.py 3.5
+# Rev 0.1 - I2C bus lock shared by the LCD and the sensors
+# Rev 0.2 - system commands are only printed on simulated hardware (hardware.py)
+# Rev 0.3 - stationId, a name unique to the RPi
 
 #### RPI UTILITIES ####
 
+# the LCD (screens) and the sensors (acquisition thread) share I2C bus 1
+i2cLock = threading.RLock()
+
+# PONTIS_HARDWARE=simulated runs on a laptop: no sudo, no shutting it down
+SIMULATED = os.environ.get('PONTIS_HARDWARE', 'pi') == 'simulated'
+
+
+class lockedBus():
+    '''smbus.SMBus with each call made while holding i2cLock
+    '''
+    def __init__(self, bus):
+        self.bus = bus
+
+    def __getattr__(self, name):
+        attribute = getattr(self.bus, name)
+        if not callable(attribute):
+            return attribute
+
+        def lockedCall(*args, **kwargs):
+            with i2cLock:
+                return attribute(*args, **kwargs)
+        return lockedCall
+
+
+
+def systemCommand(command):
+    '''runs a shell command on the RPi, prints it on simulated hardware
+    '''
+    if SIMULATED is True:
+        print('simulated: ', command)
+        return
+    os.system(command)
+
+
+def stationId():
+    '''host name and the last 8 digits of the RPi serial number: raspberrypi-1a2b3c4d
+    - /etc/machine-id off the RPi, the host name alone if neither can be read
+    '''
+    serial = ''
+    try:
+        with open('/proc/cpuinfo') as file:
+            for line in file:
+                if line.startswith('Serial'):
+                    serial = line.split(':')[1].strip()
+    except OSError:
+        pass
+    if serial.strip('0') == '':
+        try:
+            with open('/etc/machine-id') as file:
+                serial = file.readline().strip()
+        except OSError:
+            serial = ''
+    if serial == '':
+        return socket.gethostname()
+    return socket.gethostname() + '-' + serial[-8:]
+
+
+def powerOff(command):
+    '''reboot or shutdown, on simulated hardware the station process ends
+    '''
+    systemCommand(command)
+    if SIMULATED is True:
+        sys.stdout.flush()
+        os._exit(0)
+
 
 def setRTC(year, month, date, hour, minute):
     # create and send time change to RTC
@@ -19,36 +90,40 @@ def setRTC(year, month, date, hour, minute):
     #os.system('sudo hwclock --set --date="2011-08-14 16:45:05"')
     print('config input reset clock')
     print(timeEnter)
-    os.system(timeEnter)
+    systemCommand(timeEnter)
 
     # set RPI clock to RTC time (that was just set)
-    os.system('sudo hwclock -s')
+    systemCommand('sudo hwclock -s')
     print('set to: ', timeEnter)
 
 
 def shutdownRPI():
     print('RPiUtilities shutdownRPI')
-    os.system("sudo shutdown -h now")
+    powerOff("sudo shutdown -h now")
 
 
 def rebootRPI():
-    os.system("sudo reboot")
+    powerOff("sudo reboot")
 
 
 def ejectUSB(usbPath):
-    os.system('sudo umount ' + usbPath)
+    systemCommand('sudo umount ' + usbPath)
     print('usb ejected')
 
 
 def copySW(usbPath):
-    os.system('sudo cp -r ' + usbPath + '/weatherUPDATE/. /home/pi/WEATHER/')
+    systemCommand('sudo cp -r ' + usbPath + '/weatherUPDATE/. /home/pi/WEATHER/')
     print('copy WEATHER directory: ')
     print('sudo cp -r ' + usbPath + '/weatherUPDATE/. /home/pi/WEATHER/')
 
 
 def findUSB():
     '''searches rpi for usb mounted by application: usbmount
+    - PONTIS_USB_PATH is used instead if set (off the RPi)
     '''
+    if 'PONTIS_USB_PATH' in os.environ:
+        return os.environ['PONTIS_USB_PATH']
+
     driveFound = 0
     # search the 7 usb directories for the thumb drive
     for i in ('0', '1', '2', '3', '4', '5', '6', '7'):
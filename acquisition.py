@@ -0,0 +1,268 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# acquisition.py
+# Rev 0
+"""acquisition - runs the station's sampling in its own thread
+
+The screens run their own loops for minutes while a farmer reads them, so
+the sensor reads, rain and solar totals and the hourly records are done by
+a thread calling tick(slotTime) once per slot (1 second), on the wall
+clock second boundary. Nothing done on the screens changes that cadence.
+
+A slot is missed when a tick runs past the next slot boundary; missed slots
+are counted (missedSlots, total and since last taken) instead of being run
+late. A late tick does the 5 second work once, over the seconds since the
+last sample, and the hourly work goes by the hour changing, so a missed
+slot does not lose a sample.
+
+Self check (a menu session on a station with simulated hardware and a
+virtual clock, no hardware needed):
+    python3 acquisition.py
+"""
+
+import threading
+import traceback
+
+import clock
+# Rev 0 - first release
+
+# seconds after the slot boundary a tick starts
+SLOT_OFFSET = .02
+# most seconds a late tick makes up, a longer gap (or one back) is the
+# clock set or stepped, not missed slots
+MAX_LATE_SECONDS = 30
+
+
+class acquisitionThread(threading.Thread):
+    '''calls tick(slotTime) every period seconds until stop()
+    '''
+    def __init__(self, tick, period=1.0, debugON=False):
+        threading.Thread.__init__(self, name='acquisition', daemon=True)
+        self.tick = tick
+        self.period = period
+        self.debugON = debugON
+        self.stopEvent = threading.Event()
+
+        self.ticks = 0
+        self.missedSlots = 0
+        self.missedSinceTaken = 0
+        self.errors = 0
+        self.lastSlot = None
+
+    def run(self):
+        while not self.stopEvent.is_set():
+            # wait for the next slot boundary (returns early on stop)
+            now = clock.time()
+            if self.stopEvent.wait(self.period - (now % self.period) + SLOT_OFFSET * self.period):
+                break
+            self.runSlot(int(clock.time() // self.period))
+
+    def runSlot(self, slot):
+        '''ticks slot, counting the slots missed since the last one
+        - run() calls it at each boundary, a replay calls it on a virtual clock
+        '''
+        if self.lastSlot is not None:
+            if slot == self.lastSlot:
+                return  # woke early
+            if slot > self.lastSlot + 1:
+                # late, or the clock was set forward
+                self.missedSlots += slot - self.lastSlot - 1
+                self.missedSinceTaken += slot - self.lastSlot - 1
+        self.lastSlot = slot
+
+        try:
+            self.tick(slot * self.period)
+        except Exception:
+            # keep sampling, one bad read must not stop the station
+            self.errors += 1
+            if self.debugON == True: traceback.print_exc()
+        self.ticks += 1
+
+    def stop(self, timeout=None):
+        self.stopEvent.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def takeMissed(self):
+        '''missed slots since the last call (for the hourly record)
+        '''
+        missed = self.missedSinceTaken
+        self.missedSinceTaken = 0
+        return missed
+
+
+if __name__ == '__main__':
+    # a 10 minute menu session on a weatherStation (simulated hardware, virtual
+    # clock): rain, irrigation, MX, clock set and sensor test screens driven by
+    # button presses, round after round across an hour boundary, with the
+    # acquisition ticked at each boundary
+    import io
+    import math
+    import tempfile
+    import contextlib
+
+    import replay
+    import weather
+    import hardware
+    import RPiUtilities
+
+    READ_TIME = .001  # seconds of a screen loop pass, charged at each clock read
+    PRESS_TIME = .2  # seconds a button is held
+    PRESS_GAP = 1.5  # seconds between presses
+    SESSION_SECONDS = 600
+    buttonPins = {1: 33, 2: 31, 3: 29}
+    ANEMOMETER_PIN = 18
+    RAIN_GAGE_PIN = 16
+
+    def lockHeld(lock):
+        '''True if any thread holds lock (asked from another thread, an RLock lets its owner in again)
+        '''
+        free = []
+
+        def tryLock():
+            if lock.acquire(blocking=False):
+                lock.release()
+                free.append(True)
+        thread = threading.Thread(target=tryLock)
+        thread.start()
+        thread.join()
+        return free == []
+
+    class sessionClock(clock.virtualClock):
+        '''virtual time of a menu session on the main thread
+        - each clock read of a screen loop takes READ_TIME plus the LCD bus time of what it wrote
+        - the acquisition ticks at each slot boundary in the screens' time (their sleeps
+          too), after the I2C bus and data locks are free, on its own slept time
+        '''
+        def __init__(self, startTime, station):
+            clock.virtualClock.__init__(self, startTime)
+            self.station = station
+            self.presses = []  # (time, pin, level)
+            self.pressed = 0
+            self.ticking = False
+            self.busSeconds = station.mylcd.cost()[1]
+
+        def press(self, buttons):
+            '''presses buttons one after the other, PRESS_GAP apart from now
+            '''
+            at = self.current
+            self.pressed += len(buttons)
+            for button in buttons:
+                at += PRESS_GAP
+                self.presses.append((at, buttonPins[button], True))
+                self.presses.append((at + PRESS_TIME, buttonPins[button], False))
+            self.presses.sort()
+
+        def pulses(self, pin, times):
+            '''sensor pulses at times, not presses
+            '''
+            for at in times:
+                self.presses.append((at, pin, True))
+                self.presses.append((at + .05, pin, False))
+            self.presses.sort()
+
+        def now(self):
+            if self.ticking is False:
+                busSeconds = self.station.mylcd.cost()[1]
+                self.runUntil(self.current + READ_TIME + busSeconds - self.busSeconds)
+                self.busSeconds = busSeconds
+            return clock.virtualClock.now(self)
+
+        def sleep(self, seconds):
+            if seconds <= 0:
+                return
+            if self.ticking is True:
+                # a sensor wait, the GPIO callbacks still see the presses
+                self.pressUntil(self.current + seconds)
+            else:
+                self.runUntil(self.current + seconds)
+            self.slept += seconds
+
+        def pressUntil(self, endTime):
+            while self.presses != [] and self.presses[0][0] <= endTime:
+                at, pin, level = self.presses.pop(0)
+                self.current = max(self.current, at)
+                hardware.station.GPIO.setLevel(pin, level)
+            self.current = max(self.current, endTime)
+
+        def runUntil(self, endTime):
+            '''the presses and slot boundaries up to endTime, in time order
+            '''
+            while True:
+                slotTime = math.floor(self.current - SLOT_OFFSET) + 1 + SLOT_OFFSET
+                if self.presses != [] and self.presses[0][0] <= min(slotTime, endTime):
+                    self.pressUntil(self.presses[0][0])
+                elif slotTime <= endTime:
+                    self.current = max(self.current, slotTime)
+                    if lockHeld(RPiUtilities.i2cLock) or lockHeld(self.station.dataLock):
+                        break  # the tick waits for the screen to let go
+                    self.ticking = True
+                    try:
+                        self.station.acquisition.runSlot(int(self.current))
+                    finally:
+                        self.ticking = False
+                else:
+                    break
+            self.current = max(self.current, endTime)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        station, virtual = replay.openStation(replay.syntheticStream(), replay.SYNTHETIC_START + 3600 - 40,
+            tempfile.mkdtemp(prefix='acquisition'))
+        session = sessionClock(virtual.time(), station)
+        clock.use(session)
+        startSlot = int(session.time())
+        rainTotal = weather.data.dayWeatherVariables['rainTotalDay']
+
+        # the wind pulses the acquisition takes
+        windTaken = []
+        readWind = station.readWind
+
+        def takenReadWind(sampleSeconds):
+            windTaken.append(station.windCounter)
+            readWind(sampleSeconds)
+        station.readWind = takenReadWind
+
+        rounds = 0
+        while int(session.time()) - startSlot < SESSION_SECONDS:
+            rounds += 1
+            # rain screen, out with button 1
+            session.press([1])
+            station.rainScreen()
+            # irrigation pages (4 crops), then partial irrigation (5 s message)
+            session.press([1, 1, 1, 1])
+            station.irrigation()
+            session.press([3])
+            station.Iirrigated()
+            comment = station.comment
+            # MX: down to timing, next phase, up to set clock, clock set (year up,
+            # through the fields, exit without setting), down to the anemometer and
+            # rain gage test pages, 3 pulses on each, on round to QUITE MX (back
+            # through the anemometer page would start its count again)
+            buttons = [3] * 10 + [1] + [2] * 6 + [1] + [3, 1, 1, 1, 1, 1, 2] + [3, 3] + [3] * 6 + [1]
+            anemometerAt = session.current + 26 * PRESS_GAP
+            session.press(buttons)
+            session.pulses(ANEMOMETER_PIN, [anemometerAt + .5, anemometerAt + .9, anemometerAt + 1.3])
+            rainGageAt = anemometerAt + PRESS_GAP
+            session.pulses(RAIN_GAGE_PIN, [rainGageAt + .5, rainGageAt + .9, rainGageAt + 1.3])
+            station.MXscreenSelect(0)
+            # the last button let go
+            session.sleep(PRESS_TIME)
+        endSlot = int(session.time())
+
+    slots = endSlot - startSlot
+    acquisition = station.acquisition
+    print('session', slots, 's,', rounds, 'rounds: ticks', acquisition.ticks, ', missed slots',
+        acquisition.missedSlots, ', errors', acquisition.errors, ', presses left', len(session.presses))
+    assert slots >= SESSION_SECONDS
+    assert acquisition.missedSlots == 0 and acquisition.errors == 0
+    assert acquisition.ticks in (slots, slots + 1)
+    assert session.presses == [] and 'Partial Irrigation/' in comment
+    # the screens were left by their buttons, not their time outs (the 5 s is the irrigation message)
+    assert slots < session.pressed * PRESS_GAP + (5 + 3) * rounds
+    # the test pages counted their pulses, none went to the wind and rain data
+    print('rain gage test count', station.sensorTestCounter, ', wind pulses taken', sum(windTaken),
+        ', rain', weather.data.dayWeatherVariables['rainTotalDay'] - rainTotal)
+    assert station.sensorTest is None and station.sensorTestCounter == 3
+    assert sum(windTaken) == 0 and station.rainCounter == 0
+    assert weather.data.dayWeatherVariables['rainTotalDay'] == rainTotal
+    print('no missed slots')
@@ -0,0 +1,395 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# benchmarks.py
+# Rev 0
+"""benchmarks - sensor to record timings of the station on simulated hardware
+
+The station is built by replay.openStation (simulated hardware, virtual
+clock), so the sensor drivers' conversion waits and the LCD delays take
+no wall time. Each benchmark records what the station's own code costs:
+
+    seconds   wall seconds (fastest of the repeats)
+    slept     virtual seconds the call waited (conversion and LCD delays)
+    bytes     bytes sent to the LCD
+
+Benchmarks:
+    sensors     readSolar, readTempRH, readWind, one call
+    lcd         main screen full redraw, single field (clock), on the
+                virtual display and through the PCF8574 driver
+    penman      penmanMonteith, one hour, and penmanMonteithArray, a year
+    files       writePeriodDataLine, getRainList(6), getFileSummary on 1, 5
+                and 10 year weatherData/weatherHistory files, live (one
+                file) and archived (dataArchive partitions)
+    tick        acquisition ticks over 6 station hours: every second,
+                the 5 second sample and the hourly period actions
+
+A baseline (benchmarks.json) keeps each value with its threshold, the
+ratio of baseline it may reach before it is a regression. Timings get
+THRESHOLD_SECONDS, the counted values THRESHOLD_COUNTS; thresholds edited
+in the file are kept when the baseline is written again.
+
+A busy machine or a throttled RPi would show as a regression, so every
+timing is scaled to the machine's best speed: calibrationWork (plain
+Python) is timed before each repeat. The baseline comparison scales again
+by the calibration of the baseline, for a baseline from another machine.
+
+    python3 benchmarks.py             run, compare with the baseline
+    python3 benchmarks.py baseline    run, write the baseline
+Exit status 1 if anything regressed. Baselines are per machine: write one
+on the RPi for the station numbers.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import statistics
+import contextlib
+from datetime import datetime, timedelta
+
+# the station modules take the simulated hardware, imported after this
+os.environ['PONTIS_HARDWARE'] = 'simulated'
+
+import clock
+import config
+import displays
+import dataArchive
+import recordCheck
+import waterBalance
+import replay
+
+# Rev 0 - first release
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks.json')
+
+# a value is a regression above baseline * threshold
+THRESHOLD_SECONDS = 1.5
+THRESHOLD_COUNTS = 1.0
+
+REPEATS = 7
+FILE_YEARS = (1, 5, 10)
+TICK_HOURS = 6
+
+
+#### MEASURING ####
+def calibrationWork():
+    '''plain Python work, the speed of the machine
+    '''
+    total = 0
+    for number in range(1000):
+        total += number * number % 7
+    return total
+
+
+def calibrationTime(calls=20):
+    start = time.perf_counter()
+    for call in range(calls):
+        calibrationWork()
+    return (time.perf_counter() - start) / calls
+
+
+# seconds of calibrationWork at the machine's best speed, set by runBenchmarks
+calibration = None
+
+
+def timeCalls(function, calls, repeats=REPEATS):
+    '''wall seconds of one call, and virtual seconds slept by one call
+    - each repeat is scaled by calibrationWork timed just before it, to the
+      machine's best speed, and the fastest repeat is kept
+    '''
+    sleptStart = getattr(clock.current, 'slept', 0.0)
+    results = []
+    for repeat in range(repeats):
+        scale = calibration / calibrationTime() if calibration is not None else 1.0
+        start = time.perf_counter()
+        for call in range(calls):
+            function()
+        results.append(min(scale, 1.0) * (time.perf_counter() - start) / calls)
+    slept = (getattr(clock.current, 'slept', 0.0) - sleptStart) / (calls * repeats)
+    return min(results), slept
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+#### BENCHMARKS ####
+def benchCalibration():
+    '''calibrationWork at the machine's best speed (fastest of many)
+    '''
+    global calibration
+    calibration = min(calibrationTime() for repeat in range(50))
+    return {'calibration seconds': calibration}
+
+
+def benchSensors(station):
+    '''one call of each sensor read
+    '''
+    results = {}
+    for name, function in (
+            ('readSolar', station.readSolar),
+            ('readTempRH', station.readTempRH),
+            ('readWind', lambda: station.readWind(5))):
+        seconds, slept = timeCalls(function, 200)
+        results['sensors ' + name + ' seconds'] = seconds
+        results['sensors ' + name + ' slept'] = slept
+    return results
+
+
+def benchLCD(station):
+    '''main screen full redraw and one field, on the virtual display and the PCF8574 driver
+    '''
+    def fullScreen():
+        station.mylcd.lcd_clear()
+        station.mainScreen()
+        station.mainScreenRefresh()
+        station.mylcd.flush()
+
+    def oneField():
+        station.clockRefresh()
+        station.mylcd.flush()
+
+    results = {}
+    savedLCD = station.mylcd
+    for displayType in ('virtual', 'pcf8574 20x4'):
+        station.mylcd = displays.openDisplay(displayType)
+        station.glyphs.mylcd = station.mylcd
+        station.glyphs.clear()
+        name = 'lcd ' + displayType.split()[0]
+        for screen, function in (('full screen', fullScreen), ('one field', oneField)):
+            seconds, slept = timeCalls(function, 20)
+            results[name + ' ' + screen + ' seconds'] = seconds
+            results[name + ' ' + screen + ' slept'] = slept
+            if displayType == 'virtual':
+                station.mylcd.reset()
+                function()
+                results[name + ' ' + screen + ' bytes'] = station.mylcd.cost()[0]
+    station.mylcd = savedLCD
+    station.glyphs.mylcd = savedLCD
+    station.glyphs.clear()
+    return results
+
+
+def benchPenman():
+    '''one hour (scalar), a year of hours (NumPy, skipped without it)
+    '''
+    results = {}
+    seconds, slept = timeCalls(lambda: waterBalance.penmanMonteith(25.0, 60.0, 8.0, 60000.0), 2000)
+    results['penman scalar hour seconds'] = seconds
+    try:
+        import numpy as np
+    except ImportError:
+        return results
+    hours = np.arange(8760)
+    temp = 20 + 8 * np.sin(hours * 2 * np.pi / 24)
+    RH = 60 - 20 * np.sin(hours * 2 * np.pi / 24)
+    wind = 5 + 3 * np.cos(hours * 2 * np.pi / 24)
+    lux = np.maximum(0, 90000 * np.sin((hours % 24 - 6) * np.pi / 12))
+    seconds, slept = timeCalls(lambda: waterBalance.penmanMonteithArray(temp, RH, wind, lux), 20)
+    results['penman batched year seconds'] = seconds
+    return results
+
+
+def writeStationFiles(usbPath, years, endTime):
+    '''weatherData and weatherHistory of years up to endTime, stamped and indexed
+    '''
+    import weather
+    data = weather.data
+    start = datetime.fromtimestamp(endTime) - timedelta(days=365 * years)
+    start = start.replace(minute=0, second=0, microsecond=0)
+
+    hours = int((datetime.fromtimestamp(endTime) - start).total_seconds() // 3600)
+    with open(usbPath + '/' + config.dataFileName, 'w') as file:
+        file.write('DateTime,' + ''.join(label + ',' for label in data.periodLabels) + '\n')
+        for hour in range(1, hours):
+            now = start + timedelta(hours=hour)
+            line = '{:%Y-%m-%d:%_H:%M}'.format(now) + ','
+            line = line + '{},{},{},{},{},{},'.format(20 + now.hour % 10, 60 - now.hour, hour % 3, 3, 5, 1000 * now.hour)
+            line = line + '0.250,' + '{:.3f}'.format(hour % 20) + ',/,'
+            file.write(recordCheck.stampRecord(line))
+
+    with open(usbPath + '/' + config.historyFileName, 'w') as file:
+        file.write('DateTime,' + ''.join(label + ',' for label in data.dayLabels) + '\n')
+        for day in range(hours // 24):
+            line = '{:%Y-%m-%d}'.format(start + timedelta(days=day)) + ','
+            line = line + '30,20,90,40,{},8,1,15,20000,'.format(day % 7)
+            file.write(recordCheck.stampRecord(line))
+
+    for fileName in (config.dataFileName, config.historyFileName):
+        recordCheck.updateIndex(usbPath + '/' + fileName)
+
+
+def benchFiles(station, workPath):
+    '''the record writes and the MX screen reads against years of files
+    '''
+    results = {}
+    savedPath = station.usbPath
+    for years in FILE_YEARS:
+        for layout in ('live', 'archived'):
+            usbPath = os.path.join(workPath, 'usb' + str(years) + layout)
+            os.makedirs(usbPath)
+            writeStationFiles(usbPath, years, clock.time())
+            if layout == 'archived':
+                dataArchive.rotateAll(usbPath, clock.now().strftime('%Y-%m'))
+            station.usbPath = usbPath
+
+            name = 'files ' + str(years) + 'y ' + layout + ' '
+            results[name + 'writePeriodDataLine seconds'] = timeCalls(lambda: station.writePeriodDataLine(.25), 10)[0]
+            results[name + 'getRainList seconds'] = timeCalls(lambda: station.getRainList(6), 10)[0]
+            results[name + 'getFileSummary seconds'] = timeCalls(lambda: station.getFileSummary(config.dataFileName), 10)[0]
+            shutil.rmtree(usbPath)
+    station.usbPath = savedPath
+    return results
+
+
+def benchTick(station, virtual, stream):
+    '''acquisition ticks over TICK_HOURS station hours, sorted by the work they did
+    '''
+    slotTimes = {'second': [], 'five second': [], 'hour': []}
+    tick = station.acquisition.tick
+    scale = [1.0]
+
+    def timedTick(slotTime):
+        # scaled to the machine's best speed, measured every 10 minutes
+        if int(slotTime) % 600 == 0 and calibration is not None:
+            scale[0] = min(calibration / calibrationTime(), 1.0)
+        start = time.perf_counter()
+        tick(slotTime)
+        seconds = scale[0] * (time.perf_counter() - start)
+        if int(slotTime) % 3600 == 0:
+            slotTimes['hour'].append(seconds)
+        elif int(slotTime) % 5 == 0:
+            slotTimes['five second'].append(seconds)
+        else:
+            slotTimes['second'].append(seconds)
+
+    # the benchmarks before slept the clock ahead, catch up before counting
+    replay.runSlots(station, virtual, stream, virtual.time() + 1)
+    station.acquisition.tick = timedTick
+    missedSlots = station.acquisition.missedSlots
+    replay.runSlots(station, virtual, stream, virtual.time() + TICK_HOURS * 3600)
+    station.acquisition.tick = tick
+
+    results = {}
+    for kind, values in slotTimes.items():
+        results['tick ' + kind + ' median seconds'] = statistics.median(values)
+        results['tick ' + kind + ' p99 seconds'] = percentile(values, .99)
+    results['tick missed slots'] = station.acquisition.missedSlots - missedSlots
+    return results
+
+
+def runBenchmarks():
+    '''all benchmarks: {name: value}
+    '''
+    workPath = tempfile.mkdtemp(prefix='benchmarks')
+    stream = replay.syntheticStream()
+    wallClock = clock.current
+    results = benchCalibration()
+    try:
+        with open(os.path.join(workPath, 'station.log'), 'w') as log, contextlib.redirect_stdout(log):
+            station, virtual = replay.openStation(stream, replay.SYNTHETIC_START, workPath)
+            # start in the day, the light sensor has something to read
+            replay.runSlots(station, virtual, stream, replay.SYNTHETIC_START + 12 * 3600)
+            results.update(benchSensors(station))
+            results.update(benchLCD(station))
+            results.update(benchPenman())
+            results.update(benchFiles(station, workPath))
+            results.update(benchTick(station, virtual, stream))
+    finally:
+        clock.use(wallClock)
+        shutil.rmtree(workPath, ignore_errors=True)
+    return results
+
+
+#### BASELINES ####
+def defaultThreshold(name):
+    return THRESHOLD_SECONDS if name.endswith('seconds') else THRESHOLD_COUNTS
+
+
+def readBaseline(filePathName=BASELINE_FILE):
+    '''{name: {'value', 'threshold'}}, {} if there is no baseline
+    '''
+    try:
+        with open(filePathName) as file:
+            return json.load(file)['benchmarks']
+    except FileNotFoundError:
+        return {}
+
+
+def writeBaseline(results, filePathName=BASELINE_FILE):
+    '''results as the baseline, thresholds of an existing baseline are kept
+    '''
+    previous = readBaseline(filePathName)
+    benchmarks = {}
+    for name, value in results.items():
+        threshold = previous.get(name, {}).get('threshold', defaultThreshold(name))
+        benchmarks[name] = {'value': value, 'threshold': threshold}
+    with open(filePathName + '.tmp', 'w') as file:
+        json.dump({'written': clock.now().strftime('%Y-%m-%d %H:%M'), 'benchmarks': benchmarks}, file, indent=1, sort_keys=True)
+    os.replace(filePathName + '.tmp', filePathName)
+
+
+def compareBaseline(results, baseline):
+    '''regressions: {name: (value, baseline value, threshold)}
+    - lower is better for every benchmark, a zero baseline allows no increase
+    - timings are scaled by the calibration of the baseline
+    '''
+    regressions = {}
+    for name, value in results.items():
+        if name not in baseline or name == 'calibration seconds':
+            continue
+        baseValue = baseline[name]['value']
+        threshold = baseline[name]['threshold']
+        if name.endswith('seconds'):
+            value = value * speedScale(results, baseline)
+        if value > baseValue * threshold + 1e-12:
+            regressions[name] = (value, baseValue, threshold)
+    return regressions
+
+
+def speedScale(results, baseline):
+    '''baseline calibration / this calibration, 1 if either is missing
+    '''
+    if 'calibration seconds' not in baseline or 'calibration seconds' not in results:
+        return 1.0
+    return baseline['calibration seconds']['value'] / results['calibration seconds']
+
+
+def printResults(results, baseline):
+    for name in sorted(results):
+        value = results[name]
+        if name.endswith('seconds'):
+            text = '{:12.1f} us'.format(value * 1e6)
+        else:
+            text = '{:12.4g}   '.format(value)
+        if name in baseline and baseline[name]['value'] > 0 and name != 'calibration seconds':
+            if name.endswith('seconds'):
+                value = value * speedScale(results, baseline)
+            text = text + '  {:6.2f}x baseline'.format(value / baseline[name]['value'])
+        print('{:52}'.format(name), text)
+
+
+if __name__ == '__main__':
+    if not (len(sys.argv) == 1 or (len(sys.argv) == 2 and sys.argv[1] == 'baseline')):
+        print('usage: benchmarks.py [baseline]')
+        sys.exit(2)
+    baseline = readBaseline()
+    results = runBenchmarks()
+
+    printResults(results, baseline)
+    if len(sys.argv) == 2:
+        writeBaseline(results)
+        print('baseline written: ', BASELINE_FILE)
+        sys.exit(0)
+
+    if baseline == {}:
+        print('no baseline, write one with: benchmarks.py baseline')
+        sys.exit(0)
+    regressions = compareBaseline(results, baseline)
+    for name, (value, baseValue, threshold) in regressions.items():
+        print('REGRESSION', name, ': ', '{:.4g}'.format(value), ' baseline ', '{:.4g}'.format(baseValue), ' threshold x', threshold)
+    print('no regressions' if regressions == {} else str(len(regressions)) + ' regressions')
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# buttonInput.py
+# Rev 0
+"""buttonInput - button edges to timestamped events on a queue
+
+Each button has a debounce state machine fed by its GPIO edges (both
+directions) and by a timer check from the screen loops:
+
+    up --edge--> pressBounce --quiet debounceTime, pressed--> down   (press)
+                             --quiet debounceTime, released--> up
+    down --edge--> releaseBounce --quiet debounceTime, released--> up (release)
+                                 --quiet debounceTime, pressed--> down
+    down held longPressTime --> longPress, then repeat every repeatTime
+
+Events are (button, kind, time) with the time of the first edge of the
+press or release, on a thread safe queue. Nothing here sleeps: the edge
+callback only records the edge, poll() settles the timers, so a press is
+never lost while a screen is busy and the loops never wait for a button.
+
+Self check (simulated bouncing presses, no hardware):
+    python3 buttonInput.py
+"""
+
+import time
+import queue
+import threading
+from collections import namedtuple
+
+import config
+
+# Rev 0 - first release, replaces buttonState / buttonAction
+
+PRESS = 'press'
+RELEASE = 'release'
+LONG_PRESS = 'longPress'
+REPEAT = 'repeat'
+
+buttonEvent = namedtuple('buttonEvent', ('button', 'kind', 'time'))
+
+
+class debounceMachine():
+    '''debounce, long press and repeat state of one button
+    '''
+    def __init__(self, button, debounceTime, longPressTime, repeatTime):
+        self.button = button
+        self.debounceTime = debounceTime
+        self.longPressTime = longPressTime
+        self.repeatTime = repeatTime
+
+        self.state = 'up'
+        self.level = False  # last level seen, True is pressed
+        self.lastEdge = 0.0
+        self.bounceStart = 0.0
+        self.pressTime = 0.0
+        self.nextHold = None  # time of the next long press or repeat event
+        self.longPressSent = False
+
+    def edge(self, level, now):
+        '''a level change, returns the events settled before it
+        - a level steady for debounceTime before this edge counts even if
+          no poll() came in between
+        '''
+        events = self.poll(now)
+        self.level = level
+        self.lastEdge = now
+        if self.state == 'up' and level is True:
+            self.state = 'pressBounce'
+            self.bounceStart = now
+        elif self.state == 'down' and level is False:
+            self.state = 'releaseBounce'
+            self.bounceStart = now
+        return events
+
+    def poll(self, now):
+        '''settles bounces and held buttons, returns the events due by now
+        '''
+        events = []
+        if self.state in ('pressBounce', 'releaseBounce') and now - self.lastEdge >= self.debounceTime:
+            if self.level is True:
+                if self.state == 'pressBounce':
+                    events.append(buttonEvent(self.button, PRESS, self.bounceStart))
+                    self.pressTime = self.bounceStart
+                    self.nextHold = self.pressTime + self.longPressTime
+                    self.longPressSent = False
+                self.state = 'down'
+            else:
+                if self.state == 'releaseBounce':
+                    events.append(buttonEvent(self.button, RELEASE, self.bounceStart))
+                self.state = 'up'
+                self.nextHold = None
+
+        if self.state == 'down' and self.nextHold is not None and now >= self.nextHold:
+            events.append(buttonEvent(self.button, REPEAT if self.longPressSent else LONG_PRESS, self.nextHold))
+            self.longPressSent = True
+            # one repeat per poll, a late poll does not burst repeats
+            self.nextHold = max(self.nextHold + self.repeatTime, now)
+        return events
+
+
+class buttonInput():
+    '''event queue for a set of buttons
+    - buttons: {pin: button number}, readPin(pin) -> True when pressed
+    - edge(pin) is the GPIO callback (any thread), poll() runs in the screen loops
+    '''
+    def __init__(self, buttons, readPin, debounceTime=None, longPressTime=None, repeatTime=None, clock=time.monotonic):
+        if debounceTime is None:
+            debounceTime = config.buttonDebounceTime
+        if longPressTime is None:
+            longPressTime = config.buttonLongPressTime
+        if repeatTime is None:
+            repeatTime = config.buttonRepeatTime
+        self.readPin = readPin
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.events = queue.Queue()
+        self.machines = dict((pin, debounceMachine(button, debounceTime, longPressTime, repeatTime))
+            for pin, button in buttons.items())
+
+    def edge(self, pin):
+        '''GPIO callback for both edges of a button pin
+        '''
+        now = self.clock()
+        level = bool(self.readPin(pin))
+        with self.lock:
+            for event in self.machines[pin].edge(level, now):
+                self.events.put(event)
+
+    def poll(self):
+        '''settles the state machines, missed edges are caught from the pin level
+        '''
+        now = self.clock()
+        with self.lock:
+            for pin, machine in self.machines.items():
+                if machine.state in ('up', 'down'):
+                    level = bool(self.readPin(pin))
+                    if level != (machine.state == 'down'):
+                        for event in machine.edge(level, now):
+                            self.events.put(event)
+                for event in machine.poll(now):
+                    self.events.put(event)
+
+    def get(self):
+        '''next event or None, does not wait
+        '''
+        self.poll()
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        '''drops the events not yet read (entering a new screen)
+        '''
+        self.poll()
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+
+if __name__ == '__main__':
+    # presses with contact bounce on a simulated clock and pin
+    pins = {33: False}
+    now = [0.0]
+    inputs = buttonInput({33: 1}, lambda pin: pins[pin], .03, 1.0, .25, lambda: now[0])
+
+    def setLevel(level, at):
+        now[0] = at
+        if pins[33] != level:
+            pins[33] = level
+            inputs.edge(33)
+
+    # short press at 1.000 s bouncing for 5 ms, release at 1.2 s bouncing
+    for at, level in ((1.000, True), (1.001, False), (1.002, True), (1.005, True),
+            (1.200, False), (1.201, True), (1.203, False)):
+        setLevel(level, at)
+        inputs.poll()
+    # long press from 2 s to 3.6 s, polled every 10 ms
+    setLevel(True, 2.0)
+    at = 2.0
+    while at < 3.6:
+        at += .01
+        now[0] = at
+        inputs.poll()
+    setLevel(False, 3.6)
+    now[0] = 3.7
+    events = []
+    event = inputs.get()
+    while event is not None:
+        events.append((event.kind, round(event.time, 3)))
+        event = inputs.get()
+    print(events)
+    assert events[:2] == [(PRESS, 1.0), (RELEASE, 1.2)]
+    assert [kind for kind, at in events[2:]] == [PRESS, LONG_PRESS, REPEAT, REPEAT, RELEASE]
+    print('ok')
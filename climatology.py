@@ -0,0 +1,340 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# climatology.py
+# Rev 0
+"""climatology - day of year normals and anomalies for one station
+
+Every day of the station history is added to accumulators for its day of
+the year (count, sum, sum of squares and a small histogram per field):
+    rain       mm in the day
+    rainWeek   mm in the 7 days ending on the day
+    tempMax    tempMin
+    ET         mm water loss in the day (sum of the weatherData periods)
+
+Normals are smoothed over config.climatologySmoothDays either side of each
+day of the year and kept as a table of mean, standard deviation and the
+cumulative histogram, so an anomaly query is a table lookup. Adding a day
+(each midnight) only re-smooths the days of the year that window touches.
+
+The accumulators are kept in a small JSON file on the SD card. No NumPy is
+used, this runs on the station.
+
+Fleet batch mode, over the store written by ingest.py (uses all cores):
+    python3 climatology.py fleet <store dir> <out dir>
+"""
+
+import os
+import json
+import math
+from datetime import datetime, timedelta
+
+import config
+
+# Rev 0 - first release
+
+# field: (low edge, bin width, bin count) of the histogram
+climatologyFields = {
+    'rain': (0, 2, 60),
+    'rainWeek': (0, 5, 80),
+    'tempMax': (-5, 1, 55),
+    'tempMin': (-5, 1, 55),
+    'ET': (0, .25, 48)
+    }
+
+DAYS_OF_YEAR = 366
+# fewer smoothed samples than this and there is no normal
+MINIMUM_COUNT = 10
+
+
+def dayOfYear(day):
+    '''day 'YYYY-MM-DD' -> 0 to 365, Feb 29 has its own day in every year
+    '''
+    return datetime(2000, int(day[5:7]), int(day[8:10])).timetuple().tm_yday - 1
+
+
+def binNumber(field, value):
+    low, width, bins = climatologyFields[field]
+    return min(max(int((value - low) / width), 0), bins - 1)
+
+
+def rowTimestamp(timestamp):
+    '''weatherData '%Y-%m-%d:%_H:%M' (space padded hour) -> datetime
+    '''
+    return datetime.strptime(timestamp.replace(' ', '0'), '%Y-%m-%d:%H:%M')
+
+
+def waterLossByDay(dataRows):
+    '''{day: sum of 'Water loss (mm)'} of weatherData rows
+    - the midnight row closes the day before
+    '''
+    waterLoss = {}
+    for row in dataRows:
+        values = row.split(',')
+        try:
+            rowWaterLoss = float(values[7])
+            day = values[0][:10]
+            if values[0][11:] in (' 0:00', '00:00'):
+                day = (rowTimestamp(values[0]) - timedelta(minutes=1)).strftime('%Y-%m-%d')
+        except (ValueError, IndexError):
+            continue
+        waterLoss[day] = waterLoss.get(day, 0) + rowWaterLoss
+    return waterLoss
+
+
+class climatology():
+    '''per day of year accumulators and the smoothed normals table
+    '''
+    def __init__(self, filePathName, smoothDays=None):
+        self.filePathName = filePathName
+        self.smoothDays = config.climatologySmoothDays if smoothDays is None else smoothDays
+        self.lastDay = None
+        self.recentRain = []  # [day, rain] of the last 6 days, for rainWeek
+        self.accumulators = {}
+        for field in climatologyFields:
+            self.accumulators[field] = [[0, 0.0, 0.0, {}] for doy in range(DAYS_OF_YEAR)]
+
+        self.load()
+        self.normals = {}
+        for field in climatologyFields:
+            self.normals[field] = [None] * DAYS_OF_YEAR
+        self.smoothAll()
+
+    #### PERSISTENCE ####
+    def load(self):
+        try:
+            with open(self.filePathName) as file:
+                saved = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+        if saved.get('fields') != json.loads(json.dumps(climatologyFields)) or saved.get('smoothDays') != self.smoothDays:
+            # binning changed, the history has to be added again
+            return
+        self.lastDay = saved['lastDay']
+        self.recentRain = saved['recentRain']
+        for field in climatologyFields:
+            for doy, (count, total, squares, histogram) in enumerate(saved['accumulators'][field]):
+                self.accumulators[field][doy] = [count, total, squares,
+                    dict((int(key), value) for key, value in histogram.items())]
+
+    def save(self):
+        '''writes the accumulators to a temp file then renames it over the old one
+        '''
+        saved = {
+            'fields': climatologyFields,
+            'smoothDays': self.smoothDays,
+            'lastDay': self.lastDay,
+            'recentRain': self.recentRain,
+            'accumulators': self.accumulators
+            }
+        with open(self.filePathName + '.tmp', 'w') as file:
+            json.dump(saved, file, separators=(',', ':'))
+        os.replace(self.filePathName + '.tmp', self.filePathName)
+
+    #### ADDING DAYS ####
+    def accumulate(self, day, values):
+        '''adds one day to the accumulators, returns False if already added
+        - values: dictionary of field values, None or missing fields are skipped
+        '''
+        if self.lastDay is not None and day <= self.lastDay:
+            return False
+
+        values = dict(values)
+        rain = values.get('rain')
+        if rain is not None:
+            # week rain only when the 6 days before are all known
+            previousDays = [(datetime.strptime(day, '%Y-%m-%d') - timedelta(days=number)).strftime('%Y-%m-%d')
+                for number in range(6, 0, -1)]
+            if [entry[0] for entry in self.recentRain] == previousDays:
+                values['rainWeek'] = rain + sum(entry[1] for entry in self.recentRain)
+            self.recentRain = (self.recentRain + [[day, rain]])[-6:]
+        else:
+            self.recentRain = []
+
+        doy = dayOfYear(day)
+        for field in climatologyFields:
+            value = values.get(field)
+            if value is None or math.isnan(value):
+                continue
+            accumulator = self.accumulators[field][doy]
+            accumulator[0] += 1
+            accumulator[1] += value
+            accumulator[2] += value * value
+            binKey = binNumber(field, value)
+            accumulator[3][binKey] = accumulator[3].get(binKey, 0) + 1
+
+        self.lastDay = day
+        return True
+
+    def addDay(self, day, values):
+        '''midnight update: adds the day, re-smooths the days it affects, saves
+        '''
+        if self.accumulate(day, values) is False:
+            return
+        doy = dayOfYear(day)
+        for offset in range(-self.smoothDays, self.smoothDays + 1):
+            self.smooth((doy + offset) % DAYS_OF_YEAR)
+        self.save()
+
+    def addHistory(self, historyRows, dataRows):
+        '''adds weatherHistory rows (oldest first) with the day ET from weatherData rows
+        - rows are the text lines of the files, header lines are skipped
+        '''
+        waterLoss = waterLossByDay(dataRows)
+        for row in historyRows:
+            values = row.split(',')
+            try:
+                day = datetime.strptime(values[0], '%Y-%m-%d').strftime('%Y-%m-%d')
+                dayValues = {'tempMax': float(values[1]), 'tempMin': float(values[2]), 'rain': float(values[5])}
+            except (ValueError, IndexError):
+                continue
+            dayValues['ET'] = waterLoss.get(day)
+            self.accumulate(day, dayValues)
+
+        self.smoothAll()
+        self.save()
+
+    #### NORMALS ####
+    def smooth(self, doy):
+        '''rebuilds the normals of one day of the year from its window
+        normal: (count, mean, standard deviation, cumulative histogram)
+        '''
+        for field in climatologyFields:
+            bins = climatologyFields[field][2]
+            count = 0
+            total = 0.0
+            squares = 0.0
+            histogram = [0] * bins
+            for offset in range(-self.smoothDays, self.smoothDays + 1):
+                accumulator = self.accumulators[field][(doy + offset) % DAYS_OF_YEAR]
+                count += accumulator[0]
+                total += accumulator[1]
+                squares += accumulator[2]
+                for binKey, binCount in accumulator[3].items():
+                    histogram[binKey] += binCount
+
+            if count < MINIMUM_COUNT:
+                self.normals[field][doy] = None
+                continue
+            mean = total / count
+            deviation = math.sqrt(max(squares / count - mean * mean, 0))
+            cumulative = []
+            running = 0
+            for binCount in histogram:
+                running += binCount
+                cumulative.append(running)
+            self.normals[field][doy] = (count, mean, deviation, cumulative)
+
+    def smoothAll(self):
+        for doy in range(DAYS_OF_YEAR):
+            self.smooth(doy)
+
+    def normal(self, field, day):
+        '''(count, mean, standard deviation, cumulative histogram) or None
+        '''
+        return self.normals[field][dayOfYear(day)]
+
+    def percentile(self, field, day, value):
+        '''percent of normal days at or below value (mid bin)
+        '''
+        normal = self.normal(field, day)
+        if normal is None:
+            return None
+        count, mean, deviation, cumulative = normal
+        binKey = binNumber(field, value)
+        below = cumulative[binKey - 1] if binKey > 0 else 0
+        return 100.0 * (below + (cumulative[binKey] - below) / 2) / count
+
+    def anomaly(self, field, day, value):
+        '''how value compares to the normal for day, None if there is no normal
+        returns {'normal', 'difference', 'percent', 'deviations', 'percentile'}
+        '''
+        normal = self.normal(field, day)
+        if normal is None or value is None:
+            return None
+        count, mean, deviation, cumulative = normal
+        return {
+            'normal': mean,
+            'difference': value - mean,
+            'percent': None if mean == 0 else 100.0 * (value - mean) / mean,
+            'deviations': None if deviation == 0 else (value - mean) / deviation,
+            'percentile': self.percentile(field, day, value)
+            }
+
+    def normalValue(self, field, doy, fraction):
+        '''value below which fraction of the normal days fall (bin resolution)
+        '''
+        count, mean, deviation, cumulative = self.normals[field][doy]
+        low, width, bins = climatologyFields[field]
+        for binKey, running in enumerate(cumulative):
+            if running >= fraction * count:
+                return low + (binKey + .5) * width
+        return low + bins * width
+
+    def writeNormals(self, filePathName):
+        '''report: one row per day of the year with mean and p10, p50, p90 per field
+        '''
+        with open(filePathName, 'w') as file:
+            file.write('Day,')
+            for field in climatologyFields:
+                for stat in ('mean', 'p10', 'p50', 'p90'):
+                    file.write(field + ' ' + stat + ',')
+            file.write('\n')
+            for doy in range(DAYS_OF_YEAR):
+                file.write('{:%m-%d},'.format(datetime(2000, 1, 1) + timedelta(days=doy)))
+                for field in climatologyFields:
+                    if self.normals[field][doy] is None:
+                        file.write(',,,,')
+                        continue
+                    file.write('{:.1f},'.format(self.normals[field][doy][1]))
+                    for fraction in (.1, .5, .9):
+                        file.write('{:.1f},'.format(self.normalValue(field, doy, fraction)))
+                file.write('\n')
+
+
+#### FLEET BATCH ####
+def readLines(filePathName):
+    try:
+        with open(filePathName) as file:
+            return file.readlines()[1:]
+    except FileNotFoundError:
+        return []
+
+
+def buildStation(task):
+    '''worker: builds the normals of one station of an ingest store
+    '''
+    storePath, outPath, station = task
+    os.makedirs(outPath + '/' + station, exist_ok=True)
+    filePathName = outPath + '/' + station + '/climatology.json'
+    if os.path.exists(filePathName):
+        os.remove(filePathName)  # batch mode always starts from the full history
+    stationClimatology = climatology(filePathName)
+    stationClimatology.addHistory(readLines(storePath + '/' + station + '/' + config.historyFileName),
+        readLines(storePath + '/' + station + '/' + config.dataFileName))
+    stationClimatology.writeNormals(outPath + '/' + station + '/climatologyNormals.csv')
+    return station, stationClimatology.lastDay
+
+
+def buildFleet(storePath, outPath, processes=None):
+    '''builds the normals of every station in the store, in parallel
+    '''
+    import multiprocessing
+
+    stations = [station for station in sorted(os.listdir(storePath))
+        if os.path.exists(storePath + '/' + station + '/' + config.historyFileName)]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(buildStation, [(storePath, outPath, station) for station in stations])
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if len(sys.argv) == 4 and sys.argv[1] == 'fleet':
+        startTime = time.time()
+        results = buildFleet(sys.argv[2], sys.argv[3])
+        for station, lastDay in results:
+            print(station, ': to ', lastDay)
+        print(len(results), 'stations in ', '{:.2f}'.format(time.time() - startTime), 's')
+    else:
+        print('usage: climatology.py fleet <store dir> <out dir>')
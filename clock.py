@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# clock.py
+# Rev 0
+"""clock - the station's time: the wall clock, or a virtual clock for replays
+
+Every module asks here instead of datetime.now(), time.time() and
+time.sleep(), so a replay (replay.py) can run the station's period logic
+on months of virtual time:
+
+    clock.now()         datetime
+    clock.time()        epoch seconds
+    clock.monotonic()   seconds for intervals
+    clock.sleep(s)
+
+The wall clock is used unless clock.use() installs another. A virtual
+clock only moves when it is set or advanced, and a sleep advances it by
+the time slept, so the drivers' conversion waits take virtual time too.
+"""
+
+import time as wallTime
+from datetime import datetime
+
+# Rev 0 - first release
+
+
+class wallClock():
+    '''the RPi clock
+    '''
+    def now(self):
+        return datetime.now()
+
+    def time(self):
+        return wallTime.time()
+
+    def monotonic(self):
+        return wallTime.monotonic()
+
+    def sleep(self, seconds):
+        wallTime.sleep(seconds)
+
+
+class virtualClock():
+    '''time that moves only when set, advanced or slept
+    '''
+    def __init__(self, startTime):
+        self.current = float(startTime)
+        self.slept = 0.0  # virtual seconds spent in sleep()
+        self.onSleep = None  # called with the end of a sleep, to run what happens during it
+
+    def now(self):
+        return datetime.fromtimestamp(self.current)
+
+    def time(self):
+        return self.current
+
+    def monotonic(self):
+        return self.current
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            endTime = self.current + seconds
+            if self.onSleep is not None:
+                self.onSleep(endTime)
+            self.current = endTime
+            self.slept += seconds
+
+    def advance(self, seconds):
+        self.current += seconds
+
+    def advanceTo(self, epochTime):
+        '''moves to epochTime, never back
+        '''
+        self.current = max(self.current, float(epochTime))
+
+
+current = wallClock()
+
+
+def use(clock):
+    '''installs a clock for every module, returns the one it replaces
+    '''
+    global current
+    previous = current
+    current = clock
+    return previous
+
+
+def now():
+    return current.now()
+
+
+def time():
+    return current.time()
+
+
+def monotonic():
+    return current.monotonic()
+
+
+def sleep(seconds):
+    current.sleep(seconds)
@@ -0,0 +1,214 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# columnarExport.py
+# Rev 0
+"""columnarExport - one .npy file per column for the stations in an ingest store
+
+The period (weatherData) and daily (weatherHistory) data of every station in
+the store written by ingest.py is exported as:
+    columns/<station>/period/time.npy, tempCurrent.npy, ... flags.npy
+    columns/<station>/daily/time.npy, tempMax.npy, ...
+    columns/<station>/metadata.json     columns, dtypes, rows, labels, time range
+
+Columns open memory mapped, nothing is read until it is used:
+    station = columnarExport.openStation('columns', 'station001')
+    hot = station['period']['tempCurrent'] > 35
+
+A station is only exported again when its store files change.
+
+    python3 columnarExport.py export <store dir> <columns dir> [processes]
+    python3 columnarExport.py benchmark <store dir> <columns dir>
+"""
+
+import os
+import json
+
+import numpy as np
+
+import config
+import stationLoader
+
+# Rev 0 - first release
+
+metadataFileName = 'metadata.json'
+
+# export table -> store file
+tableFiles = {
+    'period': config.dataFileName,
+    'daily': config.historyFileName
+    }
+
+
+def exportStation(task):
+    '''worker: writes the column files of one station if its store changed
+    returns (station, rows written), rows written is None if unchanged
+    '''
+    storePath, outPath, station = task
+    stationPath = outPath + '/' + station
+    sources = {}
+    for table, fileName in tableFiles.items():
+        filePathName = storePath + '/' + station + '/' + fileName
+        if os.path.exists(filePathName):
+            sources[fileName] = os.path.getsize(filePathName)
+
+    try:
+        with open(stationPath + '/' + metadataFileName) as file:
+            if json.load(file)['sources'] == sources:
+                return station, None
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    metadata = {'station': station, 'sources': sources, 'tables': {}}
+    rowsWritten = 0
+    for table, fileName in tableFiles.items():
+        if fileName not in sources:
+            continue
+        rows, info = stationLoader.loadFile(storePath + '/' + station + '/' + fileName)
+        tablePath = stationPath + '/' + table
+        os.makedirs(tablePath, exist_ok=True)
+        for name in rows.dtype.names:
+            # a contiguous copy per column, so each file maps on its own
+            np.save(tablePath + '/' + name + '.tmp.npy', np.ascontiguousarray(rows[name]))
+            os.replace(tablePath + '/' + name + '.tmp.npy', tablePath + '/' + name + '.npy')
+        metadata['tables'][table] = {
+            'rows': len(rows),
+            'columns': list(rows.dtype.names),
+            'dtypes': [rows.dtype[name].str for name in rows.dtype.names],
+            'labels': info['labels'],
+            'first': str(rows['time'][0]) if len(rows) > 0 else None,
+            'last': str(rows['time'][-1]) if len(rows) > 0 else None
+            }
+        if 'flags' in rows.dtype.names:
+            metadata['tables'][table]['flags'] = list(stationLoader.commentFlags)
+        rowsWritten += len(rows)
+
+    # metadata last, an interrupted export is redone next time
+    with open(stationPath + '/' + metadataFileName + '.tmp', 'w') as file:
+        json.dump(metadata, file, indent=1, sort_keys=True)
+        file.write('\n')
+    os.replace(stationPath + '/' + metadataFileName + '.tmp', stationPath + '/' + metadataFileName)
+    return station, rowsWritten
+
+
+def exportStore(storePath, outPath, processes=None):
+    '''exports every station in the store, in parallel
+    returns [(station, rows written or None if unchanged)]
+    '''
+    import multiprocessing
+
+    stations = []
+    for station in sorted(os.listdir(storePath)):
+        for fileName in tableFiles.values():
+            if os.path.exists(storePath + '/' + station + '/' + fileName):
+                stations.append(station)
+                break
+
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(exportStation, [(storePath, outPath, station) for station in stations])
+
+
+#### READING ####
+class columnTable():
+    '''columns of one table, each opened (memory mapped) on first use
+    '''
+    def __init__(self, tablePath, metadata, mmapMode='r'):
+        self.tablePath = tablePath
+        self.metadata = metadata
+        self.mmapMode = mmapMode
+        self.columns = {}
+
+    def __getitem__(self, name):
+        if name not in self.columns:
+            if name not in self.metadata['columns']:
+                raise KeyError(name)
+            self.columns[name] = np.load(self.tablePath + '/' + name + '.npy', mmap_mode=self.mmapMode)
+        return self.columns[name]
+
+    def __len__(self):
+        return self.metadata['rows']
+
+    def keys(self):
+        return list(self.metadata['columns'])
+
+
+def stationMetadata(outPath, station):
+    with open(outPath + '/' + station + '/' + metadataFileName) as file:
+        return json.load(file)
+
+
+def openStation(outPath, station, mmapMode='r'):
+    '''{'period': columnTable, 'daily': columnTable} of one exported station
+    - mmapMode None reads the columns into memory instead
+    '''
+    metadata = stationMetadata(outPath, station)
+    tables = {}
+    for table, tableMetadata in metadata['tables'].items():
+        tables[table] = columnTable(outPath + '/' + station + '/' + table, tableMetadata, mmapMode)
+    return tables
+
+
+def openFleet(outPath, mmapMode='r'):
+    '''{station: openStation(...)} for every exported station
+    '''
+    fleet = {}
+    for station in sorted(os.listdir(outPath)):
+        if os.path.exists(outPath + '/' + station + '/' + metadataFileName):
+            fleet[station] = openStation(outPath, station, mmapMode)
+    return fleet
+
+
+def benchmark(storePath, outPath):
+    '''load times of the fleet: csv module, stationLoader, memory mapped columns
+    '''
+    import csv
+    import time
+
+    exportStore(storePath, outPath)
+    stations = sorted(openFleet(outPath))
+    results = {}
+
+    startTime = time.time()
+    for station in stations:
+        with open(storePath + '/' + station + '/' + config.dataFileName, newline='') as file:
+            reader = csv.reader(file)
+            next(reader)
+            for row in reader:
+                float(row[1])
+    results['csv module, one column'] = time.time() - startTime
+
+    startTime = time.time()
+    for station in stations:
+        rows, info = stationLoader.loadFile(storePath + '/' + station + '/' + config.dataFileName)
+    results['stationLoader, all columns'] = time.time() - startTime
+
+    startTime = time.time()
+    fleet = openFleet(outPath)
+    results['open fleet (mmap)'] = time.time() - startTime
+
+    startTime = time.time()
+    for station in stations:
+        float(fleet[station]['period']['tempCurrent'].mean())
+    results['mmap, mean of one column'] = time.time() - startTime
+
+    rowCount = sum(len(fleet[station]['period']) for station in stations)
+    return len(stations), rowCount, results
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if len(sys.argv) >= 4 and sys.argv[1] == 'export':
+        startTime = time.time()
+        results = exportStore(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else None)
+        for station, rowsWritten in results:
+            print(station, ': ', 'unchanged' if rowsWritten is None else str(rowsWritten) + ' rows')
+        print(len(results), 'stations in ', '{:.2f}'.format(time.time() - startTime), 's')
+    elif len(sys.argv) == 4 and sys.argv[1] == 'benchmark':
+        stationCount, rowCount, results = benchmark(sys.argv[2], sys.argv[3])
+        print(stationCount, 'stations, ', rowCount, 'period rows')
+        for name, seconds in results.items():
+            print('{:30s}{:8.3f} s'.format(name, seconds))
+    else:
+        print('usage: columnarExport.py export <store dir> <columns dir> [processes]')
+        print('       columnarExport.py benchmark <store dir> <columns dir>')
@@ -7,13 +7,16 @@
 
 # Rev A.0 - field test release
 
+import os
+
 debug2 = False  #for finding hang ups using syslog, lots of prints
 
 #### PREFERENCES ####
 
-# uncomment 1 language
+# uncomment 1 language (messages are in the messages directory)
 #language = "English"
 language = "Spanish"
+#language = "Miskito"
 
 # uncomment 1 land area measure
 landArea = 'manzana'
@@ -22,12 +25,44 @@ landArea = 'manzana'
 
 # file pathes (note the usb path is found with function findUSB)
 updateFilePath = '/home/pi/WEATHER/weather.py'
-SDFilePath = '/home/pi'
+SDFilePath = os.environ.get('PONTIS_SD_PATH', '/home/pi')  # set off the RPi (hardware.py)
 
 #### DATA ACQUISITION PARAMETERS ####
 # data files on usb drive
 historyFileName = 'weatherHistory.csv'
 dataFileName = 'weatherData.csv'
+# hourly phase timings (loopTiming.py), p50/p99/max of each phase
+timingFileName = 'weatherTiming.csv'
+# sampling profiler (MX 'profile' page or kill -USR1), stacks to the USB drive
+profileMinutes = 5
+profileInterval = .01  # seconds between samples
+
+# station name written to the USB drive for the ingest tool
+# (blank uses the host name and the RPi serial number, raspberrypi-1a2b3c4d)
+stationName = ''
+stationFileName = 'station.txt'
+# host names of every stock image, ingest does not merge drives by them
+genericStationNames = ('raspberrypi', 'localhost')
+
+# closed months are moved to monthly partitions in this USB directory
+archiveDirName = 'weatherArchive'
+# uncomment 1 partition compression
+archiveCompression = 'gzip'
+#archiveCompression = 'xz'
+#archiveCompression = 'none'
+
+# bytes at the end of each data file checked for torn rows at startup
+verifyTailBytes = 65536
+
+# days of 5 second samples kept in the ring file on the SD card
+# (7 days is about 3.4 MB, changing this clears the ring)
+sampleRingDays = 7
+
+# days of minute rollups kept on the SD card (hour and day rollups are kept)
+rollupMinuteDays = 2
+
+# days either side of each day of the year averaged into the climate normals
+climatologySmoothDays = 7
 
 #### WEATHER STATION PARAMETERS ####
 # radius of the anemometer vanes in centimeters
@@ -37,9 +72,16 @@ anemometerRadius = 5.7
 rainGageVolume = .4
 
 #### LCD ####
+# display backend (displays.py): 'pcf8574 20x4', 'pcf8574 16x2', 'ssd1306' or 'virtual'
+# (the screens are laid out for 20x4, a 16x2 LCD pages through them)
+displayType = 'pcf8574 20x4'
+
 # Configured I2C address (default is 0x27)
 LCDaddress = 0x23
 
+# I2C address of an SSD1306 OLED display
+OLEDaddress = 0x3C
+
 # LCD backlight off time in SECONDS
 backlightOffTime = 180
 
@@ -67,3 +109,38 @@ fHectare = 1000
 fManzana = 700
 fAcre = 400
 
+
+#### IRRIGATION PLAN ####
+# fields sharing one pump or reservoir, one per line:
+# (name, crop, growth stage 1-4, area in landArea units, yield weight)
+# crops: 'Beans', 'Corn', 'Grain', 'Citrus', 'Coffee', 'General'
+# an irrigationFields.csv file on the USB drive is used instead if there is one
+irrigationFields = (
+    #('Lote 1', 'Beans', 2, 1.0, 1.0),
+    #('Lote 2', 'Corn', 3, 2.5, 1.0),
+    )
+irrigationFieldsFileName = 'irrigationFields.csv'
+
+# liters of water available for all the fields each day
+dailyWaterBudget = 20000
+
+# yield response to water stress by growth stage (FAO 33 Ky factors)
+kyBeans = (.2, 1.1, .75, .2)
+kyCorn = (.4, 1.5, .5, .2)
+kyGrain = (.2, .6, .5, .2)
+kyCitrus = 1.0
+kyCoffee = 1.0
+kyGeneral = 1.0
+
+#### WATER LOSS FORECAST ####
+# hours the water loss forecast looks ahead
+forecastHours = 72
+# mm of waterLoss when the forecast says irrigation is needed
+forecastIrrigationDeficit = 12
+
+#### BUTTONS ####
+# seconds a button must be steady to count as pressed or released
+buttonDebounceTime = .03
+# seconds held for a long press, then seconds between repeats
+buttonLongPressTime = 1.0
+buttonRepeatTime = .25
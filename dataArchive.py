@@ -0,0 +1,311 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# dataArchive.py
+# Rev 0
+"""dataArchive - monthly partitions of the USB data files for weather.py
+
+The live weatherData.csv and weatherHistory.csv only hold the current month.
+Closed months are moved into the archive directory on the USB drive, one
+compressed partition per file per month, and listed in a small manifest:
+
+    weatherArchive/manifest.json
+    weatherArchive/weatherData_2019-10.csv.gz
+    weatherArchive/weatherHistory_2019-10.csv.gz
+
+use exportLegacy to put the partitions back together as a single file.
+"""
+
+import os
+import json
+import gzip
+import lzma
+import zlib
+
+import config
+
+# Rev 0 - first release with monthly partitions
+
+#### ARCHIVE LAYOUT ####
+manifestFileName = 'manifest.json'
+
+compressionSuffix = {
+    'gzip': '.gz',
+    'xz': '.xz',
+    'none': ''
+    }
+
+
+def archivePath(usbPath):
+    '''directory holding the partitions and manifest
+    '''
+    return usbPath + '/' + config.archiveDirName
+
+
+def partitionName(fileName, month, compression):
+    '''weatherData.csv + 2019-10 -> weatherData_2019-10.csv.gz
+    '''
+    base, extension = os.path.splitext(fileName)
+    return base + '_' + month + extension + compressionSuffix[compression]
+
+
+def openPartition(filePathName, mode='rt', compression=None):
+    '''opens a partition with the matching (de)compressor
+    - compression is taken from the file suffix unless given
+    '''
+    if compression is None:
+        if filePathName.endswith('.gz'):
+            compression = 'gzip'
+        elif filePathName.endswith('.xz'):
+            compression = 'xz'
+        else:
+            compression = 'none'
+
+    # newline only applies to text mode
+    options = {} if 'b' in mode else {'newline': ''}
+    if compression == 'gzip':
+        return gzip.open(filePathName, mode, **options)
+    elif compression == 'xz':
+        return lzma.open(filePathName, mode, **options)
+    else:
+        return open(filePathName, mode.replace('t', ''), **options)
+
+
+def fileChecksum(filePathName):
+    '''crc32 of the bytes stored on the drive (compressed if compressed)
+    '''
+    checksum = 0
+    with open(filePathName, 'rb') as file:
+        for block in iter(lambda: file.read(65536), b''):
+            checksum = zlib.crc32(block, checksum)
+    return '{:08x}'.format(checksum)
+
+
+#### MANIFEST ####
+def readManifest(usbPath):
+    '''returns the manifest dictionary, {'partitions': []} if there is none yet
+    '''
+    filePathName = archivePath(usbPath) + '/' + manifestFileName
+    try:
+        with open(filePathName) as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        manifest = {'partitions': []}
+    return manifest
+
+
+def writeManifest(usbPath, manifest):
+    '''writes manifest to a temp file then renames it over the old one
+    '''
+    filePathName = archivePath(usbPath) + '/' + manifestFileName
+    with open(filePathName + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+        file.write('\n')
+    os.replace(filePathName + '.tmp', filePathName)
+
+
+def partitionsFor(usbPath, fileName, start=None, end=None, manifest=None):
+    '''manifest entries for fileName that overlap start to end, oldest first
+    - start and end are timestamps as written in the file, compared as strings
+    '''
+    if manifest is None:
+        manifest = readManifest(usbPath)
+    entries = []
+    for entry in manifest['partitions']:
+        if entry['source'] != fileName:
+            continue
+        if start is not None and entry['last'] < start:
+            continue
+        if end is not None and entry['first'] > end:
+            continue
+        entries.append(entry)
+    entries.sort(key=lambda entry: entry['month'])
+    return entries
+
+
+#### ROTATION ####
+def splitLiveFile(filePathName):
+    '''returns the header line and the data rows of a live file
+    '''
+    with open(filePathName, newline='') as file:
+        lines = file.readlines()
+    if lines == []:
+        return '', []
+    return lines[0], lines[1:]
+
+
+def rotateFile(usbPath, fileName, currentMonth, compression=None):
+    '''moves rows from months before currentMonth (YYYY-MM) into partitions
+    - the live file keeps its header and the current month rows
+    - returns the number of rows moved
+    '''
+    if compression is None:
+        compression = config.archiveCompression
+
+    liveFilePathName = usbPath + '/' + fileName
+    header, rows = splitLiveFile(liveFilePathName)
+
+    # group closed months, timestamps start with YYYY-MM in both files
+    closedRows = {}
+    keepRows = []
+    for row in rows:
+        month = row[:7]
+        if month < currentMonth and row.strip() != '':
+            closedRows.setdefault(month, []).append(row)
+        else:
+            keepRows.append(row)
+
+    if closedRows == {}:
+        return 0
+
+    os.makedirs(archivePath(usbPath), exist_ok=True)
+    manifest = readManifest(usbPath)
+
+    for month in sorted(closedRows):
+        monthRows = closedRows[month]
+        # a closed month can get late rows (clock set back), merge them in
+        for entry in partitionsFor(usbPath, fileName, manifest=manifest):
+            if entry['month'] == month:
+                with openPartition(archivePath(usbPath) + '/' + entry['file']) as file:
+                    monthRows = file.readlines()[1:] + monthRows
+                os.remove(archivePath(usbPath) + '/' + entry['file'])
+                manifest['partitions'].remove(entry)
+
+        partitionFileName = partitionName(fileName, month, compression)
+        partitionPathName = archivePath(usbPath) + '/' + partitionFileName
+        with openPartition(partitionPathName + '.tmp', 'wt', compression) as file:
+            file.write(header)
+            file.writelines(monthRows)
+        os.replace(partitionPathName + '.tmp', partitionPathName)
+
+        manifest['partitions'].append({
+            'source': fileName,
+            'month': month,
+            'file': partitionFileName,
+            'compression': compression,
+            'first': monthRows[0].split(',')[0],
+            'last': monthRows[-1].split(',')[0],
+            'rows': len(monthRows),
+            'crc32': fileChecksum(partitionPathName)
+            })
+
+    # manifest goes first, a crash after this only leaves duplicate rows
+    writeManifest(usbPath, manifest)
+
+    with open(liveFilePathName + '.tmp', 'w', newline='') as file:
+        file.write(header)
+        file.writelines(keepRows)
+    os.replace(liveFilePathName + '.tmp', liveFilePathName)
+
+    return len(rows) - len(keepRows)
+
+
+def rotateAll(usbPath, currentMonth):
+    '''rotates both data files on the USB drive
+    '''
+    rowsMoved = 0
+    for fileName in (config.dataFileName, config.historyFileName):
+        try:
+            rowsMoved += rotateFile(usbPath, fileName, currentMonth)
+        except FileNotFoundError:
+            pass
+    return rowsMoved
+
+
+#### READERS ####
+def totalRows(usbPath, fileName):
+    '''rows in the live file plus all partitions (from the manifest)
+    '''
+    header, rows = splitLiveFile(usbPath + '/' + fileName)
+    archivedRows = sum(entry['rows'] for entry in partitionsFor(usbPath, fileName))
+    return archivedRows + len(rows)
+
+
+def lastTimestamp(usbPath, fileName):
+    '''timestamp of the newest row, '' if there is none
+    '''
+    header, rows = splitLiveFile(usbPath + '/' + fileName)
+    if rows != []:
+        return rows[-1].split(',')[0]
+    entries = partitionsFor(usbPath, fileName)
+    if entries != []:
+        return entries[-1]['last']
+    return ''
+
+
+def tailRows(usbPath, fileName, count):
+    '''newest count rows, newest first, reading partitions only if required
+    '''
+    header, rows = splitLiveFile(usbPath + '/' + fileName)
+    tail = list(reversed(rows[-count:])) if count > 0 else []
+
+    for entry in reversed(partitionsFor(usbPath, fileName)):
+        if len(tail) >= count:
+            break
+        with openPartition(archivePath(usbPath) + '/' + entry['file']) as file:
+            partitionRows = file.readlines()[1:]
+        tail.extend(reversed(partitionRows[-(count - len(tail)):]))
+
+    return tail
+
+
+def readRows(usbPath, fileName, start=None, end=None):
+    '''generator of rows between start and end, oldest first
+    - only partitions that overlap the range are opened
+    '''
+    for entry in partitionsFor(usbPath, fileName, start, end):
+        with openPartition(archivePath(usbPath) + '/' + entry['file']) as file:
+            file.readline()
+            for row in file:
+                timestamp = row.split(',')[0]
+                if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+                    yield row
+
+    header, rows = splitLiveFile(usbPath + '/' + fileName)
+    for row in rows:
+        timestamp = row.split(',')[0]
+        if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+            yield row
+
+
+def verifyPartitions(usbPath):
+    '''returns list of partition files whose checksum does not match the manifest
+    '''
+    badFiles = []
+    for entry in readManifest(usbPath)['partitions']:
+        try:
+            if fileChecksum(archivePath(usbPath) + '/' + entry['file']) != entry['crc32']:
+                badFiles.append(entry['file'])
+        except FileNotFoundError:
+            badFiles.append(entry['file'])
+    return badFiles
+
+
+#### EXPORT ####
+def exportLegacy(usbPath, fileName, outFilePathName):
+    '''writes partitions and the live file back into the single file layout
+    '''
+    header, rows = splitLiveFile(usbPath + '/' + fileName)
+    rowCount = 0
+    with open(outFilePathName, 'w', newline='') as outFile:
+        outFile.write(header)
+        for row in readRows(usbPath, fileName):
+            outFile.write(row)
+            rowCount += 1
+    return rowCount
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python3 dataArchive.py export /media/usb0 weatherData.csv weatherDataAll.csv
+    # python3 dataArchive.py rotate /media/usb0 2019-11
+    # python3 dataArchive.py verify /media/usb0
+    if len(sys.argv) == 5 and sys.argv[1] == 'export':
+        print(exportLegacy(sys.argv[2], sys.argv[3], sys.argv[4]), 'rows exported')
+    elif len(sys.argv) == 4 and sys.argv[1] == 'rotate':
+        print(rotateAll(sys.argv[2], sys.argv[3]), 'rows archived')
+    elif len(sys.argv) == 3 and sys.argv[1] == 'verify':
+        badFiles = verifyPartitions(sys.argv[2])
+        print('bad partitions: ', badFiles if badFiles != [] else 'none')
+    else:
+        print('usage: dataArchive.py export <usb> <file> <out> | rotate <usb> <YYYY-MM> | verify <usb>')
@@ -0,0 +1,500 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# displays.py
+# Rev 0
+"""displays - the station's display backends behind the HD44780 calls the screens make
+
+The screens use lcd_display_string, lcd_display_bytes, lcd_write_char,
+lcd_write (CGRAM address), lcd_clear and backlight, laid out for a 20x4
+character LCD. characterDisplay takes those calls, keeps a model of the
+controller (DDRAM, CGRAM, address counter) and passes each byte to send(),
+which the backends implement:
+
+    'pcf8574 20x4'  the station LCD (I2C_LCD_driver3), byte for byte as before
+    'pcf8574 16x2'  the same driver on a 16x2 LCD, the 20x4 screens paged two
+                    lines and 16 columns at a time
+    'ssd1306'       128x64 I2C OLED drawn from the model, needs luma.oled and PIL
+    'virtual'       nothing sent, counts the bytes, keeps the latest bytes and frames
+
+config.displayType selects the backend, openDisplay() makes it. flush()
+is called from the screen loops (nextButton): the virtual display records
+a frame there when the screen changed. The OLED and the 16x2 LCD also redraw
+from their own thread, as some screens sleep without polling.
+
+Self check and LCD write cost of the screen parts (no hardware):
+    python3 displays.py
+"""
+
+import os
+import time
+import threading
+from collections import deque
+
+import config
+import RPiUtilities
+import messageCatalog
+
+# Rev 0 - first release, replaces I2C_LCD_driver3.lcd() in restartLCD
+
+Rs = 0b00000001  # register select, data instead of command
+
+# DDRAM address of the screens' lines 1 to 4 (20x4 layout)
+LINE_ADDRESS = (0x00, 0x40, 0x14, 0x54)
+
+# line, column geometry of the backends
+geometry = {
+    'pcf8574 20x4': (4, 20),
+    'pcf8574 16x2': (2, 16),
+    'ssd1306': (4, 20),
+    'virtual': (4, 20)
+    }
+
+# seconds the station driver takes per byte: two nibbles, each three I2C
+# writes with .1 ms sleeps plus the .5 ms strobe, at 20 bit times per write on 100 kHz
+PCF8574_BYTE_TIME = 2 * (3 * .0001 + .0005 + .0001) + 6 * 20 / 100e3
+
+# the latest bytes and frames a virtual display keeps, it is also the OLED
+# fallback on a station running for months
+RECORD_BYTES = 4096
+RECORD_FRAMES = 100
+
+# ROM codes to text, for frames and the OLED
+romText = dict((code, character) for character, code in messageCatalog.romCharacters.items())
+romText.update({126: '>', 127: '<', 223: '°', 255: '#'})
+
+
+def romCharacter(code):
+    '''text of one DDRAM code, custom characters as their slot number
+    '''
+    if 32 <= code < 126 and code != 92:
+        return chr(code)
+    if code < 8:
+        return str(code)
+    return romText.get(code, '?')
+
+
+class characterDisplay():
+    '''HD44780 model fed by the screen calls, backends override send()
+    '''
+    def __init__(self, lines=4, columns=20):
+        self.lines = lines
+        self.columns = columns
+        self.ddram = bytearray(b' ' * 0x80)
+        self.cgram = bytearray(64)
+        self.address = 0
+        self.cgramMode = False
+        self.backlightOn = True
+        self.changed = True
+
+        self.commands = 0  # bytes sent by type, for the write cost
+        self.characters = 0
+
+    #### THE SCREEN CALLS ####
+    def lcd_write(self, cmd, mode=0):
+        self.model(cmd, mode)
+        self.send(cmd, mode)
+
+    def lcd_write_char(self, charvalue, mode=1):
+        self.lcd_write(charvalue, mode)
+
+    def lcd_display_string(self, string, line=1, pos=0):
+        self.lcd_display_bytes([ord(char) for char in string], line, pos)
+
+    def lcd_display_bytes(self, data, line=1, pos=0):
+        self.lcd_write(0x80 + LINE_ADDRESS[line - 1] + pos)
+        for code in data:
+            self.lcd_write(code, Rs)
+
+    def lcd_display_string_pos(self, string, line, pos):
+        self.lcd_display_string(string, line, pos)
+
+    def lcd_clear(self):
+        self.lcd_write(0x01)
+        self.lcd_write(0x02)
+
+    def lcd_load_custom_chars(self, fontdata):
+        self.lcd_write(0x40)
+        for char in fontdata:
+            for line in char:
+                self.lcd_write_char(line)
+
+    def backlight(self, state):
+        self.backlightOn = state == 1
+        self.changed = True
+
+    def flush(self):
+        '''the screen loop polled, backends that draw a whole frame do it here
+        '''
+        self.changed = False
+
+    #### CONTROLLER MODEL ####
+    def model(self, cmd, mode):
+        if mode & Rs:
+            self.characters += 1
+            if self.cgramMode is True:
+                self.cgram[self.address] = cmd & 0x1f
+                self.address = (self.address + 1) & 0x3f
+            else:
+                self.ddram[self.address] = cmd & 0xff
+                # 2 line addressing: 0x00-0x27 then 0x40-0x67
+                self.address += 1
+                if self.address == 0x28:
+                    self.address = 0x40
+                elif self.address == 0x68:
+                    self.address = 0x00
+            self.changed = True
+            return
+
+        self.commands += 1
+        if cmd & 0x80:
+            self.address = cmd & 0x7f
+            self.cgramMode = False
+        elif cmd & 0x40:
+            self.address = cmd & 0x3f
+            self.cgramMode = True
+        elif cmd == 0x01:
+            self.ddram[:] = b' ' * 0x80
+            self.address = 0
+            self.cgramMode = False
+            self.changed = True
+        elif cmd == 0x02:
+            self.address = 0
+            self.cgramMode = False
+
+    def send(self, cmd, mode):
+        pass
+
+    def frame(self):
+        '''the codes on the screen, a bytes object per line
+        '''
+        return [bytes(self.ddram[LINE_ADDRESS[line]:LINE_ADDRESS[line] + self.columns])
+            for line in range(self.lines)]
+
+    def text(self):
+        '''the screen as text lines, custom characters as their slot number
+        '''
+        return [''.join(romCharacter(code) for code in line) for line in self.frame()]
+
+    def glyphRows(self, code):
+        '''5x8 pattern of custom character code (0 to 7)
+        '''
+        return tuple(self.cgram[(code & 7) * 8:(code & 7) * 8 + 8])
+
+
+class pcf8574Display(characterDisplay):
+    '''HD44780 through the PCF8574 I2C backpack (I2C_LCD_driver3)
+    '''
+    def __init__(self, lines=4, columns=20):
+        import I2C_LCD_driver3
+
+        characterDisplay.__init__(self, lines, columns)
+        self.lcd = I2C_LCD_driver3.lcd()
+
+    def send(self, cmd, mode):
+        self.lcd.lcd_write(cmd, mode)
+
+    def backlight(self, state):
+        characterDisplay.backlight(self, state)
+        self.lcd.backlight(state)
+
+
+class pcf8574PagedDisplay(characterDisplay):
+    '''16x2 HD44780 through the PCF8574 backpack showing the 20x4 model a view at a time
+    - lines 1 and 2, then lines 3 and 4, PAGE_TIME seconds each, a pair
+      with nothing on it is skipped
+    - a pair with text past column 16 is shown twice, columns 1-16 then 5-20
+    - drawn in flush() and from a refresh thread, only the changed cells are
+      sent; CGRAM (the glyphs) goes to the LCD as it is written
+    '''
+    PAGE_TIME = 2.0  # seconds a view is shown
+    REFRESH_TIME = .1  # seconds between redraws of the refresh thread
+
+    def __init__(self, lines=2, columns=16):
+        import I2C_LCD_driver3
+
+        characterDisplay.__init__(self, 4, 20)
+        self.viewLines = lines
+        self.viewColumns = columns
+        self.lcd = I2C_LCD_driver3.lcd()
+        self.shown = [None] * lines  # codes on the LCD, None not known
+        self.pageStart = time.monotonic()
+
+        # a screen call (model and CGRAM bytes) and a redraw do not interleave
+        self.drawLock = threading.Lock()
+        threading.Thread(target=self.refreshLoop, name='lcd 16x2', daemon=True).start()
+
+    def lcd_write(self, cmd, mode=0):
+        with self.drawLock:
+            characterDisplay.lcd_write(self, cmd, mode)
+
+    def send(self, cmd, mode):
+        if self.cgramMode is True:
+            self.lcd.lcd_write(cmd, mode)
+        elif cmd == 0x01 and not mode & Rs:
+            # a cleared screen starts at its first view
+            self.pageStart = time.monotonic()
+
+    def backlight(self, state):
+        characterDisplay.backlight(self, state)
+        self.lcd.backlight(state)
+
+    def refreshLoop(self):
+        while True:
+            time.sleep(self.REFRESH_TIME)
+            self.flush()
+
+    def flush(self):
+        if not self.drawLock.acquire(blocking=False):
+            return
+        try:
+            self.changed = False
+            self.draw()
+        finally:
+            self.drawLock.release()
+
+    def views(self, frame):
+        '''(first line, first column) of each view of the frame
+        '''
+        views = []
+        for line in range(0, self.lines, self.viewLines):
+            pair = frame[line:line + self.viewLines]
+            if all(codes.strip(b' ') == b'' for codes in pair):
+                continue
+            views.append((line, 0))
+            if any(codes[self.viewColumns:].strip(b' ') != b'' for codes in pair):
+                views.append((line, self.columns - self.viewColumns))
+        return views if views != [] else [(0, 0)]
+
+    def draw(self):
+        frame = self.frame()
+        views = self.views(frame)
+        line, column = views[int((time.monotonic() - self.pageStart) // self.PAGE_TIME) % len(views)]
+
+        sent = False
+        for row in range(self.viewLines):
+            codes = frame[line + row][column:column + self.viewColumns]
+            shown = self.shown[row]
+            previous = None
+            for position, code in enumerate(codes):
+                if shown is not None and shown[position] == code:
+                    continue
+                if previous != position - 1:
+                    self.lcd.lcd_write(0x80 + LINE_ADDRESS[row] + position)
+                self.lcd.lcd_write(code, Rs)
+                previous = position
+                sent = True
+            self.shown[row] = codes
+
+        if sent is True and self.cgramMode is True:
+            # a glyph upload is under way, back to its CGRAM address
+            self.lcd.lcd_write(0x40 | self.address)
+
+
+class ssd1306Display(characterDisplay):
+    '''128x64 OLED showing the 20x4 model, 6x16 pixels a character
+    - drawn in flush() when the model changed, off with the backlight
+    '''
+    CELL_WIDTH = 6
+    CELL_HEIGHT = 16
+    REFRESH_TIME = .1  # seconds between redraw checks of the refresh thread
+
+    def __init__(self, address=None):
+        from luma.core.interface.serial import i2c
+        from luma.oled.device import ssd1306
+        from PIL import Image, ImageDraw, ImageFont
+
+        characterDisplay.__init__(self, 4, 20)
+        self.Image = Image
+        self.ImageDraw = ImageDraw
+        self.font = ImageFont.load_default()
+        if address is None:
+            address = config.OLEDaddress
+        self.device = ssd1306(i2c(port=1, address=address))
+
+        self.drawLock = threading.Lock()
+        threading.Thread(target=self.refreshLoop, name='oled', daemon=True).start()
+
+    def refreshLoop(self):
+        while True:
+            time.sleep(self.REFRESH_TIME)
+            self.flush()
+
+    def flush(self):
+        if self.changed is False or not self.drawLock.acquire(blocking=False):
+            return
+        try:
+            self.changed = False
+            self.draw()
+        finally:
+            self.drawLock.release()
+
+    def draw(self):
+        image = self.Image.new('1', (self.device.width, self.device.height))
+        draw = self.ImageDraw.Draw(image)
+        for line, codes in enumerate(self.frame()):
+            for column, code in enumerate(codes):
+                x = column * self.CELL_WIDTH
+                y = line * self.CELL_HEIGHT
+                if code < 8:
+                    # custom character, rows doubled to fill the cell
+                    for row, bits in enumerate(self.glyphRows(code)):
+                        for bit in range(5):
+                            if bits & (0x10 >> bit):
+                                draw.rectangle((x + bit, y + 2 * row, x + bit, y + 2 * row + 1), fill=1)
+                elif code == 255:
+                    draw.rectangle((x, y, x + 4, y + 15), fill=1)
+                elif code != 32:
+                    draw.text((x, y + 2), romCharacter(code), font=self.font, fill=1)
+
+        with RPiUtilities.i2cLock:
+            if self.backlightOn is True:
+                self.device.display(image)
+                self.device.show()
+            else:
+                self.device.hide()
+
+
+class virtualDisplay(characterDisplay):
+    '''no hardware: counts the bytes sent, keeps the latest bytes and a frame at each flush() that changed the screen
+    '''
+    def __init__(self, lines=4, columns=20):
+        characterDisplay.__init__(self, lines, columns)
+        self.sent = deque(maxlen=RECORD_BYTES)  # (mode, byte)
+        self.frames = deque(maxlen=RECORD_FRAMES)  # text lines
+        self.bytesSent = 0
+
+    def send(self, cmd, mode):
+        self.sent.append((mode, cmd))
+        self.bytesSent += 1
+
+    def flush(self):
+        if self.changed is True:
+            self.frames.append(self.text())
+        self.changed = False
+
+    def cost(self):
+        '''bytes sent and the seconds the station LCD would take for them
+        '''
+        return self.bytesSent, self.bytesSent * PCF8574_BYTE_TIME
+
+    def reset(self):
+        '''forget what was recorded, the model is kept
+        '''
+        self.sent.clear()
+        self.frames.clear()
+        self.bytesSent = 0
+        self.commands = 0
+        self.characters = 0
+
+
+def openDisplay(displayType=None):
+    '''the backend of config.displayType
+    - an OLED without its libraries falls back to the virtual display, so the station still records
+    '''
+    if displayType is None:
+        displayType = config.displayType
+    if displayType not in geometry:
+        raise ValueError('unknown display ' + str(displayType))
+
+    lines, columns = geometry[displayType]
+    if displayType == 'pcf8574 16x2':
+        return pcf8574PagedDisplay(lines, columns)
+    if displayType.startswith('pcf8574'):
+        return pcf8574Display(lines, columns)
+    if displayType == 'ssd1306':
+        try:
+            return ssd1306Display()
+        except ImportError:
+            print('no OLED driver (luma.oled, PIL), virtual display')
+    return virtualDisplay(lines, columns)
+
+
+if __name__ == '__main__':
+    import glyphCache
+    import trendScreen
+
+    display = virtualDisplay()
+    glyphs = glyphCache.glyphCache(display)
+
+    def screenCost(name):
+        display.flush()
+        byteCount, seconds = display.cost()
+        print('{:24s}{:6d} bytes{:8.0f} ms  ({} commands, {} characters)'.format(
+            name, byteCount, seconds * 1000, display.commands, display.characters))
+        display.reset()
+
+    screenCost('glyph reset')
+
+    def showMainScreen(display, glyphs):
+        '''the main screen text (weather.mainScreen and mainScreenRefresh)
+        '''
+        glyphs.clear()
+        display.lcd_display_string('Oct 10', 1, 0)
+        display.lcd_display_string(' 2:05 PM', 1, 10)
+        glyphs.write('flower', 1, 19)
+        display.lcd_display_string('27', 2, 0)
+        display.lcd_write_char(223)
+        display.lcd_display_string('C ', 2, 3)
+        display.lcd_display_string('64% ', 2, 6)
+        display.lcd_display_string('  3 km/h', 2, 11)
+        display.lcd_display_string('    0 mm', 3, 0)
+        display.lcd_display_string('41230lux', 3, 10)
+        display.lcd_display_string('', 4, 0)
+        display.lcd_write_char(127)
+        display.lcd_display_bytes(messageCatalog.getBytes('page'), 4, 2)
+        for column in range(9, 12):
+            glyphs.write('water drop', 4, column)
+        display.lcd_display_string('MX ', 4, 16)
+        display.lcd_write_char(126)
+
+    showMainScreen(display, glyphs)
+    mainScreen = display.text()
+    screenCost('main screen')
+    for line in mainScreen:
+        print('    |' + line + '|')
+    assert mainScreen[1].startswith('27°C  64%') and mainScreen[3][9:12] == '111'
+
+    # a trend page, then paging to the next one (only changed cells)
+    trendFrame = [[32] * 20, ['bar' + str(1 + column % 7) for column in range(20)],
+        [255] * 10 + ['bar3'] * 10, [127, 32] + list(b'page') + [32] * 14]
+    trends = trendScreen.trendDisplay()
+    glyphs.clear()
+    trends.cleared()
+    trends.show(glyphs, trendFrame)
+    screenCost('trend page')
+    trendFrame[1] = [32] * 20
+    trends.show(glyphs, trendFrame)
+    screenCost('trend page change')
+    assert display.text()[2] == '#' * 10 + str(glyphs.slotNames.index('bar3')) * 10
+
+    # the 16x2 LCD (the simulated PCF8574) pages through the same screen
+    os.environ['PONTIS_HARDWARE'] = 'simulated'
+    import hardware
+    small = openDisplay('pcf8574 16x2')
+    showMainScreen(small, glyphCache.glyphCache(small))
+    views = [(0, 0), (0, 4), (2, 0), (2, 4)]
+    assert small.views(small.frame()) == views
+    for page, (line, column) in enumerate(views):
+        small.pageStart = time.monotonic() - (page + .5) * small.PAGE_TIME
+        small.flush()
+        shown = [text[:16] for text in hardware.station.lcdText()[:2]]
+        assert shown == [text[column:column + 16] for text in mainScreen[line:line + 2]], shown
+        print('    16x2 |' + '|\n         |'.join(shown) + '|')
+    assert hardware.station.lcd.display.cgram == small.cgram
+
+    # a screen on lines 1 and 2 within 16 columns is one view
+    small.lcd_clear()
+    small.lcd_display_string('Set clock', 1, 0)
+    small.lcd_display_string('12:30', 2, 5)
+    small.pageStart -= 3 * small.PAGE_TIME
+    small.flush()
+    assert hardware.station.lcdText()[:2] == ['Set clock' + ' ' * 11, '     12:30' + ' ' * 10]
+
+    # months of screens: the byte count goes on, what is kept does not grow
+    display.reset()
+    for count in range(1000):
+        display.lcd_display_string('{:20d}'.format(count), 1, 0)
+        display.flush()
+    assert display.cost()[0] > RECORD_BYTES and len(display.sent) == RECORD_BYTES
+    assert len(display.frames) == RECORD_FRAMES and display.frames[-1][0] == '{:20d}'.format(999)
+    print('ok')
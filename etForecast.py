@@ -0,0 +1,286 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# etForecast.py
+# Rev 0
+"""etForecast - hourly water loss forecast and the deficit 24 to 72 hours ahead
+
+Holt-Winters smoothing (level, damped trend and a 24 hour additive season)
+of the hourly Penman-Monteith water loss, plus a slowly smoothed hourly rain
+rate. Each period update changes the level, trend, rain rate and the one
+season slot of that hour, so the state is 28 numbers whatever the history.
+
+The projection runs waterLossCumulative forward through the water balance
+with forecast water loss less the expected rain, and gives the hours until
+config.forecastIrrigationDeficit mm is reached.
+
+The state is kept in a small JSON file on the SD card. No NumPy is used on
+the station, the backtest over archived data does use it:
+    python3 etForecast.py backtest <weatherData.csv> [more files]
+    python3 etForecast.py benchmark   (a synthetic year, no NumPy)
+"""
+
+import os
+import json
+
+import config
+import waterBalance
+
+# Rev 0 - first release
+
+SEASON = 24
+
+# smoothing of level, trend, season and rain rate, trend damping
+smoothing = {
+    'alpha': .05,
+    'beta': .01,
+    'gamma': .2,
+    'phi': .98,
+    'rainAlpha': 1 / (24 * 14)
+    }
+
+
+class etForecast():
+    '''Holt-Winters state of one station's hourly water loss
+    '''
+    def __init__(self, filePathName=None, **parameters):
+        self.filePathName = filePathName
+        self.parameters = dict(smoothing)
+        self.parameters.update(parameters)
+        self.clear()
+        if filePathName is not None:
+            self.load()
+
+    def clear(self):
+        self.level = 0.0
+        self.trend = 0.0
+        self.season = [0.0] * SEASON
+        self.rainRate = 0.0
+        self.count = 0
+        self.lastHour = None
+
+    def load(self):
+        try:
+            with open(self.filePathName) as file:
+                saved = json.load(file)
+            if saved.get('parameters') != self.parameters or len(saved['season']) != SEASON:
+                return  # other smoothing, start again
+            self.level = saved['level']
+            self.trend = saved['trend']
+            self.season = saved['season']
+            self.rainRate = saved['rainRate']
+            self.count = saved['count']
+            self.lastHour = saved['lastHour']
+        except (FileNotFoundError, ValueError, KeyError):
+            self.clear()
+
+    def save(self):
+        if self.filePathName is None:
+            return
+        with open(self.filePathName + '.tmp', 'w') as file:
+            json.dump({
+                'parameters': self.parameters,
+                'level': self.level,
+                'trend': self.trend,
+                'season': self.season,
+                'rainRate': self.rainRate,
+                'count': self.count,
+                'lastHour': self.lastHour
+                }, file)
+        os.replace(self.filePathName + '.tmp', self.filePathName)
+
+    def update(self, hour, waterLoss, rain):
+        '''adds one period, hour is the hour of day (0 to 23) the period ended
+        - the first day only fills the season
+        '''
+        slot = hour % SEASON
+        alpha = self.parameters['alpha']
+        beta = self.parameters['beta']
+        gamma = self.parameters['gamma']
+        phi = self.parameters['phi']
+
+        if self.count < SEASON:
+            self.season[slot] = waterLoss
+            self.count += 1
+            if self.count == SEASON:
+                self.level = sum(self.season) / SEASON
+                self.season = [value - self.level for value in self.season]
+        else:
+            lastLevel = self.level
+            self.level = alpha * (waterLoss - self.season[slot]) + (1 - alpha) * (lastLevel + phi * self.trend)
+            self.trend = beta * (self.level - lastLevel) + (1 - beta) * phi * self.trend
+            self.season[slot] = gamma * (waterLoss - self.level) + (1 - gamma) * self.season[slot]
+            self.count += 1
+
+        self.rainRate = self.rainRate + self.parameters['rainAlpha'] * (rain - self.rainRate)
+        self.lastHour = slot
+
+    def ready(self):
+        return self.count >= SEASON
+
+    def waterLoss(self, hoursAhead):
+        '''forecast water loss of the period hoursAhead after the last update
+        '''
+        phi = self.parameters['phi']
+        # sum of phi^1 .. phi^h, the damped trend
+        damping = phi * (1 - phi ** hoursAhead) / (1 - phi) if phi < 1 else hoursAhead
+        slot = (self.lastHour + hoursAhead) % SEASON
+        return max(self.level + damping * self.trend + self.season[slot], 0.0)
+
+    def project(self, waterLossCumulative, hours=None):
+        '''waterLossCumulative at the end of each of the next hours periods
+        '''
+        if hours is None:
+            hours = config.forecastHours
+        projection = []
+        for hoursAhead in range(1, hours + 1):
+            waterLossCumulative = waterBalance.updateWaterLoss(
+                waterLossCumulative, self.waterLoss(hoursAhead), self.rainRate)
+            projection.append(waterLossCumulative)
+        return projection
+
+    def hoursUntil(self, waterLossCumulative, deficit=None, hours=None):
+        '''hours until waterLossCumulative reaches deficit mm
+        - 0 if already there, None if not within hours or not ready
+        '''
+        if deficit is None:
+            deficit = config.forecastIrrigationDeficit
+        if waterLossCumulative >= deficit:
+            return 0
+        if not self.ready():
+            return None
+        for hoursAhead, projected in enumerate(self.project(waterLossCumulative, hours), 1):
+            if projected >= deficit:
+                return hoursAhead
+        return None
+
+
+#### BACKTEST ####
+def actualDeficits(start, waterLoss, rain, row, horizons):
+    '''water balance from row with the recorded water loss and rain (no irrigation)
+    '''
+    deficits = {}
+    waterLossCumulative = start
+    for hoursAhead in range(1, max(horizons) + 1):
+        waterLossCumulative = waterBalance.updateWaterLoss(
+            waterLossCumulative, waterLoss[row + hoursAhead], rain[row + hoursAhead])
+        if hoursAhead in horizons:
+            deficits[hoursAhead] = waterLossCumulative
+    return deficits
+
+
+def backtest(hours, waterLoss, rain, waterLossCumulative, horizons=(24, 48, 72), **parameters):
+    '''walks the forecaster through a station history, forecasting at every hour
+    returns dictionary: per horizon rmse of the forecast, persistence and
+    seasonal naive (yesterday's water loss again), skill scores, timings
+    '''
+    import time
+
+    forecast = etForecast(None, **parameters)
+    squares = dict((horizon, {'forecast': 0.0, 'persistence': 0.0, 'seasonal': 0.0}) for horizon in horizons)
+    forecasts = 0
+    updateTime = 0.0
+    projectTime = 0.0
+    lastRow = len(waterLoss) - max(horizons) - 1
+
+    for row in range(len(waterLoss)):
+        startTime = time.perf_counter()
+        forecast.update(hours[row], waterLoss[row], rain[row])
+        updateTime += time.perf_counter() - startTime
+        if row < 7 * SEASON or row > lastRow:
+            continue
+
+        start = waterLossCumulative[row]
+        startTime = time.perf_counter()
+        projection = forecast.project(start, max(horizons))
+        projectTime += time.perf_counter() - startTime
+        actual = actualDeficits(start, waterLoss, rain, row, horizons)
+
+        seasonal = start
+        seasonalDeficits = {}
+        for hoursAhead in range(1, max(horizons) + 1):
+            seasonal = waterBalance.updateWaterLoss(seasonal,
+                waterLoss[row - SEASON + (hoursAhead - 1) % SEASON + 1], forecast.rainRate)
+            seasonalDeficits[hoursAhead] = seasonal
+
+        for horizon in horizons:
+            squares[horizon]['forecast'] += (projection[horizon - 1] - actual[horizon]) ** 2
+            squares[horizon]['persistence'] += (start - actual[horizon]) ** 2
+            squares[horizon]['seasonal'] += (seasonalDeficits[horizon] - actual[horizon]) ** 2
+        forecasts += 1
+
+    results = {'forecasts': forecasts, 'hours': len(waterLoss), 'horizons': {}}
+    for horizon in horizons:
+        rmse = dict((name, (value / max(forecasts, 1)) ** .5) for name, value in squares[horizon].items())
+        rmse['skill vs persistence'] = 1 - rmse['forecast'] / rmse['persistence'] if rmse['persistence'] > 0 else None
+        rmse['skill vs seasonal'] = 1 - rmse['forecast'] / rmse['seasonal'] if rmse['seasonal'] > 0 else None
+        results['horizons'][horizon] = rmse
+    results['update us'] = updateTime / max(len(waterLoss), 1) * 1e6
+    results['project us'] = projectTime / max(forecasts, 1) * 1e6
+    return results
+
+
+def stationSeries(filePathName):
+    '''hour of day, water loss, period rain and waterLossCumulative lists of a weatherData file
+    '''
+    import numpy as np
+    import stationLoader
+    import reprocess
+
+    rows, info = stationLoader.loadFile(filePathName)
+    hours = ((rows['time'] - rows['time'].astype('datetime64[D]')).astype('timedelta64[h]').astype(int)).tolist()
+    rain = reprocess.periodRain(rows['time'], rows['rainTotalDay'])
+    return (hours, np.nan_to_num(rows['waterLoss']).tolist(), np.nan_to_num(rain).tolist(),
+        np.nan_to_num(rows['waterLossCumulative']).tolist())
+
+
+def syntheticSeries(days=365, seed=3):
+    '''a year like hourly series from penmanMonteith: daily sun, cloudy spells and showers
+    '''
+    import math
+    import random
+
+    random = random.Random(seed)
+    hours, waterLoss, rain, waterLossCumulative = [], [], [], []
+    cumulative = 0.0
+    cloud = .5
+    for day in range(days):
+        cloud = min(max(cloud + random.gauss(0, .2), 0.0), 1.0)
+        season = math.cos(2 * math.pi * day / 365)
+        for hour in range(SEASON):
+            sun = max(math.sin((hour - 6) / 12 * math.pi), 0.0)
+            temp = 24 + 4 * season + 6 * sun * (1 - .5 * cloud) + random.gauss(0, .5)
+            RH = min(max(85 - 30 * sun * (1 - cloud) + random.gauss(0, 3), 20), 100)
+            lux = 100000 * sun * (1 - .7 * cloud)
+            periodLoss = waterBalance.penmanMonteith(temp, RH, random.uniform(2, 12), lux)
+            periodRain = random.expovariate(1 / 5) if random.random() < .03 * cloud else 0.0
+            if random.random() < .003:
+                cumulative = waterBalance.applyIrrigation(cumulative, True)
+            cumulative = waterBalance.updateWaterLoss(cumulative, periodLoss, periodRain)
+            hours.append(hour)
+            waterLoss.append(periodLoss)
+            rain.append(periodRain)
+            waterLossCumulative.append(cumulative)
+    return hours, waterLoss, rain, waterLossCumulative
+
+
+def printBacktest(name, results):
+    print(name, ': ', results['forecasts'], 'forecasts over', results['hours'], 'hours')
+    print('{:>9s}{:>10s}{:>13s}{:>10s}{:>14s}{:>12s}'.format(
+        'horizon', 'forecast', 'persistence', 'seasonal', 'skill/persist', 'skill/seas'))
+    for horizon, rmse in results['horizons'].items():
+        print('{:>8d}h{:10.2f}{:13.2f}{:10.2f}{:14.2f}{:12.2f}'.format(horizon, rmse['forecast'],
+            rmse['persistence'], rmse['seasonal'], rmse['skill vs persistence'] or 0, rmse['skill vs seasonal'] or 0))
+    print('update {:.1f} us, 72 hour projection {:.1f} us'.format(results['update us'], results['project us']))
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) >= 3 and sys.argv[1] == 'backtest':
+        for filePathName in sys.argv[2:]:
+            printBacktest(filePathName, backtest(*stationSeries(filePathName)))
+    elif len(sys.argv) == 2 and sys.argv[1] == 'benchmark':
+        printBacktest('synthetic year', backtest(*syntheticSeries()))
+    else:
+        print('usage: etForecast.py backtest <weatherData.csv> [more files]')
+        print('       etForecast.py benchmark')
@@ -0,0 +1,214 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# glyphCache.py
+# Rev 0
+"""glyphCache - custom LCD characters loaded into the 8 CGRAM slots on demand
+
+The HD44780 holds 8 custom characters. glyphLibrary has many more; a screen
+asks for a glyph by name and the cache puts it in a slot if it is not there:
+a free slot, else the least recently used one not on the screen.
+
+Glyphs drawn since the last clear() are pinned: changing their slot would
+change the character already on the screen, so a glyph that cannot get a
+slot is drawn with its fallback ROM character instead. Uploads only write
+slots whose pattern changes and runs of neighbouring slots are sent with
+one CGRAM address command.
+
+    glyphs = glyphCache.glyphCache(mylcd)
+    glyphs.write('water drop', 4, 9)
+    glyphs.clear()        # lcd_clear, nothing on the screen is pinned
+"""
+
+# Rev 0 - first release, replaces the fixed 8 characters in restartLCD
+
+SLOTS = 8
+
+# name: (8 rows of 5 pixels, fallback ROM character)
+glyphLibrary = {
+    # the original station characters
+    'flower': ((0x4, 0xa, 0x4, 0x0, 0x0, 0x1f, 0xe, 0xe), ord('*')),
+    'water drop': ((0x0, 0x4, 0x4, 0xa, 0x11, 0x11, 0x11, 0xe), ord('o')),
+    'maiz1': ((0x0, 0x0, 0x0, 0x0, 0x0, 0x0, 0x4, 0x1f), ord('_')),
+    'maiz2': ((0x0, 0x0, 0x0, 0x4, 0xc, 0x6, 0x4, 0x1f), ord('i')),
+    'maiz3': ((0x0, 0x4, 0xc, 0x5, 0x16, 0xc, 0x4, 0x1f), ord('t')),
+    'maiz4': ((0x4, 0xc, 0x5, 0x16, 0xd, 0x6, 0x4, 0x1f), ord('Y')),
+    'up arrow': ((0x0, 0x4, 0xe, 0x1f, 0x0, 0x1f, 0x0, 0x0), ord('^')),
+    'down arrow': ((0x0, 0x0, 0x1f, 0x0, 0x1f, 0xe, 0x4, 0x0), ord('v')),
+
+    # weather
+    'sun': ((0x0, 0x15, 0xe, 0x1b, 0xe, 0x15, 0x0, 0x0), ord('*')),
+    'cloud': ((0x0, 0x0, 0xc, 0x1e, 0x1f, 0x1f, 0x0, 0x0), ord('c')),
+    'rain': ((0xc, 0x1e, 0x1f, 0x0, 0xa, 0x0, 0x15, 0x0), ord('r')),
+    'thermometer': ((0x4, 0xa, 0xa, 0xa, 0xe, 0x1f, 0x1f, 0xe), ord('t')),
+    'humidity': ((0x4, 0x4, 0xa, 0xa, 0x11, 0x13, 0x17, 0xe), ord('%')),
+    'wind': ((0x0, 0x1c, 0x2, 0x1f, 0x0, 0x1e, 0x1, 0x6), ord('~')),
+    'battery': ((0xe, 0x1b, 0x11, 0x11, 0x1f, 0x1f, 0x1f, 0x1f), ord('B')),
+    'clock': ((0x0, 0xe, 0x15, 0x17, 0x11, 0xe, 0x0, 0x0), ord('@'))
+    }
+
+
+def barRows(height, width=5):
+    '''5x8 pattern of a bar height rows high (from the bottom), width columns wide (from the left)
+    '''
+    row = (0x1f << (5 - width)) & 0x1f
+    return (0x0,) * (8 - height) + (row,) * height
+
+
+# vertical bars of 1 to 8 rows (bar graphs and sparklines), a full cell is ROM 255
+for height, fallback in zip(range(1, 8), '___--=='):
+    glyphLibrary['bar' + str(height)] = (barRows(height), ord(fallback))
+glyphLibrary['bar8'] = (barRows(8), 255)
+
+# horizontal bars of 1 to 4 columns
+for width in range(1, 5):
+    glyphLibrary['hbar' + str(width)] = (barRows(8, width), ord('|'))
+
+# loaded at reset, the characters the station always used
+defaultGlyphs = ('flower', 'water drop', 'maiz1', 'maiz2', 'maiz3', 'maiz4', 'up arrow', 'down arrow')
+
+
+class glyphCache():
+    '''CGRAM slot residency of one LCD
+    '''
+    def __init__(self, mylcd, library=None):
+        self.library = glyphLibrary if library is None else library
+        self.uploads = 0  # slots written, for the MX page and tests
+        self.commands = 0  # CGRAM address commands sent
+        self.reset(mylcd)
+
+    def reset(self, mylcd):
+        '''a new or restarted LCD, CGRAM contents unknown
+        '''
+        self.mylcd = mylcd
+        self.slotNames = [None] * SLOTS
+        self.slotRows = [None] * SLOTS
+        self.lastUse = [0] * SLOTS
+        self.pinned = set()
+        self.pending = {}
+        self.useCount = 0
+        self.require(*defaultGlyphs)
+        self.pinned = set()
+
+    def clear(self):
+        '''clears the LCD, no glyph is on the screen any more
+        '''
+        self.mylcd.lcd_clear()
+        self.pinned = set()
+
+    def code(self, name):
+        '''character code to draw glyph name, loading it into a slot if needed
+        - the upload waits for flush(), write() and require() flush
+        '''
+        rows, fallback = self.library[name]
+        self.useCount += 1
+        if name in self.slotNames:
+            slot = self.slotNames.index(name)
+        else:
+            free = [slot for slot in range(SLOTS) if slot not in self.pinned]
+            if free == []:
+                return fallback  # every slot is on the screen
+            # an empty slot, else the least recently used
+            slot = min(free, key=lambda slot: (self.slotNames[slot] is not None, self.lastUse[slot]))
+            self.slotNames[slot] = name
+            if self.slotRows[slot] != rows:
+                self.pending[slot] = rows
+        self.lastUse[slot] = self.useCount
+        self.pinned.add(slot)
+        return slot
+
+    def flush(self):
+        '''writes the changed slots, one address command per run of slots
+        '''
+        if self.pending == {}:
+            return
+        slots = sorted(self.pending)
+        runStart = None
+        for number, slot in enumerate(slots):
+            if runStart is None or slot != slots[number - 1] + 1:
+                self.mylcd.lcd_write(0x40 | (slot << 3))
+                self.commands += 1
+                runStart = slot
+            for row in self.pending[slot]:
+                self.mylcd.lcd_write_char(row)
+            self.slotRows[slot] = self.pending[slot]
+            self.uploads += 1
+        self.pending = {}
+
+    def require(self, *names):
+        '''codes of the glyphs a screen is about to draw, uploaded together
+        '''
+        codes = [self.code(name) for name in names]
+        self.flush()
+        return codes
+
+    def write(self, name, line, pos):
+        '''draws glyph name at line, pos
+        - the upload is done before the cursor is placed (CGRAM writes move it)
+        '''
+        code = self.code(name)
+        self.flush()
+        self.mylcd.lcd_display_string('', line, pos)
+        self.mylcd.lcd_write_char(code)
+        return code
+
+
+if __name__ == '__main__':
+    # a recording LCD: counts CGRAM writes of a screen sequence
+    class recordingLCD():
+        def __init__(self):
+            self.cgram = [None] * SLOTS
+            self.address = None
+            self.screen = {}
+            self.cursor = None
+
+        def lcd_write(self, command, mode=0):
+            if command & 0xC0 == 0x40:
+                self.address = command & 0x3F
+            elif command & 0x80:
+                self.address = None
+
+        def lcd_write_char(self, value, mode=1):
+            if self.address is not None:
+                slot, row = divmod(self.address, 8)
+                if self.cgram[slot] is None:
+                    self.cgram[slot] = [0] * 8
+                self.cgram[slot][row] = value
+                self.address += 1
+            else:
+                self.screen[self.cursor] = value
+                self.cursor = (self.cursor[0], self.cursor[1] + 1)
+
+        def lcd_display_string(self, string, line=1, pos=0):
+            self.address = None
+            self.cursor = (line, pos)
+
+        def lcd_clear(self):
+            self.screen = {}
+
+    lcd = recordingLCD()
+    glyphs = glyphCache(lcd)
+    print('reset: ', glyphs.uploads, 'slots in', glyphs.commands, 'command')
+    assert glyphs.uploads == 8 and glyphs.commands == 1
+
+    # main screen again: nothing to upload
+    glyphs.clear()
+    for column in range(9, 14):
+        glyphs.write('water drop', 4, column)
+    glyphs.write('flower', 1, 19)
+    assert glyphs.uploads == 8
+
+    # a bar graph screen: 8 bar glyphs, flower and drop are on screen no more
+    glyphs.clear()
+    uploads = glyphs.uploads
+    for column, height in enumerate((1, 3, 5, 8, 6, 2, 4, 7, 8, 1)):
+        glyphs.write('bar' + str(height), 3, column)
+    print('bar screen: ', glyphs.uploads - uploads, 'slots written')
+    assert glyphs.uploads - uploads == 8
+
+    # a ninth glyph on the same screen gets its fallback, nothing on screen changes
+    assert glyphs.write('sun', 1, 0) == ord('*')
+    for (line, column), code in lcd.screen.items():
+        if code < SLOTS:
+            name = glyphs.slotNames[code]
+            assert tuple(lcd.cgram[code]) == glyphLibrary[name][0]
+    print('ok')
@@ -0,0 +1,513 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# hardware.py
+# Rev 0
+"""hardware - the Raspberry Pi I2C bus and GPIO, or simulated ones
+
+The drivers and weather.py take smbus and RPi.GPIO from here:
+    from hardware import smbus    # tsl2591, HIH6121, I2C_LCD_driver3
+    from hardware import GPIO     # weather
+
+PONTIS_HARDWARE selects them:
+    pi          (default) the smbus and RPi.GPIO modules
+    simulated   I2C bus 1 with a TSL2591 (0x29), an HIH6121 (0x27) and the
+                PCF8574 LCD backpack (config.LCDaddress), decoded into a
+                displays.virtualDisplay; GPIO with anemometer (18) and rain
+                gage (16) pulses from a simulated day, buttons (33, 31, 29)
+                and the low battery pin (10)
+
+Scripted faults of the simulated devices, PONTIS_FAULTS or injectFault():
+    kind@address:name=value,...;...   (times in seconds from the start)
+    oserror@0x27:start=60,duration=10,every=600   OSError bursts
+    stuck@0x29:start=0                            readings stop changing
+    slow@0x23:delay=.05                           each transaction takes longer
+    saturate@0x29:start=3600,duration=600         TSL2591 channels read 0xFFFF
+    lowbattery:start=900                          pin 10 low
+
+PONTIS_SD_PATH and PONTIS_USB_PATH replace /home/pi and the /media/usb search.
+
+The whole station on a laptop, the LCD printed when it changes and
+1, 2 or 3 then Enter pressing a button:
+    python3 hardware.py run
+Self check of the simulated devices:
+    python3 hardware.py
+"""
+
+import os
+import math
+import time
+import random
+import threading
+
+import clock
+import config
+
+# Rev 0 - first release
+
+HARDWARE = os.environ.get('PONTIS_HARDWARE', 'pi')
+SIMULATED = HARDWARE == 'simulated'
+
+TSL2591_ADDRESS = 0x29
+HIH6121_ADDRESS = 0x27
+
+faultKinds = ('oserror', 'stuck', 'slow', 'saturate', 'lowbattery')
+
+
+#### FAULTS ####
+class fault():
+    '''one scripted fault, active from start for duration seconds (always if None),
+    again every seconds if every is given
+    '''
+    def __init__(self, kind, address=None, start=0.0, duration=None, every=None, delay=.05):
+        if kind not in faultKinds:
+            raise ValueError('unknown fault ' + str(kind))
+        self.kind = kind
+        self.address = address
+        self.start = start
+        self.duration = duration
+        self.every = every
+        self.delay = delay
+
+    def active(self, elapsed):
+        if elapsed < self.start:
+            return False
+        since = elapsed - self.start
+        if self.every is not None:
+            since = since % self.every
+        return self.duration is None or since < self.duration
+
+
+def parseFaults(text):
+    '''faults of a PONTIS_FAULTS string
+    '''
+    faults = []
+    for item in text.split(';'):
+        item = item.strip()
+        if item == '':
+            continue
+        head, separator, options = item.partition(':')
+        kind, separator, address = head.partition('@')
+        parameters = {}
+        for option in options.split(','):
+            if option.strip() == '':
+                continue
+            name, separator, value = option.partition('=')
+            parameters[name.strip()] = float(value)
+        faults.append(fault(kind.strip(), int(address, 0) if address != '' else None, **parameters))
+    return faults
+
+
+#### SIMULATED WEATHER ####
+class simulatedWeather():
+    '''what the simulated sensors see: a sunny day on the wall clock with an afternoon shower
+    '''
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def reading(self, now=None):
+        '''temp (C), RH (%), lux, wind (km/h) and rain (mm/h) at time now
+        '''
+        if now is None:
+            now = clock.time()
+        local = time.localtime(now)
+        hour = local.tm_hour + local.tm_min / 60 + local.tm_sec / 3600
+        sun = max(math.sin((hour - 6) / 12 * math.pi), 0.0)
+        return {
+            'temp': 22 + 8 * sun + self.random.gauss(0, .2),
+            'RH': min(max(85 - 35 * sun + self.random.gauss(0, 1), 0), 100),
+            'lux': 95000 * sun,
+            'wind': 1 + 3 * sun,
+            'rain': 4.0 if 15 <= hour < 15.5 else 0.0
+            }
+
+
+#### SIMULATED I2C DEVICES ####
+class tsl2591Device():
+    '''TSL2591 registers: enable, control (gain and integration time), id and the two channels
+    '''
+    gains = {0x00: 1., 0x10: 25., 0x20: 428., 0x30: 9876.}
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.registers = {0x00: 0x00, 0x01: 0x00, 0x0A: 0x50}
+        self.frozen = None
+
+    def write_byte_data(self, command, value):
+        self.registers[command & 0x1F] = value
+
+    def read_byte_data(self, command):
+        return self.registers.get(command & 0x1F, 0)
+
+    def read_word_data(self, command):
+        register = command & 0x1F
+        if self.simulation.faultActive(TSL2591_ADDRESS, 'saturate'):
+            return 0xFFFF
+        lux = self.frozen if self.frozen is not None else self.simulation.weather.reading()['lux']
+        if self.simulation.faultActive(TSL2591_ADDRESS, 'stuck'):
+            self.frozen = lux
+        else:
+            self.frozen = None
+
+        # the inverse of Tsl2591.calculate_lux with infrared 20% of full
+        control = self.registers[0x01]
+        countsPerLux = (100. * ((control & 0x07) + 1)) * self.gains[control & 0x30] / 408.0
+        full = min(int(lux * countsPerLux / .672), 0xFFFF)
+        if register == 0x14:
+            return full
+        if register == 0x16:
+            return min(int(.2 * full), 0xFFFF)
+        return self.registers.get(register, 0)
+
+
+class hih6121Device():
+    '''HIH6121: write_quick starts a measurement, the 4 byte read returns it once, then stale
+    '''
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.data = [0x40, 0, 0, 0]  # stale, nothing measured
+        self.fresh = False
+        self.frozen = None
+
+    def write_quick(self):
+        reading = self.simulation.weather.reading()
+        if self.simulation.faultActive(HIH6121_ADDRESS, 'stuck'):
+            if self.frozen is None:
+                self.frozen = reading
+            reading = self.frozen
+        else:
+            self.frozen = None
+
+        humidity = min(max(int(round(reading['RH'] / 100.0 * 16383)), 0), 0x3FFF)
+        temp = min(max(int(round((reading['temp'] + 40.0) / 165.0 * 16384)), 0), 0x3FFF) << 2
+        self.data = [humidity >> 8, humidity & 0xFF, temp >> 8, temp & 0xFC]
+        self.fresh = True
+
+    def read_i2c_block_data(self, command, length):
+        status = 0x00 if self.fresh is True else 0x40
+        self.fresh = False
+        return [self.data[0] | status] + self.data[1:length]
+
+
+class pcf8574Device():
+    '''PCF8574 LCD backpack: nibbles latched on the enable falling edge, bytes to a virtualDisplay
+    '''
+    ENABLE = 0b00000100
+    RS = 0b00000001
+    BACKLIGHT = 0x08
+
+    def __init__(self):
+        import displays
+
+        self.display = displays.virtualDisplay()
+        self.lastValue = 0
+        self.nibble = None
+
+    def write_byte(self, value):
+        if self.lastValue & self.ENABLE and not value & self.ENABLE:
+            if self.nibble is None:
+                self.nibble = value & 0xF0
+            else:
+                self.display.lcd_write(self.nibble | (value >> 4), value & self.RS)
+                self.nibble = None
+        self.display.backlightOn = bool(value & self.BACKLIGHT)
+        self.lastValue = value
+
+
+class simulatedBus():
+    '''the smbus.SMBus calls the drivers make, on the simulated devices
+    '''
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.devices = {}
+
+    def device(self, address):
+        '''the device at address after the faults of the transaction
+        '''
+        for active in self.simulation.activeFaults(address):
+            if active.kind == 'slow':
+                clock.sleep(active.delay)
+            elif active.kind == 'oserror':
+                raise OSError(121, 'Remote I/O error')
+        if address not in self.devices:
+            raise OSError(121, 'Remote I/O error')
+        self.simulation.transactions += 1
+        return self.devices[address]
+
+    def write_quick(self, address):
+        self.device(address).write_quick()
+
+    def write_byte(self, address, value):
+        self.device(address).write_byte(value)
+
+    def write_byte_data(self, address, command, value):
+        self.device(address).write_byte_data(command, value)
+
+    def read_byte_data(self, address, command):
+        return self.device(address).read_byte_data(command)
+
+    def read_word_data(self, address, command):
+        return self.device(address).read_word_data(command)
+
+    def read_i2c_block_data(self, address, command, length):
+        return self.device(address).read_i2c_block_data(command, length)
+
+
+class smbusModule():
+    '''stands in for the smbus module, every SMBus is the one simulated bus
+    '''
+    def __init__(self, bus):
+        self.bus = bus
+
+    def SMBus(self, port=1):
+        return self.bus
+
+
+#### SIMULATED GPIO ####
+class simulatedGPIO():
+    '''the RPi.GPIO calls weather.py makes, levels set by the simulation
+    - callbacks run in the thread changing the level, bouncetime edges are ignored as RPi.GPIO does
+    '''
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.lock = threading.RLock()
+        self.levels = {10: self.HIGH}  # battery fine
+        self.events = {}  # pin: [edge, callback, bouncetime seconds, last event time]
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, state):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=None, initial=None):
+        for pin in (channel if isinstance(channel, (list, tuple)) else [channel]):
+            if initial is not None:
+                self.levels[pin] = initial
+            else:
+                self.levels.setdefault(pin, self.LOW)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def output(self, channel, value):
+        for pin in (channel if isinstance(channel, (list, tuple)) else [channel]):
+            self.levels[pin] = self.HIGH if value else self.LOW
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.events[pin] = [edge, callback, (bouncetime or 0) / 1000, None]
+        self.simulation.start()
+
+    def remove_event_detect(self, pin):
+        self.events.pop(pin, None)
+
+    def cleanup(self, channel=None):
+        self.events = {}
+
+    #### THE SIMULATION SIDE ####
+    def setLevel(self, pin, level):
+        '''changes a pin level, calls its event callback for a detected edge
+        '''
+        with self.lock:
+            level = self.HIGH if level else self.LOW
+            if self.levels.get(pin, self.LOW) == level:
+                return
+            self.levels[pin] = level
+            event = self.events.get(pin)
+            if event is None or event[1] is None:
+                return
+            edge, callback, bouncetime, lastTime = event
+            if edge == (self.FALLING if level == self.HIGH else self.RISING):
+                return
+            now = clock.monotonic()
+            if lastTime is not None and now - lastTime < bouncetime:
+                return
+            event[3] = now
+        callback(pin)
+
+    def pulse(self, pin):
+        self.setLevel(pin, self.HIGH)
+        self.setLevel(pin, self.LOW)
+
+    def press(self, pin, duration=.2):
+        '''a button press released after duration seconds
+        '''
+        self.setLevel(pin, self.HIGH)
+        threading.Timer(duration, self.setLevel, (pin, self.LOW)).start()
+
+
+#### THE SIMULATION ####
+class simulation():
+    '''simulated bus 1, GPIO, weather and faults
+    '''
+    PERIOD = .05  # seconds between anemometer and rain pulses
+
+    def __init__(self, faults=(), seed=None):
+        self.startTime = clock.monotonic()
+        self.faults = list(faults)
+        self.transactions = 0
+        self.weather = simulatedWeather(seed)
+        self.bus = simulatedBus(self)
+        self.bus.devices[TSL2591_ADDRESS] = tsl2591Device(self)
+        self.bus.devices[HIH6121_ADDRESS] = hih6121Device(self)
+        self.lcd = pcf8574Device()
+        self.bus.devices[config.LCDaddress] = self.lcd
+        self.smbus = smbusModule(self.bus)
+        self.GPIO = simulatedGPIO(self)
+        self.thread = None
+        self.autoPulses = True  # False: a replay sends the pulses
+
+    def elapsed(self):
+        return clock.monotonic() - self.startTime
+
+    def activeFaults(self, address):
+        elapsed = self.elapsed()
+        return [item for item in self.faults if item.address == address and item.active(elapsed)]
+
+    def faultActive(self, address, kind):
+        return any(item.kind == kind for item in self.activeFaults(address))
+
+    def start(self):
+        '''starts the anemometer, rain gage and battery pin thread once
+        '''
+        if self.thread is None and self.autoPulses is True:
+            self.thread = threading.Thread(target=self.run, name='simulation', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        pulseDistance = math.pi * 2 * config.anemometerRadius * .00001  # km a revolution
+        windDue = 0.0
+        rainDue = 0.0
+        while True:
+            time.sleep(self.PERIOD)
+            reading = self.weather.reading()
+            windDue += reading['wind'] / (pulseDistance * 3600) * self.PERIOD
+            rainDue += reading['rain'] / 3600 / config.rainGageVolume * self.PERIOD
+            while windDue >= 1:
+                windDue -= 1
+                self.GPIO.pulse(18)
+            while rainDue >= 1:
+                rainDue -= 1
+                self.GPIO.pulse(16)
+            self.GPIO.setLevel(10, not self.faultActive(None, 'lowbattery'))
+
+    def lcdText(self):
+        return self.lcd.display.text()
+
+
+def injectFault(kind, address=None, **parameters):
+    '''adds a fault to the running simulation, start is from now
+    '''
+    parameters['start'] = station.elapsed() + parameters.get('start', 0.0)
+    station.faults.append(fault(kind, address, **parameters))
+
+
+# run as a script (self check, run) nothing needs the RPi modules
+if SIMULATED is True or __name__ == '__main__':
+    station = simulation(parseFaults(os.environ.get('PONTIS_FAULTS', '')))
+    smbus = station.smbus
+    GPIO = station.GPIO
+else:
+    station = None
+    import smbus
+    import RPi.GPIO as GPIO
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'run':
+        import runpy
+        import tempfile
+
+        os.environ['PONTIS_HARDWARE'] = 'simulated'
+        for name in ('PONTIS_SD_PATH', 'PONTIS_USB_PATH'):
+            if name not in os.environ:
+                os.environ[name] = tempfile.mkdtemp(prefix=name[7:].lower())
+                print(name, os.environ[name])
+        # this file runs as __main__, the station imports its own hardware module
+        import hardware
+        config.SDFilePath = os.environ['PONTIS_SD_PATH']
+
+        def showLCD():
+            shown = None
+            while True:
+                time.sleep(.5)
+                text = hardware.station.lcdText()
+                if text != shown:
+                    shown = text
+                    print('+' + '-' * 20 + '+')
+                    for line in text:
+                        print('|' + line + '|')
+                    print('+' + '-' * 20 + '+')
+
+        def readButtons():
+            pins = {'1': 33, '2': 31, '3': 29}
+            for line in sys.stdin:
+                if line.strip() in pins:
+                    hardware.station.GPIO.press(pins[line.strip()])
+
+        threading.Thread(target=showLCD, daemon=True).start()
+        threading.Thread(target=readButtons, daemon=True).start()
+        runpy.run_module('weather', run_name='__main__')
+        sys.exit()
+
+    # the drivers against the simulated devices (a TSL2591 read takes 1 s, HIH6121 .2 s)
+    os.environ['PONTIS_HARDWARE'] = 'simulated'
+    import tsl2591
+    import HIH6121
+    import I2C_LCD_driver3
+
+    test = simulation(parseFaults('oserror@0x27:start=2,duration=1;saturate@0x29:start=3.5;slow@0x23:delay=.0001'), seed=1)
+    for module in (tsl2591, HIH6121, I2C_LCD_driver3):
+        module.smbus = test.smbus
+
+    light = tsl2591.Tsl2591()
+    weather = test.weather.reading()
+    full, ir = light.get_full_luminosity()
+    lux = light.calculate_lux(full, ir)
+    humidity, temp, tempF = HIH6121.HIH6121sensor().returnTempRH()
+    print('lux {:.0f} ({:.0f}), RH {:.1f} ({:.1f}), temp {:.2f} ({:.2f})'.format(
+        lux, weather['lux'], humidity, weather['RH'], temp, weather['temp']))
+    assert abs(lux - weather['lux']) < 20 and abs(humidity - weather['RH']) < 3 and abs(temp - weather['temp']) < 1
+
+    # the LCD bytes come back out of the PCF8574 nibbles
+    lcd = I2C_LCD_driver3.lcd()
+    lcd.lcd_display_string('Simulated', 2, 3)
+    print(test.lcdText())
+    assert test.lcdText()[1] == '   Simulated        '
+
+    # an OSError burst, then saturation
+    time.sleep(max(2.2 - test.elapsed(), 0))
+    try:
+        HIH6121.HIH6121sensor().returnTempRH()
+        raise AssertionError('no OSError')
+    except OSError as error:
+        print('burst: ', error)
+    time.sleep(max(3.6 - test.elapsed(), 0))
+    full, ir = light.get_full_luminosity()
+    assert (full, ir) == (0xFFFF, 0xFFFF) and light.calculate_lux(full, ir) == 0
+    print('saturated: ', hex(full))
+
+    # edges: a button press, anemometer pulses inside the bounce time
+    edges = []
+    test.GPIO.add_event_detect(33, test.GPIO.BOTH, callback=edges.append)
+    test.GPIO.add_event_detect(18, test.GPIO.RISING, callback=edges.append, bouncetime=300)
+    test.GPIO.setLevel(33, True)
+    test.GPIO.setLevel(33, False)
+    test.GPIO.pulse(18)
+    test.GPIO.pulse(18)
+    assert edges == [33, 33, 18]
+    print('transactions', test.transactions, ', ok')
@@ -0,0 +1,333 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# ingest.py
+# Rev 0
+"""ingest - merges the data files of collected USB drives into a central store
+
+A collected directory holds copies of station USB drives, at any depth:
+    collected/visit12/stick3/station.txt        station name, from weather.py
+    collected/visit12/stick3/weatherData.csv
+    collected/visit12/stick3/weatherHistory.csv
+    collected/visit12/stick3/weatherArchive/weatherData_2019-10.csv.gz
+A drive without station.txt, or with a stock host name in it
+(config.genericStationNames, every RPi image is 'raspberrypi'), is named
+after its directory and reported, so stations are never merged by it.
+
+The store keeps one merged file per station and data file, one row per
+timestamp in time order, in the station CSV dialect:
+    store/<station>/weatherData.csv
+    store/<station>/weatherData.times.npy     row timestamps, for dedupe
+    store/ingestState.json                    what has been read of each source
+
+Stations are ingested in parallel, one station per worker process, so the
+stores never share a writer. A source file read before is only read past the
+last ingested offset, if the bytes before that offset are unchanged.
+
+    python3 ingest.py <collected dir> <store dir> [processes]
+"""
+
+import os
+import json
+import zlib
+
+import numpy as np
+
+import config
+import dataArchive
+import stationLoader
+
+# Rev 0 - first release
+
+stateFileName = 'ingestState.json'
+
+# bytes before the last ingested offset that must be unchanged to read on from it
+CHECK_BYTES = 4096
+
+
+#### SOURCES ####
+def readStationName(dirPath):
+    '''station name from station.txt, the directory name if there is none
+    - a stock host name is reported and not used, it would merge different stations
+    '''
+    try:
+        with open(dirPath + '/' + config.stationFileName) as file:
+            stationName = file.readline().strip()
+    except (OSError, UnicodeDecodeError):
+        stationName = ''
+    if stationName in config.genericStationNames:
+        print(dirPath, ': station name', stationName, 'is a stock host name, named after the directory')
+        stationName = ''
+    if stationName == '':
+        stationName = os.path.basename(os.path.abspath(dirPath))
+    return stationName
+
+
+def sourceFileName(filePathName):
+    '''the live file a source holds rows of, None if it is not a data file
+    - weatherData_2019-10.csv.gz -> weatherData.csv
+    '''
+    fileName = os.path.basename(filePathName)
+    for liveFileName in (config.dataFileName, config.historyFileName):
+        base, extension = os.path.splitext(liveFileName)
+        if fileName == liveFileName or fileName.startswith(base + '_') and extension in fileName:
+            return liveFileName
+    return None
+
+
+def findSources(collectedPath):
+    '''{station: [source file path names]} for every drive below collectedPath
+    '''
+    sources = {}
+    for root, dirs, files in os.walk(collectedPath):
+        if config.dataFileName not in files and config.historyFileName not in files:
+            continue
+        filePathNames = [root + '/' + fileName for fileName in files if sourceFileName(fileName) is not None]
+        archive = dataArchive.archivePath(root)
+        if os.path.isdir(archive):
+            for fileName in os.listdir(archive):
+                if sourceFileName(fileName) is not None:
+                    filePathNames.append(archive + '/' + fileName)
+        sources.setdefault(readStationName(root), []).extend(sorted(filePathNames))
+    return sources
+
+
+#### INGEST STATE ####
+def readState(storePath):
+    '''returns the ingest state, {'sources': {}, 'partitions': {}} if there is none yet
+    '''
+    try:
+        with open(storePath + '/' + stateFileName) as file:
+            state = json.load(file)
+    except (FileNotFoundError, ValueError):
+        state = {'sources': {}, 'partitions': {}}
+    return state
+
+
+def writeState(storePath, state):
+    '''writes the state to a temp file then renames it over the old one
+    '''
+    filePathName = storePath + '/' + stateFileName
+    with open(filePathName + '.tmp', 'w') as file:
+        json.dump(state, file, indent=1, sort_keys=True)
+        file.write('\n')
+    os.replace(filePathName + '.tmp', filePathName)
+
+
+def readNewBytes(filePathName, previous):
+    '''header line and the bytes past the last ingested offset of a live file
+    returns (header, block, blockOffset, fileSize)
+    - reads the whole file if it changed before the offset or is new
+    '''
+    with open(filePathName, 'rb') as file:
+        header = file.readline()
+        file.seek(0, 2)
+        fileSize = file.tell()
+
+        offset = len(header)
+        if previous is not None and len(header) < previous['offset'] <= fileSize:
+            checkStart = max(previous['offset'] - CHECK_BYTES, 0)
+            file.seek(checkStart)
+            if '{:08x}'.format(zlib.crc32(file.read(previous['offset'] - checkStart))) == previous['check']:
+                offset = previous['offset']
+
+        file.seek(offset)
+        return header, file.read(), offset, fileSize
+
+
+#### ROW BLOCKS ####
+def gatherLines(buffer, starts, lengths):
+    '''bytes of the lines at starts (lengths include the newline), in that order
+    - a single vectorised byte gather
+    '''
+    outStarts = np.cumsum(lengths) - lengths
+    index = np.arange(int(lengths.sum()), dtype=np.int64) + np.repeat(starts - outStarts, lengths)
+    return buffer[index]
+
+
+def parseRows(block):
+    '''parses a header + rows block -> (times, lines, lineLengths)
+    - times are int64 minutes (weatherData) or days (weatherHistory)
+    '''
+    rows, info = stationLoader.parseBuffer(block, lineSpans=True)
+    buffer = np.frombuffer(block, dtype=np.uint8)
+    lengths = info['lineEnds'] + 1 - info['lineStarts']
+    return rows['time'].astype(np.int64), gatherLines(buffer, info['lineStarts'], lengths), lengths
+
+
+class rowSet():
+    '''rows (time, line bytes) of one station file, in time order, one per time
+    '''
+    def __init__(self, times, lines, lengths):
+        order = np.argsort(times, kind='stable')
+        times = times[order]
+        keep = np.ones(len(times), dtype=bool)
+        keep[1:] = times[1:] != times[:-1]  # the first copy of a time wins
+
+        lineStarts = np.cumsum(lengths) - lengths
+        self.times = times[keep]
+        self.lengths = lengths[order][keep]
+        self.lines = gatherLines(lines, lineStarts[order][keep], self.lengths)
+
+    @classmethod
+    def join(cls, rowSets):
+        return cls(np.concatenate([rows.times for rows in rowSets]),
+            np.concatenate([rows.lines for rows in rowSets]),
+            np.concatenate([rows.lengths for rows in rowSets]))
+
+    def without(self, times):
+        '''rows whose time is not in times (sorted)
+        '''
+        index = np.minimum(np.searchsorted(times, self.times), max(len(times) - 1, 0))
+        new = np.ones(len(self.times), dtype=bool) if len(times) == 0 else times[index] != self.times
+        lineStarts = np.cumsum(self.lengths) - self.lengths
+        return rowSet(self.times[new], gatherLines(self.lines, lineStarts[new], self.lengths[new]),
+            self.lengths[new])
+
+
+#### STATION STORE ####
+def storeFilePathName(storePath, station, liveFileName):
+    return storePath + '/' + station + '/' + liveFileName
+
+
+def readStoreTimes(filePathName):
+    try:
+        return np.load(filePathName + '.times.npy')
+    except FileNotFoundError:
+        return np.zeros(0, dtype=np.int64)
+
+
+def mergeIntoStore(filePathName, header, newRows, storeTimes):
+    '''adds new rows (none of them already stored) to a station store file
+    - rows later than the store are appended, otherwise the file is rewritten
+    '''
+    if len(newRows.times) == 0:
+        return
+    if len(storeTimes) == 0 or newRows.times[0] > storeTimes[-1]:
+        newFile = not os.path.exists(filePathName)
+        with open(filePathName, 'ab') as file:
+            if newFile is True:
+                file.write(header)
+            file.write(newRows.lines.tobytes())
+        times = np.concatenate([storeTimes, newRows.times])
+    else:
+        # rows from before the end of the store, merge the two in time order
+        with open(filePathName, 'rb') as file:
+            header = file.readline()
+            body = np.frombuffer(file.read(), dtype=np.uint8)
+        lineEnds = np.flatnonzero(body == 10)
+        lengths = np.diff(lineEnds, prepend=-1)
+        merged = rowSet.join([rowSet(storeTimes, body, lengths), newRows])
+        with open(filePathName + '.tmp', 'wb') as file:
+            file.write(header)
+            file.write(merged.lines.tobytes())
+        os.replace(filePathName + '.tmp', filePathName)
+        times = merged.times
+
+    np.save(filePathName + '.times.tmp.npy', times)
+    os.replace(filePathName + '.times.tmp.npy', filePathName + '.times.npy')
+
+
+def ingestStation(task):
+    '''worker: reads the new rows of one station's sources and merges them
+    task is (station, filePathNames, storePath, previous source states, known partitions)
+    returns (station, source states, partition checksums, rows read, rows added)
+    '''
+    station, filePathNames, storePath, previousSources, partitions = task
+    os.makedirs(storePath + '/' + station, exist_ok=True)
+    sourceStates = {}
+    partitions = set(partitions)
+    pieces = {config.dataFileName: [], config.historyFileName: []}
+    headers = {}
+    rowsRead = 0
+
+    for filePathName in filePathNames:
+        liveFileName = sourceFileName(filePathName)
+        try:
+            if os.path.basename(filePathName) != liveFileName:
+                # partitions never change, skip any seen before on any drive
+                checksum = dataArchive.fileChecksum(filePathName)
+                if checksum in partitions:
+                    continue
+                with dataArchive.openPartition(filePathName, 'rb') as file:
+                    block = file.read()
+                header = block[:block.find(b'\n') + 1]
+                partitions.add(checksum)
+            else:
+                previous = previousSources.get(os.path.abspath(filePathName))
+                header, block, offset, fileSize = readNewBytes(filePathName, previous)
+                if offset > len(header) and block == b'':
+                    continue
+                # only complete lines are ingested, a torn last row is read again next time
+                complete = block.rfind(b'\n') + 1
+                block = header + block[:complete]
+                endOffset = offset + complete
+                with open(filePathName, 'rb') as file:
+                    checkStart = max(endOffset - CHECK_BYTES, 0)
+                    file.seek(checkStart)
+                    check = '{:08x}'.format(zlib.crc32(file.read(endOffset - checkStart)))
+                sourceStates[os.path.abspath(filePathName)] = {
+                    'station': station, 'offset': endOffset, 'check': check}
+
+            times, lines, lengths = parseRows(block)
+        except (OSError, EOFError, ValueError, zlib.error) as error:
+            print(filePathName, ': ', error)
+            continue
+        rowsRead += len(times)
+        headers.setdefault(liveFileName, header)
+        pieces[liveFileName].append(rowSet(times, lines, lengths))
+
+    rowsAdded = 0
+    for liveFileName, rowSets in pieces.items():
+        if rowSets == []:
+            continue
+        filePathName = storeFilePathName(storePath, station, liveFileName)
+        storeTimes = readStoreTimes(filePathName)
+        newRows = rowSet.join(rowSets).without(storeTimes)
+        mergeIntoStore(filePathName, headers[liveFileName], newRows, storeTimes)
+        rowsAdded += len(newRows.times)
+
+    return station, sourceStates, sorted(partitions), rowsRead, rowsAdded
+
+
+def ingest(collectedPath, storePath, processes=None):
+    '''ingests every drive below collectedPath into the store
+    returns {station: (rows read, rows added)}
+    '''
+    import multiprocessing
+
+    os.makedirs(storePath, exist_ok=True)
+    state = readState(storePath)
+    tasks = []
+    for station, filePathNames in sorted(findSources(collectedPath).items()):
+        previousSources = {}
+        for filePathName in filePathNames:
+            previous = state['sources'].get(os.path.abspath(filePathName))
+            if previous is not None:
+                previousSources[os.path.abspath(filePathName)] = previous
+        tasks.append((station, filePathNames, storePath, previousSources,
+            state['partitions'].get(station, [])))
+
+    results = {}
+    with multiprocessing.Pool(processes) as pool:
+        for station, sourceStates, partitions, rowsRead, rowsAdded in pool.imap_unordered(ingestStation, tasks):
+            state['sources'].update(sourceStates)
+            state['partitions'][station] = partitions
+            results[station] = (rowsRead, rowsAdded)
+
+    writeState(storePath, state)
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if len(sys.argv) < 3:
+        print('usage: ingest.py <collected dir> <store dir> [processes]')
+        sys.exit(1)
+
+    startTime = time.time()
+    results = ingest(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else None)
+    for station, (rowsRead, rowsAdded) in sorted(results.items()):
+        print(station, ': ', rowsRead, 'rows read, ', rowsAdded, 'new')
+    print(len(results), 'stations in ', '{:.2f}'.format(time.time() - startTime), 's')
@@ -0,0 +1,269 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# loopTiming.py
+# Rev 0
+"""loopTiming - where the station's time goes, phase by phase
+
+Each phase (the acquisition tick and its 5 second, 30 second, hourly and
+midnight work, the sensor reads, the buttons and LCD of the UI loop) has a
+latencyHistogram: HDR style buckets, 16 to a power of two (6% precision)
+from 1 us to 35 minutes, in a fixed list, so recording is a few integer
+operations and the memory never grows. A duration over the phase deadline
+is also counted as late.
+
+    start = loopTiming.now()
+    ... the phase ...
+    self.timing.record('every 5 seconds', start)
+
+The station shows p50/p99/max of a phase on the MX 'timing' page and
+dumps the hour's histograms to config.timingFileName on the USB drive
+every hour. Two threads record (UI loop and acquisition), into different
+phases; a count lost to a race is not worth a lock on every record.
+
+Self check:
+    python3 loopTiming.py
+"""
+
+import math
+import time
+
+import recordCheck
+
+# Rev 0 - first release
+
+SUB_BUCKETS = 16  # buckets to a power of two
+SUB_BITS = 4
+MAGNITUDES = 28  # 1 us to 2**31 us (35 minutes)
+
+# phase: (short name for the LCD, deadline seconds)
+# the acquisition phases must be done in their 1 second slot ('every
+# second' is all of a tick's work, 'tick' adds the thread's call and the
+# ticks that raised), the UI loop polls every pollingDelay (.1 s) and a
+# button should answer in it. The main screen redraw is 79 bytes at
+# PCF8574_BYTE_TIME, ~240 ms measured by the displays.py self check, so
+# it is late at twice that.
+PHASES = {
+    'tick': ('tick', 1.0),
+    'every second': ('1 second', 1.0),
+    'every 5 seconds': ('5 seconds', 1.0),
+    'every 30 seconds': ('30 seconds', 1.0),
+    'hourly': ('hourly', 1.0),
+    'midnight': ('midnight', 1.0),
+    'readSolar': ('readSolar', 1.0),
+    'readTempRH': ('readTempRH', 1.0),
+    'readWind': ('readWind', 1.0),
+    'buttons': ('buttons', .1),
+    'LCD second': ('LCD second', .1),
+    'LCD main screen': ('LCD main', .5)
+    }
+
+timingHeader = 'DateTime,Phase,Count,p50 (ms),p99 (ms),Max (ms),Late,'
+
+
+def now():
+    '''start of a phase (wall seconds, also under a replay)
+    '''
+    return time.perf_counter()
+
+
+def bucketIndex(microseconds):
+    '''bucket of a duration in whole microseconds
+    - below SUB_BUCKETS one bucket a microsecond, then SUB_BUCKETS a power of two
+    '''
+    if microseconds < SUB_BUCKETS:
+        return microseconds
+    magnitude = microseconds.bit_length() - SUB_BITS - 1
+    index = (magnitude + 1) * SUB_BUCKETS + (microseconds >> magnitude) - SUB_BUCKETS
+    return min(index, SUB_BUCKETS * MAGNITUDES - 1)
+
+
+def bucketValue(index):
+    '''largest microseconds in a bucket
+    '''
+    if index < SUB_BUCKETS:
+        return index
+    magnitude = index // SUB_BUCKETS - 1
+    sub = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((sub + 1) << magnitude) - 1
+
+
+class latencyHistogram():
+    '''durations of one phase in fixed memory
+    '''
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.counts = [0] * (SUB_BUCKETS * MAGNITUDES)
+        self.clear()
+
+    def clear(self):
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+        self.count = 0
+        self.late = 0
+        self.maximum = 0.0
+
+    def record(self, seconds):
+        self.counts[bucketIndex(int(seconds * 1e6))] += 1
+        self.count += 1
+        if seconds > self.maximum:
+            self.maximum = seconds
+        if self.deadline is not None and seconds > self.deadline:
+            self.late += 1
+
+    def add(self, other):
+        '''adds the durations of other
+        '''
+        for index, count in enumerate(other.counts):
+            if count != 0:
+                self.counts[index] += count
+        self.count += other.count
+        self.late += other.late
+        self.maximum = max(self.maximum, other.maximum)
+
+    def percentile(self, fraction):
+        '''seconds that fraction of the durations are at or below (0 if none)
+        '''
+        if self.count == 0:
+            return 0.0
+        target = max(math.ceil(fraction * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(bucketValue(index) / 1e6, self.maximum)
+        return self.maximum
+
+
+class loopTiming():
+    '''the phase histograms of this hour and of the hours before
+    '''
+    def __init__(self, phases=PHASES):
+        self.phases = phases
+        self.hour = {}
+        self.total = {}
+        for phase, (shortName, deadline) in phases.items():
+            self.hour[phase] = latencyHistogram(deadline)
+            self.total[phase] = latencyHistogram(deadline)
+
+    def record(self, phase, start):
+        '''a phase that began at start (from now())
+        '''
+        self.hour[phase].record(time.perf_counter() - start)
+
+    def timed(self, phase, function):
+        '''function, recorded as phase on each call
+        '''
+        def timedFunction(*arguments):
+            start = time.perf_counter()
+            try:
+                return function(*arguments)
+            finally:
+                self.hour[phase].record(time.perf_counter() - start)
+        return timedFunction
+
+    def summary(self, phase):
+        '''dictionary: count, p50, p99, max (seconds) and late, since the station started
+        '''
+        histogram = latencyHistogram()
+        histogram.add(self.total[phase])
+        histogram.add(self.hour[phase])
+        return {
+            'count': histogram.count,
+            'p50': histogram.percentile(.5),
+            'p99': histogram.percentile(.99),
+            'max': histogram.maximum,
+            'late': histogram.late
+            }
+
+    def lcdLines(self, phase):
+        '''the MX page of a phase, 2 lines of up to 19 characters
+        - phase name, then p50/p99/max in ms and L late
+        '''
+        summary = self.summary(phase)
+        values = '/'.join(millisecondText(summary[key]) for key in ('p50', 'p99', 'max'))
+        return self.phases[phase][0], values + ' L' + str(min(summary['late'], 999))
+
+    def dumpHour(self, filePathName, dateTime):
+        '''appends this hour's phases to the timing file and starts the next hour
+        - one stamped row a phase that ran, the header if the file is new
+        '''
+        lines = []
+        for phase, histogram in self.hour.items():
+            if histogram.count == 0:
+                continue
+            line = dateTime + ',' + phase + ',' + str(histogram.count) + ','
+            for seconds in (histogram.percentile(.5), histogram.percentile(.99), histogram.maximum):
+                line = line + '{:.3f}'.format(seconds * 1000) + ','
+            line = line + str(histogram.late) + ','
+            lines.append(recordCheck.stampRecord(line))
+
+        for phase, histogram in self.hour.items():
+            self.total[phase].add(histogram)
+            histogram.clear()
+
+        try:
+            with open(filePathName) as file:
+                pass
+            header = ''
+        except FileNotFoundError:
+            header = timingHeader + '\n'
+        with open(filePathName, 'a') as file:
+            file.write(header + ''.join(lines))
+        recordCheck.updateIndex(filePathName)
+        return len(lines)
+
+
+def millisecondText(seconds):
+    '''4 characters or less of milliseconds: .85 4.8 210 1500, then seconds: 12s >99s
+    '''
+    milliseconds = seconds * 1000
+    if milliseconds < 1:
+        return '{:.2f}'.format(milliseconds)[1:]
+    if milliseconds < 10:
+        return '{:.1f}'.format(milliseconds)
+    if milliseconds < 9999.5:
+        return '{:.0f}'.format(milliseconds)
+    if seconds < 99.5:
+        return '{:.0f}'.format(seconds) + 's'
+    return '>99s'
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    # bucket edges: every value lands in a bucket no more than 1/16 above it
+    for microseconds in list(range(0, 5000)) + [10**6, 123456789, 2**31 - 1]:
+        value = bucketValue(bucketIndex(microseconds))
+        assert microseconds <= value <= microseconds * (1 + 1 / SUB_BUCKETS), (microseconds, value)
+    print('buckets ok, ', SUB_BUCKETS * MAGNITUDES, 'a phase')
+
+    timing = loopTiming()
+    histogram = timing.hour['tick']
+    for millisecond in range(1, 1001):
+        histogram.record(millisecond / 1e6 * 1000)
+    histogram.record(1.5)  # a late tick
+    summary = timing.summary('tick')
+    print('tick: ', summary)
+    assert summary['count'] == 1001 and summary['late'] == 1
+    assert 0.500 <= summary['p50'] <= 0.500 * (1 + 1 / SUB_BUCKETS)
+    assert 0.990 <= summary['p99'] <= 0.990 * (1 + 1 / SUB_BUCKETS)
+    assert summary['max'] == 1.5
+    print('LCD: ', timing.lcdLines('tick'))
+
+    # record cost
+    start = now()
+    for call in range(100000):
+        timing.record('readWind', now())
+    print('record: ', '{:.2f}'.format((now() - start) / 100000 * 1e6), 'us')
+
+    filePathName = os.path.join(tempfile.mkdtemp(), 'weatherTiming.csv')
+    rows = timing.dumpHour(filePathName, '2019-10-10:12:00')
+    rows += timing.dumpHour(filePathName, '2019-10-10:13:00')
+    with open(filePathName) as file:
+        lines = file.readlines()
+    print(''.join(lines[:3]), end='')
+    assert rows == 2 and len(lines) == 3
+    assert all(recordCheck.checkRecord(line.rstrip('\n').encode()) == recordCheck.RECORD_OK for line in lines[1:])
+    assert timing.hour['tick'].count == 0 and timing.summary('tick')['count'] == 1001
+    print('ok')
@@ -0,0 +1,175 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# messageCatalog.py
+# Rev 0
+"""messageCatalog - LCD messages in every language, encoded once for the LCD
+
+Messages are keyed by their English text and kept in one JSON file per
+language in the messages directory:
+    messages/English.json   every message (the list for translators)
+    messages/Spanish.json
+    messages/Miskito.json
+    {"language": "Spanish", "fallback": "English", "messages": {"page": "pagina", ...}}
+
+A message missing from a language comes from its fallback language, then
+is shown as the English key. Messages may name character ROM glyphs in
+braces, e.g. "{left arrow}" or "{degree}" (custom characters are drawn
+with glyphCache, their CGRAM slots change).
+
+At load every message is also encoded to the HD44780 character ROM (A00,
+Japanese) bytes the LCD is sent: accented letters the ROM has (n tilde,
+u and o umlaut, degree) use their ROM codes, others lose the accent, glyph
+names become their ROM code. So screens send bytes with
+lcd_display_bytes and nothing is looked up or converted while they run.
+
+    messageCatalog.getWord('page')    'pagina'
+    messageCatalog.getBytes('page')   b'pagina'
+"""
+
+import os
+import json
+import unicodedata
+
+import config
+
+# Rev 0 - first release, replaces the dictionary in EnglishSpanish.getWord
+
+MESSAGES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'messages')
+
+# glyphs in the A00 character ROM
+romGlyphs = {
+    'right arrow': 126,
+    'left arrow': 127,
+    'degree': 223
+    }
+
+# characters outside ASCII that the A00 character ROM has
+romCharacters = {
+    'ñ': 0xEE,
+    'ä': 0xE1,
+    'ö': 0xEF,
+    'ü': 0xF5,
+    'ß': 0xE2,
+    'µ': 0xE4,
+    '°': 0xDF,
+    '·': 0xA5,
+    '¥': 0x5C
+    }
+
+
+def encodeCharacter(character):
+    '''one character -> HD44780 A00 ROM code
+    '''
+    code = ord(character)
+    if 32 <= code < 126 and character not in ('\\', '~'):
+        return code
+    if character in romCharacters:
+        return romCharacters[character]
+    if character.lower() in romCharacters and character.lower() != character:
+        return romCharacters[character.lower()]  # the ROM has no capital n tilde or umlauts
+    # drop the accent: 'á' -> 'a'
+    base = unicodedata.normalize('NFKD', character).encode('ascii', 'ignore')
+    if len(base) == 1 and 32 <= base[0] < 126:
+        return base[0]
+    return ord('?')
+
+
+def encode(text):
+    '''message text -> LCD bytes, {glyph name} becomes the glyph code
+    '''
+    encoded = bytearray()
+    position = 0
+    while position < len(text):
+        character = text[position]
+        if character == '{':
+            end = text.find('}', position)
+            name = text[position + 1:end] if end > 0 else None
+            if name in romGlyphs:
+                encoded.append(romGlyphs[name])
+                position = end + 1
+                continue
+        encoded.append(encodeCharacter(character))
+        position += 1
+    return bytes(encoded)
+
+
+def readLanguage(language, path=MESSAGES_PATH):
+    '''(messages, fallback language) of one language file, ({}, None) if none
+    '''
+    try:
+        with open(os.path.join(path, language + '.json'), encoding='utf-8') as file:
+            catalog = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}, None
+    return catalog.get('messages', {}), catalog.get('fallback')
+
+
+class messageCatalog():
+    '''messages of one language with their LCD bytes
+    '''
+    def __init__(self, language, path=MESSAGES_PATH):
+        self.language = language
+
+        # language, its fallbacks, last English
+        chain = []
+        nextLanguage = language
+        while nextLanguage is not None and nextLanguage not in [name for name, messages in chain]:
+            messages, fallback = readLanguage(nextLanguage, path)
+            chain.append((nextLanguage, messages))
+            nextLanguage = fallback
+        if 'English' not in [name for name, messages in chain]:
+            chain.append(('English', readLanguage('English', path)[0]))
+
+        self.words = {}
+        for name, messages in reversed(chain):
+            self.words.update(messages)
+        self.encoded = dict((key, encode(word)) for key, word in self.words.items())
+
+    def getWord(self, EnglishWord):
+        return self.words.get(EnglishWord, EnglishWord)
+
+    def getBytes(self, EnglishWord):
+        '''LCD bytes of a message, messages not in the catalog are encoded once
+        '''
+        encoded = self.encoded.get(EnglishWord)
+        if encoded is None:
+            encoded = encode(self.getWord(EnglishWord))
+            self.encoded[EnglishWord] = encoded
+        return encoded
+
+
+# the catalog of config.language, loaded at the first message
+catalog = None
+
+
+def current():
+    global catalog
+    if catalog is None or catalog.language != config.language:
+        catalog = messageCatalog(config.language)
+    return catalog
+
+
+def getWord(EnglishWord):
+    return current().getWord(EnglishWord)
+
+
+def getBytes(EnglishWord):
+    return current().getBytes(EnglishWord)
+
+
+if __name__ == '__main__':
+    import sys
+
+    # every language: messages missing against English, and what the LCD is sent
+    english = readLanguage('English')[0]
+    for fileName in sorted(os.listdir(MESSAGES_PATH)):
+        language = fileName[:-len('.json')]
+        languageCatalog = messageCatalog(language)
+        own = readLanguage(language)[0]
+        missing = [key for key in english if key not in own]
+        print(language, ': ', len(own), 'messages, ', len(missing), 'from the fallback')
+        if len(sys.argv) > 1 and sys.argv[1] == 'show':
+            for key in english:
+                print('    ', repr(key), '->', languageCatalog.getBytes(key))
+    assert encode('{left arrow}año {degree}C') == bytes([127]) + b'a\xeeo \xdfC'
+    assert encode('está') == b'esta'
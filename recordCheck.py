@@ -0,0 +1,232 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# recordCheck.py
+# Rev 0
+"""recordCheck - per record CRC32 and tail repair for the USB data files
+
+Every row written by weather.py ends with the crc32 of the row text:
+    2019-10-10:14:00,27,81,0,3,9,41000,0.271,4.120,/,5f3a09c1
+
+Rows written before Rev A.2 end with a trailing comma and no crc, these are
+treated as legacy rows and accepted.
+
+At startup verifyTail checks the rows written since the last verified offset
+(kept in <file>.idx), never more than config.verifyTailBytes. Torn or garbled
+rows are removed from the file and appended to <file>.bad. The index is
+only moved after the rows are on the drive (fsync), so a power cut cannot
+leave it past rows still in the page cache.
+
+Standalone scanner for collected files (uses all cores):
+    python3 recordCheck.py scan <directory> [repair]
+"""
+
+import os
+import zlib
+
+import clock
+import config
+
+# Rev 0 - first release with crc stamped records
+
+#### RECORD STAMP ####
+RECORD_OK = 0
+RECORD_LEGACY = 1
+RECORD_BAD = 2
+
+
+def recordCRC(rowBytes):
+    '''crc32 of the row text, 8 lower case hex digits
+    '''
+    return '{:08x}'.format(zlib.crc32(rowBytes))
+
+
+def stampRecord(row):
+    '''row (ending with the trailing comma) -> row + crc + newline
+    '''
+    return row + recordCRC(row.encode('utf-8')) + '\n'
+
+
+def checkRecord(line):
+    '''checks one line (bytes, without the newline)
+    returns RECORD_OK, RECORD_LEGACY or RECORD_BAD
+    '''
+    if line.endswith(b'\r'):
+        line = line[:-1]
+    if line.endswith(b','):
+        return RECORD_LEGACY
+    if len(line) < 10 or line[-9:-8] != b',':
+        return RECORD_BAD
+    if recordCRC(line[:-8]).encode('ascii') != line[-8:]:
+        return RECORD_BAD
+    return RECORD_OK
+
+
+def checkBlock(block, skipHeader):
+    '''checks a block of complete and incomplete lines
+    returns (goodLines, badLines) as lists of bytes including newlines
+    - the last line is torn if the block does not end in a newline
+    '''
+    goodLines = []
+    badLines = []
+    lines = block.split(b'\n')
+    lastLine = lines.pop()  # '' when the block ends with a newline
+
+    for lineNumber, line in enumerate(lines):
+        if skipHeader is True and lineNumber == 0:
+            goodLines.append(line + b'\n')
+        elif line.strip() == b'':
+            continue
+        elif checkRecord(line) == RECORD_BAD:
+            badLines.append(line + b'\n')
+        else:
+            goodLines.append(line + b'\n')
+
+    if lastLine != b'':
+        badLines.append(lastLine + b'\n')
+
+    return goodLines, badLines
+
+
+#### TAIL INDEX ####
+def readIndex(filePathName):
+    '''byte offset up to which the file was last verified, 0 if unknown
+    '''
+    try:
+        with open(filePathName + '.idx') as file:
+            return int(file.readline())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def updateIndex(filePathName):
+    '''records the current end of file as verified
+    - called after each complete record is written and the file closed
+    - the rows are synced to the drive first
+    '''
+    try:
+        with open(filePathName, 'rb') as file:
+            os.fsync(file.fileno())
+            fileSize = os.fstat(file.fileno()).st_size
+    except FileNotFoundError:
+        return
+    with open(filePathName + '.idx', 'w') as file:
+        file.write(str(fileSize) + '\n')
+
+
+def quarantine(filePathName, badLines):
+    '''appends removed lines to <file>.bad with the time they were found
+    '''
+    with open(filePathName + '.bad', 'ab') as file:
+        foundTime = '{:%Y-%m-%d:%_H:%M}'.format(clock.now()).encode('ascii')
+        for line in badLines:
+            file.write(b'# found ' + foundTime + b'\n')
+            file.write(line)
+
+
+def verifyTail(filePathName, maxBytes=None):
+    '''verifies rows after the tail index, removes and quarantines bad rows
+    - reads at most maxBytes so startup time is bounded
+    - returns the number of rows removed
+    '''
+    if maxBytes is None:
+        maxBytes = config.verifyTailBytes
+
+    fileSize = os.path.getsize(filePathName)
+    verifiedOffset = readIndex(filePathName)
+    if verifiedOffset > fileSize:
+        # file was rewritten or replaced, only the window can be trusted
+        verifiedOffset = 0
+    startOffset = max(verifiedOffset, fileSize - maxBytes, 0)
+
+    with open(filePathName, 'r+b') as file:
+        if startOffset > 0:
+            # start on a line boundary
+            file.seek(startOffset - 1)
+            if file.read(1) != b'\n':
+                file.readline()
+            startOffset = file.tell()
+        file.seek(startOffset)
+        block = file.read()
+
+        goodLines, badLines = checkBlock(block, startOffset == 0)
+
+        if badLines != []:
+            quarantine(filePathName, badLines)
+            file.seek(startOffset)
+            file.truncate()
+            file.write(b''.join(goodLines))
+
+    updateIndex(filePathName)
+    return len(badLines)
+
+
+#### STANDALONE SCANNER ####
+def scanFile(filePathName, repair=False):
+    '''checks every row of one file (plain or a compressed partition)
+    returns (filePathName, rows, legacyRows, badRows)
+    '''
+    if filePathName.endswith('.gz') or filePathName.endswith('.xz'):
+        import dataArchive
+        with dataArchive.openPartition(filePathName, 'rb') as file:
+            block = file.read()
+        repair = False
+    else:
+        with open(filePathName, 'rb') as file:
+            block = file.read()
+
+    goodLines, badLines = checkBlock(block, True)
+    legacyRows = 0
+    for line in goodLines[1:]:
+        if line.rstrip(b'\r\n').endswith(b','):
+            legacyRows += 1
+
+    if repair is True and badLines != []:
+        quarantine(filePathName, badLines)
+        with open(filePathName, 'wb') as file:
+            file.write(b''.join(goodLines))
+
+    return filePathName, len(goodLines) - 1 + len(badLines), legacyRows, len(badLines)
+
+
+def findDataFiles(directory):
+    '''all csv files and csv partitions below directory
+    '''
+    filePathNames = []
+    for root, dirs, files in os.walk(directory):
+        for fileName in files:
+            if fileName.endswith(('.csv', '.csv.gz', '.csv.xz')):
+                filePathNames.append(os.path.join(root, fileName))
+    return sorted(filePathNames)
+
+
+def scanDirectory(directory, repair=False, processes=None):
+    '''scans all data files below directory in parallel
+    returns list of (filePathName, rows, legacyRows, badRows)
+    '''
+    import functools
+    import multiprocessing
+
+    filePathNames = findDataFiles(directory)
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(functools.partial(scanFile, repair=repair), filePathNames, chunksize=8)
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if len(sys.argv) >= 3 and sys.argv[1] == 'scan':
+        startTime = time.time()
+        results = scanDirectory(sys.argv[2], repair=(sys.argv[-1] == 'repair'))
+        totalRows = 0
+        for filePathName, rows, legacyRows, badRows in results:
+            totalRows += rows
+            if badRows > 0:
+                print(filePathName, ': ', badRows, ' bad of ', rows, ' rows')
+        print(len(results), 'files, ', totalRows, 'rows, ', sum(result[3] for result in results),
+            'bad rows in ', '{:.2f}'.format(time.time() - startTime), 's')
+    elif len(sys.argv) == 3 and sys.argv[1] == 'tail':
+        print(verifyTail(sys.argv[2]), 'rows removed')
+    else:
+        print('usage: recordCheck.py scan <directory> [repair] | tail <file>')
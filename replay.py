@@ -0,0 +1,283 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# replay.py
+# Rev 0
+"""replay - runs the station's acquisition and period logic on a virtual clock
+
+A weatherStation is built on simulated hardware (hardware.py) with a
+virtual clock (clock.py). The sensors read a stream instead of the
+simulated day, and each 1 second slot is ticked through the station's own
+acquisitionThread.runSlot, the way the thread does it on the RPi. Only the
+time is virtual: the weatherData and weatherHistory CSV files, the rollups,
+the checkpoint and the forecast are written to the SD and USB directories
+just as a live run writes them. Slots are counted as missed when the
+ticks' sleeps (the sensor conversions) run past the next boundary, as they
+would live.
+
+Streams:
+    syntheticStream(seed)     the simulated day of hardware.py, repeatable
+    ringStream(filePathName)  a weatherSamples.ring recorded by a station
+
+    python3 replay.py synthetic <days> [output directory]
+    python3 replay.py ring <weatherSamples.ring> [output directory]
+    python3 replay.py compare <output directory> <output directory>
+
+The station's prints go to replay.log in the output directory.
+"""
+
+import os
+import sys
+import math
+import time
+import bisect
+import tempfile
+import contextlib
+from datetime import datetime
+
+# the station modules take the simulated hardware, imported after this
+os.environ['PONTIS_HARDWARE'] = 'simulated'
+
+import clock
+import config
+import hardware
+import acquisition
+import sampleRing
+
+# Rev 0 - first release
+
+ANEMOMETER_PIN = 18
+RAIN_GAGE_PIN = 16
+
+# synthetic replays start here, so their outputs can be compared run to run
+SYNTHETIC_START = datetime(2019, 10, 10).timestamp()
+
+
+#### STREAMS ####
+class syntheticStream():
+    '''the simulated day of hardware.py, pulses evenly spaced at its wind and rain rates
+    '''
+    def __init__(self, seed=1):
+        self.weather = hardware.simulatedWeather(seed)
+        self.pulseDistance = math.pi * 2 * config.anemometerRadius * .00001  # km a revolution
+        self.phases = {'wind': 0.0, 'rain': 0.0}  # fraction of a pulse since the last one
+
+    def reading(self, now=None):
+        return self.weather.reading(now)
+
+    def pulseTimes(self, startTime, endTime):
+        '''anemometer and rain gage pulse times from startTime to endTime
+        - rates at startTime, the phase carried on from the last call so slots join up
+        '''
+        reading = self.weather.reading(startTime)
+        windRate = reading['wind'] / (self.pulseDistance * 3600)
+        rainRate = reading['rain'] / 3600 / config.rainGageVolume
+        return self.evenly('wind', windRate, startTime, endTime), self.evenly('rain', rainRate, startTime, endTime)
+
+    def evenly(self, name, rate, startTime, endTime):
+        if rate <= 0:
+            return []
+        phase = self.phases[name]
+        times = []
+        at = startTime + (1 - phase) / rate
+        while at < endTime:
+            times.append(at)
+            at += 1 / rate
+        self.phases[name] = (phase + (endTime - startTime) * rate) % 1
+        return times
+
+
+class ringStream():
+    '''the 5 second samples of a sample ring, pulses spread over each sample's 5 seconds
+    '''
+    def __init__(self, filePathName):
+        # the ring's own capacity, another one would start it again empty
+        with open(filePathName, 'rb') as file:
+            capacity = sampleRing.ringHeader.unpack(file.read(sampleRing.ringHeader.size))[3]
+        ring = sampleRing.sampleRing(filePathName, capacity)
+        self.samples = []
+        for segment in ring.segments():
+            self.samples.extend(sampleRing.sampleRecord.iter_unpack(bytes(segment)))
+            segment.release()
+        ring.close()
+        self.times = [sample[0] for sample in self.samples]
+
+    def startTime(self):
+        return self.times[0] - 5
+
+    def endTime(self):
+        return self.times[-1]
+
+    def reading(self, now=None):
+        if now is None:
+            now = clock.time()
+        index = max(bisect.bisect_right(self.times, now) - 1, 0)
+        timestamp, temp, RH, lux, windPulses, rainTips = self.samples[index]
+        return {'temp': temp, 'RH': RH, 'lux': lux}
+
+    def pulseTimes(self, startTime, endTime):
+        windTimes = []
+        rainTimes = []
+        first = bisect.bisect_right(self.times, startTime)
+        last = bisect.bisect_right(self.times, endTime + 5)
+        for timestamp, temp, RH, lux, windPulses, rainTips in self.samples[first:last]:
+            for count, times in ((windPulses, windTimes), (rainTips, rainTimes)):
+                for pulse in range(count):
+                    at = timestamp - 5 + (pulse + .5) * 5 / count
+                    if startTime <= at < endTime:
+                        times.append(at)
+        return windTimes, rainTimes
+
+
+#### THE REPLAY ####
+def openStation(stream, startTime, outputPath, faults=''):
+    '''a weatherStation on simulated hardware under a virtual clock at startTime
+    - its files go to outputPath/sd and outputPath/usb, its prints to the current stdout
+    returns station, virtual clock
+    '''
+    import weather
+
+    sdPath = os.path.join(outputPath, 'sd')
+    usbPath = os.path.join(outputPath, 'usb')
+    os.makedirs(sdPath, exist_ok=True)
+    os.makedirs(usbPath, exist_ok=True)
+    config.SDFilePath = sdPath
+    os.environ['PONTIS_USB_PATH'] = usbPath
+    config.displayType = 'virtual'
+
+    virtual = clock.virtualClock(startTime)
+    clock.use(virtual)
+    simulation = hardware.station
+    simulation.startTime = clock.monotonic()
+    simulation.autoPulses = False
+    simulation.weather = stream
+    simulation.faults = hardware.parseFaults(faults)
+
+    weather.data = weather.stationData()
+    station = weather.weatherStation()
+    station.debugON = False
+    station.startAcquisition(False)
+    return station, virtual
+
+
+def runSlots(station, virtual, stream, endTime):
+    '''ticks every slot up to endTime, with the stream's pulses between the boundaries
+    - pulses falling in a tick's sleeps are given during them, as they come live
+    '''
+    GPIO = hardware.station.GPIO
+    pulsedTo = [virtual.time()]
+
+    def pulseTo(untilTime):
+        if untilTime <= pulsedTo[0]:
+            return
+        windTimes, rainTimes = stream.pulseTimes(pulsedTo[0], untilTime)
+        pulsedTo[0] = untilTime
+        pulses = sorted([(at, ANEMOMETER_PIN) for at in windTimes] + [(at, RAIN_GAGE_PIN) for at in rainTimes])
+        for at, pin in pulses:
+            virtual.advanceTo(at)
+            GPIO.pulse(pin)
+
+    virtual.onSleep = pulseTo
+    try:
+        while virtual.time() < endTime:
+            boundary = math.floor(virtual.time()) + 1.0
+            pulseTo(boundary)
+            virtual.advanceTo(boundary + acquisition.SLOT_OFFSET)
+            station.acquisition.runSlot(int(virtual.time()))
+    finally:
+        virtual.onSleep = None
+
+
+def replay(stream, startTime, endTime, outputPath, faults=''):
+    '''runs the station from startTime to endTime (epoch seconds) on stream
+    returns dictionary: station and wall seconds, speed, slots, missed slots, errors, rows
+    '''
+    os.makedirs(outputPath, exist_ok=True)
+    wallClock = clock.current
+    wallStart = time.perf_counter()
+    with open(os.path.join(outputPath, 'replay.log'), 'a') as log, contextlib.redirect_stdout(log):
+        station, virtual = openStation(stream, startTime, outputPath, faults)
+        replayStart = virtual.time()
+        runSlots(station, virtual, stream, endTime)
+
+    clock.use(wallClock)
+    wallSeconds = time.perf_counter() - wallStart
+    rows = 0
+    try:
+        with open(os.path.join(station.usbPath, config.dataFileName)) as file:
+            rows = sum(1 for line in file) - 1
+    except FileNotFoundError:
+        pass
+    return {
+        'station seconds': virtual.time() - replayStart,
+        'wall seconds': wallSeconds,
+        'speed': (virtual.time() - replayStart) / wallSeconds,
+        'slots': station.acquisition.ticks,
+        'missed slots': station.acquisition.missedSlots,
+        'errors': station.acquisition.errors,
+        'rows': rows
+        }
+
+
+def compareOutputs(firstPath, secondPath):
+    '''CSV files that differ between two replay outputs: {relative path: first differing line or message}
+    - not the timing file, its wall clock timings differ run to run
+    '''
+    def csvFiles(path):
+        found = set()
+        for directory, subdirectories, fileNames in os.walk(path):
+            for fileName in fileNames:
+                if fileName.endswith('.csv') and fileName != config.timingFileName:
+                    found.add(os.path.relpath(os.path.join(directory, fileName), path))
+        return found
+
+    differences = {}
+    first = csvFiles(firstPath)
+    second = csvFiles(secondPath)
+    for name in sorted(first ^ second):
+        differences[name] = 'only in ' + (firstPath if name in first else secondPath)
+    for name in sorted(first & second):
+        with open(os.path.join(firstPath, name)) as file:
+            firstLines = file.readlines()
+        with open(os.path.join(secondPath, name)) as file:
+            secondLines = file.readlines()
+        for lineNumber, (firstLine, secondLine) in enumerate(zip(firstLines, secondLines), 1):
+            if firstLine != secondLine:
+                differences[name] = 'line ' + str(lineNumber) + ': ' + firstLine.strip() + ' | ' + secondLine.strip()
+                break
+        else:
+            if len(firstLines) != len(secondLines):
+                differences[name] = str(len(firstLines)) + ' lines | ' + str(len(secondLines)) + ' lines'
+    return differences
+
+
+def printResults(results, outputPath):
+    print('{:.1f} station days in {:.1f} s, {:.0f}x real time'.format(
+        results['station seconds'] / 86400, results['wall seconds'], results['speed']))
+    print('slots', results['slots'], ', missed', results['missed slots'], ', errors', results['errors'],
+        ', weatherData rows', results['rows'])
+    print('output: ', outputPath)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == 'synthetic':
+        outputPath = sys.argv[3] if len(sys.argv) > 3 else tempfile.mkdtemp(prefix='replay')
+        startTime = SYNTHETIC_START
+        results = replay(syntheticStream(), startTime, startTime + float(sys.argv[2]) * 86400, outputPath,
+            os.environ.get('PONTIS_FAULTS', ''))
+        printResults(results, outputPath)
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'ring':
+        outputPath = sys.argv[3] if len(sys.argv) > 3 else tempfile.mkdtemp(prefix='replay')
+        stream = ringStream(sys.argv[2])
+        results = replay(stream, stream.startTime(), stream.endTime(), outputPath,
+            os.environ.get('PONTIS_FAULTS', ''))
+        printResults(results, outputPath)
+    elif len(sys.argv) == 4 and sys.argv[1] == 'compare':
+        differences = compareOutputs(sys.argv[2], sys.argv[3])
+        for name, difference in differences.items():
+            print(name, ': ', difference)
+        print('same CSV outputs' if differences == {} else str(len(differences)) + ' files differ')
+        sys.exit(1 if differences else 0)
+    else:
+        print('usage: replay.py synthetic <days> [output directory]')
+        print('       replay.py ring <weatherSamples.ring> [output directory]')
+        print('       replay.py compare <output directory> <output directory>')
@@ -0,0 +1,306 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# reprocess.py
+# Rev 0
+"""reprocess - recomputes the derived columns of ingested station data with a new calibration
+
+Works on the store written by ingest.py. Each station with a calibration
+profile is reprocessed, in parallel, into a versioned directory next to the
+original files:
+    store/calibration/<station>.json
+    store/<station>/reprocessed/v2/weatherData.csv
+    store/<station>/reprocessed/v2/weatherHistory.csv
+    store/<station>/reprocessed/v2/reprocess.json   profile hash and source sizes
+
+A profile lists the settings the station recorded with (from a date on) and
+the calibration to apply, missing values are taken from config:
+    {
+     "version": 2,
+     "recorded": [{"from": "2019-10-10", "anemometerRadius": 5.7}],
+     "calibration": {"anemometerRadius": 6.1, "rainGageVolume": 0.38,
+                     "luminousEff": 0.0081, "crops": {"Beans": [0.4, 0.75, 1.15, 0.7]}}
+    }
+
+Wind and rain scale with the anemometer radius and gage volume, solar energy
+with luminousEff. Water loss is recomputed with Penman-Monteith from the
+recalibrated hour values, then the water balance is run again. A station is
+only reprocessed when its profile or its store files change.
+
+    python3 reprocess.py <store dir> [processes]
+"""
+
+import os
+import json
+import zlib
+
+import numpy as np
+
+import config
+import stationLoader
+import waterBalance
+
+# Rev 0 - first release
+
+calibrationDirName = 'calibration'
+stateFileName = 'reprocess.json'
+
+# settings that scale the recorded values
+calibrationKeys = ('anemometerRadius', 'rainGageVolume', 'luminousEff')
+
+
+#### PROFILES ####
+def defaultCalibration():
+    '''the calibration in config, used for anything a profile leaves out
+    '''
+    return {
+        'anemometerRadius': config.anemometerRadius,
+        'rainGageVolume': config.rainGageVolume,
+        'luminousEff': config.luminousEff,
+        'crops': {'Beans': list(config.kBeans), 'Corn': list(config.kCorn), 'Grain': list(config.kGrain)}
+        }
+
+
+def readProfile(storePath, station):
+    '''calibration profile of a station with defaults filled in, None if there is none
+    '''
+    try:
+        with open(storePath + '/' + calibrationDirName + '/' + station + '.json') as file:
+            profile = json.load(file)
+    except FileNotFoundError:
+        return None
+
+    calibration = defaultCalibration()
+    calibration.update(profile.get('calibration', {}))
+    recorded = []
+    for entry in profile.get('recorded', [{'from': '0001-01-01'}]):
+        settings = defaultCalibration()
+        settings.update(entry)
+        recorded.append(settings)
+    # rows before the first entry use the first entry
+    recorded.sort(key=lambda entry: entry['from'])
+
+    return {'version': int(profile.get('version', 1)), 'recorded': recorded, 'calibration': calibration}
+
+
+def profileHash(profile):
+    return '{:08x}'.format(zlib.crc32(json.dumps(profile, sort_keys=True).encode('utf-8')))
+
+
+def recordedValues(times, profile, key):
+    '''value of a setting the station recorded each row with
+    '''
+    recorded = profile['recorded']
+    starts = np.array([entry['from'] for entry in recorded], dtype='datetime64[D]').astype(times.dtype)
+    values = np.array([entry[key] for entry in recorded], dtype=float)
+    return values[np.maximum(np.searchsorted(starts, times, side='right') - 1, 0)]
+
+
+def calibrationRatio(times, profile, key):
+    '''new / recorded setting for each row
+    '''
+    return profile['calibration'][key] / recordedValues(times, profile, key)
+
+
+#### DERIVED COLUMNS ####
+def periodRain(times, rainTotalDay):
+    '''rain in each period from the running day total
+    - the midnight row still holds the day before's total, the total is
+      reset after it is written
+    '''
+    rainDay = (times - np.timedelta64(1, 'm')).astype('datetime64[D]')
+    rain = np.diff(rainTotalDay, prepend=0)
+    newDay = np.ones(len(times), dtype=bool)
+    newDay[1:] = rainDay[1:] != rainDay[:-1]
+    rain[newDay] = rainTotalDay[newDay]
+    return np.nan_to_num(np.maximum(rain, 0))
+
+
+def reprocessData(rows, profile):
+    '''recalibrated weatherData columns (a copy of rows)
+    '''
+    times = rows['time']
+    result = rows.copy()
+    windRatio = calibrationRatio(times, profile, 'anemometerRadius')
+    result['windAvrPeriod'] = rows['windAvrPeriod'] * windRatio
+    result['windGust'] = rows['windGust'] * windRatio
+    result['rainTotalDay'] = rows['rainTotalDay'] * calibrationRatio(times, profile, 'rainGageVolume')
+
+    waterLoss = waterBalance.penmanMonteithArray(rows['tempCurrent'], rows['RHCurrent'],
+        result['windAvrPeriod'], rows['solarLux'], profile['calibration']['luminousEff'])
+    result['waterLoss'] = waterLoss
+
+    # the balance before the first row, undone from the recorded values
+    # (after the first row's irrigation, if it had one)
+    rain = periodRain(times, result['rainTotalDay'])
+    start = 0.0
+    if len(rows) > 0 and np.isfinite(rows['waterLossCumulative'][0]):
+        recordedRain = periodRain(times[:1], rows['rainTotalDay'][:1])[0]
+        start = rows['waterLossCumulative'][0] - np.nan_to_num(rows['waterLoss'][0]) + recordedRain
+
+    # irrigations the farmer entered, from the comment flags
+    full = (rows['flags'] & stationLoader.flagBit('Full Irrigation/')) != 0
+    partial = (rows['flags'] & stationLoader.flagBit('Partial Irrigation/')) != 0
+    full[:1] = False
+    partial[:1] = False
+    result['waterLossCumulative'] = waterBalance.waterLossSeries(start,
+        np.nan_to_num(waterLoss).tolist(), rain.tolist(), full.tolist(), partial.tolist())
+    return result
+
+
+def dayEndWaterLoss(rows):
+    '''(days, water loss cumulative at the last row of each day)
+    '''
+    days = (rows['time'] - np.timedelta64(1, 'm')).astype('datetime64[D]')
+    last = np.ones(len(days), dtype=bool)
+    last[:-1] = days[1:] != days[:-1]
+    return days[last], rows['waterLossCumulative'][last]
+
+
+def reprocessHistory(rows, profile, dayEnds):
+    '''recalibrated weatherHistory columns, plus the irrigation need of
+    each crop and growth stage (mm) from the reprocessed water balance
+    returns (rows, crop column names)
+    '''
+    times = rows['time']
+    windRatio = calibrationRatio(times, profile, 'anemometerRadius')
+    cropColumns = []
+    for crop, kList in sorted(profile['calibration']['crops'].items()):
+        for stage in range(len(kList)):
+            cropColumns.append((crop + ' ' + str(stage + 1) + ' (mm)', crop, stage))
+
+    dtype = rows.dtype.descr + [(name, 'f8') for name, crop, stage in cropColumns]
+    result = np.empty(len(rows), dtype=dtype)
+    for name in rows.dtype.names:
+        result[name] = rows[name]
+    for name in ('windAvrMax', 'windAvrMin', 'windGustMax'):
+        result[name] = rows[name] * windRatio
+    result['rainTotalDay'] = rows['rainTotalDay'] * calibrationRatio(times, profile, 'rainGageVolume')
+    result['solarTotalDay'] = rows['solarTotalDay'] * calibrationRatio(times, profile, 'luminousEff')
+
+    days, waterLoss = dayEnds
+    dayWaterLoss = np.full(len(times), np.nan)
+    if len(days) > 0:
+        index = np.minimum(np.searchsorted(days, times), len(days) - 1)
+        found = days[index] == times
+        dayWaterLoss[found] = waterLoss[index[found]]
+    # irrigation shows 0 until config.minimumIrrigation, as on the station
+    dayWaterLoss[dayWaterLoss < config.minimumIrrigation] = 0
+    for name, crop, stage in cropColumns:
+        result[name] = profile['calibration']['crops'][crop][stage] * dayWaterLoss
+    return result, [name for name, crop, stage in cropColumns]
+
+
+#### OUTPUT ####
+def timeStrings(times, dateOnly):
+    '''datetime64 -> the station's '%Y-%m-%d:%_H:%M' or '%Y-%m-%d' strings
+    '''
+    if dateOnly is True:
+        return np.datetime_as_string(times, unit='D')
+    characters = np.datetime_as_string(times, unit='m').astype('S16').view(np.uint8).reshape(-1, 16).copy()
+    characters[:, 10] = ord(':')
+    characters[characters[:, 11] == ord('0'), 11] = ord(' ')
+    return characters.view('S16').ravel().astype('U16')
+
+
+def writeRows(filePathName, labels, columns):
+    '''writes string columns as a station CSV file (temp file then rename)
+    '''
+    body = columns[0]
+    for column in columns[1:]:
+        body = np.char.add(np.char.add(body, ','), column)
+    with open(filePathName + '.tmp', 'w') as file:
+        file.write('DateTime,' + ''.join(label + ',' for label in labels) + '\n')
+        file.write(''.join(line + ',\n' for line in body.tolist()))
+    os.replace(filePathName + '.tmp', filePathName)
+
+
+def formatColumn(values, decimals):
+    text = np.char.mod('%.' + str(decimals) + 'f', values)
+    return np.where(np.isnan(values), '', text)
+
+
+def reprocessStation(task):
+    '''worker: reprocesses one station if its profile or store changed
+    returns (station, version, rows written), rows written is None if skipped
+    '''
+    storePath, station = task
+    profile = readProfile(storePath, station)
+    outPath = storePath + '/' + station + '/reprocessed/v' + str(profile['version'])
+    dataFilePathName = storePath + '/' + station + '/' + config.dataFileName
+    historyFilePathName = storePath + '/' + station + '/' + config.historyFileName
+
+    sources = {}
+    for filePathName in (dataFilePathName, historyFilePathName):
+        if os.path.exists(filePathName):
+            sources[os.path.basename(filePathName)] = os.path.getsize(filePathName)
+    state = {'profileHash': profileHash(profile), 'sources': sources}
+    try:
+        with open(outPath + '/' + stateFileName) as file:
+            if json.load(file) == state:
+                return station, profile['version'], None
+    except (FileNotFoundError, ValueError):
+        pass
+
+    os.makedirs(outPath, exist_ok=True)
+    rowsWritten = 0
+    dayEnds = (np.zeros(0, dtype='datetime64[D]'), np.zeros(0))
+
+    if config.dataFileName in sources:
+        rows, info = stationLoader.loadFile(dataFilePathName, comments=True)
+        rows = reprocessData(rows, profile)
+        dayEnds = dayEndWaterLoss(rows)
+        columns = [timeStrings(rows['time'], False)]
+        for name in rows.dtype.names[1:-1]:
+            columns.append(formatColumn(rows[name], 3 if name in ('waterLoss', 'waterLossCumulative') else 1))
+        # the comments as recorded, the flags are only the known parts of them
+        columns.append(info['comments'])
+        writeRows(outPath + '/' + config.dataFileName, info['labels'], columns)
+        rowsWritten += len(rows)
+
+    if config.historyFileName in sources:
+        rows, info = stationLoader.loadFile(historyFilePathName)
+        rows, cropLabels = reprocessHistory(rows, profile, dayEnds)
+        columns = [timeStrings(rows['time'], True)]
+        for name in rows.dtype.names[1:]:
+            columns.append(formatColumn(rows[name], 1))
+        writeRows(outPath + '/' + config.historyFileName, info['labels'] + cropLabels, columns)
+        rowsWritten += len(rows)
+
+    # the state last, an interrupted run is redone next time
+    with open(outPath + '/' + stateFileName, 'w') as file:
+        json.dump(state, file, indent=1, sort_keys=True)
+        file.write('\n')
+    return station, profile['version'], rowsWritten
+
+
+def reprocessAll(storePath, processes=None):
+    '''reprocesses every station with a calibration profile, in parallel
+    returns [(station, version, rows written or None if unchanged)]
+    '''
+    import multiprocessing
+
+    calibrationPath = storePath + '/' + calibrationDirName
+    stations = []
+    if os.path.isdir(calibrationPath):
+        for fileName in sorted(os.listdir(calibrationPath)):
+            station = fileName[:-len('.json')]
+            if fileName.endswith('.json') and os.path.isdir(storePath + '/' + station):
+                stations.append(station)
+
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(reprocessStation, [(storePath, station) for station in stations])
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        print('usage: reprocess.py <store dir> [processes]')
+        sys.exit(1)
+
+    startTime = time.time()
+    results = reprocessAll(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    for station, version, rowsWritten in results:
+        print(station, ' v' + str(version), ': ', 'unchanged' if rowsWritten is None else str(rowsWritten) + ' rows')
+    print(len(results), 'stations in ', '{:.2f}'.format(time.time() - startTime), 's')
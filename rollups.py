@@ -0,0 +1,349 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# rollups.py
+# Rev 0
+"""rollups - minute, hour and day aggregates built as samples arrive
+
+Every raw sample is folded into the open minute bucket. When a minute closes
+it is folded into the open hour, a closed hour into the open day. Each bucket
+keeps count, sum, min, max and last for every field, and is appended to its
+file on the SD card when it closes:
+    rollups/rollupMinute_2019-10-10.csv  (one file per day, old days deleted)
+    rollups/rollupHour.csv
+    rollups/rollupDay.csv
+
+Recent closed buckets stay in memory so queries never rescan raw data.
+"""
+
+import os
+import collections
+from datetime import datetime, timedelta
+
+import clock
+# Rev 0 - first release
+
+rollupFields = ('temp', 'RH', 'wind', 'solarLux', 'rain', 'solarEnergy')
+rollupStats = ('count', 'sum', 'min', 'max', 'last')
+
+levelOrder = ('minute', 'hour', 'day')
+levelKeyFormat = {
+    'minute': '%Y-%m-%d %H:%M',
+    'hour': '%Y-%m-%d %H',
+    'day': '%Y-%m-%d'
+    }
+levelLength = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+    }
+# closed buckets kept in memory
+levelRetain = {
+    'minute': 1440,
+    'hour': 24 * 35,
+    'day': 400
+    }
+
+
+class rollupBucket():
+    '''count, sum, min, max, last for each field over one time bucket
+    '''
+    def __init__(self, level, key):
+        self.level = level
+        self.key = key
+        self.stats = {}
+        for field in rollupFields:
+            self.stats[field] = [0, 0.0, None, None, None]
+
+    def add(self, sample):
+        '''folds a raw sample (dictionary, None values are skipped)
+        '''
+        for field in rollupFields:
+            value = sample.get(field)
+            if value is None:
+                continue
+            stat = self.stats[field]
+            stat[0] += 1
+            stat[1] += value
+            if stat[2] is None or value < stat[2]:
+                stat[2] = value
+            if stat[3] is None or value > stat[3]:
+                stat[3] = value
+            stat[4] = value
+
+    def merge(self, other):
+        '''folds a closed finer bucket into this one
+        '''
+        for field in rollupFields:
+            stat = self.stats[field]
+            otherStat = other.stats[field]
+            if otherStat[0] == 0:
+                continue
+            stat[0] += otherStat[0]
+            stat[1] += otherStat[1]
+            if stat[2] is None or otherStat[2] < stat[2]:
+                stat[2] = otherStat[2]
+            if stat[3] is None or otherStat[3] > stat[3]:
+                stat[3] = otherStat[3]
+            stat[4] = otherStat[4]
+
+    def value(self, field, stat):
+        '''one statistic, 'mean' is also available, None if no samples
+        '''
+        count, total, minimum, maximum, last = self.stats[field]
+        if count == 0:
+            return None
+        if stat == 'mean':
+            return total / count
+        return self.stats[field][rollupStats.index(stat)]
+
+    def toLine(self):
+        line = self.key + ','
+        for field in rollupFields:
+            for value in self.stats[field]:
+                line = line + ('' if value is None else '{:.6g}'.format(value)) + ','
+        return line + '\n'
+
+    @classmethod
+    def fromLine(cls, level, line):
+        values = line.rstrip('\n').split(',')
+        bucket = cls(level, values[0])
+        for fieldNumber, field in enumerate(rollupFields):
+            stat = values[1 + fieldNumber * 5:6 + fieldNumber * 5]
+            bucket.stats[field] = [int(float(stat[0])), float(stat[1])] +\
+                [None if value == '' else float(value) for value in stat[2:]]
+        return bucket
+
+
+def headerLine():
+    line = 'Bucket,'
+    for field in rollupFields:
+        for stat in rollupStats:
+            line = line + field + ' ' + stat + ','
+    return line + '\n'
+
+
+def readTail(filePathName, lineCount):
+    '''last lineCount lines of a file without reading all of it
+    '''
+    try:
+        with open(filePathName, 'rb') as file:
+            file.seek(0, 2)
+            fileSize = file.tell()
+            blockSize = 256 * (lineCount + 1)
+            while True:
+                file.seek(max(0, fileSize - blockSize))
+                lines = file.read().split(b'\n')
+                if len(lines) > lineCount + 1 or blockSize >= fileSize:
+                    break
+                blockSize *= 2
+    except FileNotFoundError:
+        return []
+    if fileSize > blockSize:
+        lines = lines[1:]  # first one can be partial
+    return [line.decode('utf-8') for line in lines if line != b''][-lineCount:]
+
+
+class rollupEngine():
+    '''hierarchical minute -> hour -> day rollups with persistence
+    '''
+    def __init__(self, dirPath, minuteDays=2):
+        self.dirPath = dirPath
+        self.minuteDays = minuteDays
+        os.makedirs(dirPath, exist_ok=True)
+
+        self.closed = {}
+        self.open = {}
+        for level in levelOrder:
+            self.closed[level] = collections.deque(maxlen=levelRetain[level])
+            self.open[level] = None
+
+        self.loadClosed()
+
+    #### PERSISTENCE ####
+    def levelFilePathName(self, level, key):
+        if level == 'minute':
+            return self.dirPath + '/rollupMinute_' + key[:10] + '.csv'
+        return self.dirPath + '/rollup' + level.capitalize() + '.csv'
+
+    def loadClosed(self):
+        '''refills the in memory buckets from the files on the SD card
+        '''
+        today = clock.now()
+        yesterday = today - timedelta(days=1)
+        for level in levelOrder:
+            if level == 'minute':
+                lines = []
+                for day in (yesterday, today):
+                    lines += readTail(self.levelFilePathName('minute', day.strftime('%Y-%m-%d')), levelRetain['minute'])
+            else:
+                lines = readTail(self.levelFilePathName(level, ''), levelRetain[level])
+            for line in lines:
+                if line.startswith('Bucket'):
+                    continue
+                try:
+                    self.closed[level].append(rollupBucket.fromLine(level, line))
+                except (ValueError, IndexError):
+                    pass
+
+    def persist(self, bucket):
+        filePathName = self.levelFilePathName(bucket.level, bucket.key)
+        newFile = not os.path.exists(filePathName)
+        try:
+            with open(filePathName, 'a') as file:
+                if newFile is True:
+                    file.write(headerLine())
+                file.write(bucket.toLine())
+        except OSError:
+            print('rollup write failed')
+
+        if bucket.level == 'minute' and newFile is True:
+            self.removeOldMinuteFiles(bucket.key[:10])
+
+    def removeOldMinuteFiles(self, dayKey):
+        oldest = (datetime.strptime(dayKey, '%Y-%m-%d') - timedelta(days=self.minuteDays - 1)).strftime('%Y-%m-%d')
+        for fileName in os.listdir(self.dirPath):
+            if fileName.startswith('rollupMinute_') and fileName[13:23] < oldest:
+                os.remove(self.dirPath + '/' + fileName)
+
+    #### FOLDING ####
+    def closeBucket(self, level):
+        '''closes the open bucket of a level, folds it into the next level
+        '''
+        bucket = self.open[level]
+        self.open[level] = None
+        self.closed[level].append(bucket)
+        self.persist(bucket)
+
+        levelNumber = levelOrder.index(level)
+        if levelNumber + 1 < len(levelOrder):
+            parentLevel = levelOrder[levelNumber + 1]
+            parentKey = datetime.strptime(bucket.key, levelKeyFormat[level]).strftime(levelKeyFormat[parentLevel])
+            parent = self.openBucket(parentLevel, parentKey)
+            parent.merge(bucket)
+
+    def openBucket(self, level, key):
+        '''open bucket for key, closes the open one if it is for another key
+        - a bucket reopened after a restart starts from its closed children
+        '''
+        bucket = self.open[level]
+        if bucket is not None and bucket.key == key:
+            return bucket
+        if bucket is not None:
+            self.closeBucket(level)
+
+        bucket = rollupBucket(level, key)
+        levelNumber = levelOrder.index(level)
+        if levelNumber > 0:
+            childLevel = levelOrder[levelNumber - 1]
+            for child in self.closed[childLevel]:
+                if child.key.startswith(key):
+                    bucket.merge(child)
+        self.open[level] = bucket
+        return bucket
+
+    def addSample(self, timestamp, sample):
+        '''folds one raw sample, closes every bucket it has moved past
+        '''
+        sampleTime = datetime.fromtimestamp(timestamp)
+        keys = {}
+        for level in levelOrder:
+            keys[level] = sampleTime.strftime(levelKeyFormat[level])
+
+        # close finest first so each close folds into the still open parent
+        for level in levelOrder:
+            if self.open[level] is not None and self.open[level].key != keys[level]:
+                self.closeBucket(level)
+
+        for level in reversed(levelOrder):
+            self.openBucket(level, keys[level])
+
+        self.open['minute'].add(sample)
+
+    #### QUERIES ####
+    def bucket(self, level, key):
+        '''open or closed bucket for key, None if not kept
+        '''
+        if self.open[level] is not None and self.open[level].key == key:
+            return self.open[level]
+        for bucket in reversed(self.closed[level]):
+            if bucket.key == key:
+                return bucket
+            if bucket.key < key:
+                break
+        return None
+
+    def series(self, level, field, stat, count, endTime=None):
+        '''values of the newest count buckets of a level, oldest first
+        - None for buckets without data, includes the open bucket
+        '''
+        if endTime is None:
+            endTime = clock.now()
+        values = []
+        for number in range(count - 1, -1, -1):
+            key = (endTime - number * levelLength[level]).strftime(levelKeyFormat[level])
+            bucket = self.bucket(level, key)
+            values.append(None if bucket is None else bucket.value(field, stat))
+        return values
+
+    def aggregate(self, startTime, endTime):
+        '''one bucket covering startTime to endTime (datetimes)
+        - uses day buckets where a whole day fits, then hours, then minutes
+        '''
+        result = rollupBucket('range', startTime.strftime(levelKeyFormat['minute']))
+        cursor = startTime.replace(second=0, microsecond=0)
+        while cursor < endTime:
+            for level in reversed(levelOrder):
+                length = levelLength[level]
+                aligned = cursor == datetime.strptime(cursor.strftime(levelKeyFormat[level]), levelKeyFormat[level])
+                if aligned is True and cursor + length <= endTime:
+                    break
+            bucket = self.bucket(level, cursor.strftime(levelKeyFormat[level]))
+            if bucket is not None:
+                result.merge(bucket)
+            cursor = cursor + levelLength[level]
+        return result
+
+    def daySummary(self, dayKey):
+        '''weatherHistory values for one day, None if the day is not kept
+        - keys match stationData.dayOrder
+        '''
+        day = self.bucket('day', dayKey)
+        if day is None or day.stats['temp'][0] == 0:
+            return None
+
+        windAverages = []
+        for bucket in self.closed['hour']:
+            if bucket.key.startswith(dayKey) and bucket.stats['wind'][0] > 0:
+                windAverages.append(bucket.value('wind', 'mean'))
+        if windAverages == []:
+            windAverages = [0]
+
+        return {
+            'tempMax': day.value('temp', 'max'),
+            'tempMin': day.value('temp', 'min'),
+            'RHMax': day.value('RH', 'max') or 0,
+            'RHMin': day.value('RH', 'min') or 0,
+            'rainTotalDay': day.value('rain', 'sum') or 0,
+            'windAvrMax': max(windAverages),
+            'windAvrMin': min(windAverages),
+            'windGustMax': day.value('wind', 'max') or 0,
+            'solarTotalDay': day.value('solarEnergy', 'sum') or 0
+            }
+
+
+if __name__ == '__main__':
+    import time
+    import random
+    import tempfile
+
+    engine = rollupEngine(tempfile.mkdtemp())
+    startTime = time.time()
+    timestamp = datetime(2019, 10, 10).timestamp()
+    for i in range(2 * 17280):
+        engine.addSample(timestamp + i * 5, {
+            'temp': 25 + random.random(), 'RH': 80.0, 'wind': random.random() * 10,
+            'solarLux': 40000.0, 'rain': 0.4 if i % 1000 == 0 else 0, 'solarEnergy': 1.58})
+    print('addSample: ', '{:.1f}'.format((time.time() - startTime) * 1e6 / (2 * 17280)), 'us each')
+    print(engine.daySummary('2019-10-10'))
+    print(engine.aggregate(datetime(2019, 10, 10, 22, 30), datetime(2019, 10, 11, 1)).value('rain', 'sum'))
+    print(engine.series('hour', 'temp', 'max', 4, datetime(2019, 10, 11, 3)))
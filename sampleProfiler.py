@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# sampleProfiler.py
+# Rev 0
+"""sampleProfiler - what a hanging station is doing, as flame graph stacks
+
+A thread samples the stacks of all the other threads (sys._current_frames:
+the UI loop, acquisition, the GPIO callback threads while they run Python)
+every interval for a number of minutes, and counts each stack. At the end
+the counts are written as collapsed stacks, one line a stack:
+
+    MainThread;runTimer (weather.py:446);nextButton (weather.py:2003) 412
+
+for flamegraph.pl or speedscope. Nothing runs until a profile is started;
+while it runs, the sampler times itself and stretches the interval to
+keep under MAX_OVERHEAD of one CPU.
+
+The station starts a profile from the MX 'profile' page, or with
+    kill -USR1 <pid of weather.py>
+and writes profile_<date>_<time>.folded to the USB drive. The signal is
+taken by a thread of its own (sigwait), so a profile starts even while the
+UI loop is stuck in an I2C or USB write.
+
+Self check (overhead on a busy loop):
+    python3 sampleProfiler.py
+"""
+
+import os
+import sys
+import time
+import signal
+import threading
+
+# Rev 0 - first release
+
+MAX_OVERHEAD = .02  # fraction of one CPU the sampler may use
+MAX_DEPTH = 64  # frames kept of a stack, the innermost
+
+
+def frameName(frame):
+    code = frame.f_code
+    return code.co_name + ' (' + os.path.basename(code.co_filename) + ':' + str(frame.f_lineno) + ')'
+
+
+class sampleProfiler():
+    '''samples all thread stacks on its own thread between start() and stop()
+    '''
+    def __init__(self, interval=.01):
+        self.interval = interval
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.lock = threading.Lock()
+        self.stacks = {}
+        self.samples = 0
+        self.sampleSeconds = 0.0  # the sampler's own time
+        self.endTime = 0.0
+        self.filePathName = None
+        self.lastFile = None  # (filePathName, samples) of the last profile written
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def remaining(self):
+        '''seconds left of the running profile, 0 if none
+        '''
+        if not self.running():
+            return 0
+        return max(self.endTime - time.monotonic(), 0)
+
+    def start(self, seconds, filePathName):
+        '''profiles for seconds, then writes filePathName
+        - False if a profile is already running (or starting)
+        - never waits, the signal thread calls it
+        '''
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            if self.running():
+                return False
+            self.stacks = {}
+            self.samples = 0
+            self.sampleSeconds = 0.0
+            self.filePathName = filePathName
+            self.endTime = time.monotonic() + seconds
+            self.stopEvent.clear()
+            self.thread = threading.Thread(target=self.run, name='sampleProfiler', daemon=True)
+            self.thread.start()
+        finally:
+            self.lock.release()
+        return True
+
+    def stop(self):
+        '''ends the running profile early, it is still written
+        '''
+        self.stopEvent.set()
+        if self.running() and threading.current_thread() is not self.thread:
+            self.thread.join()
+
+    def run(self):
+        interval = self.interval
+        startTime = time.monotonic()
+        while time.monotonic() < self.endTime:
+            if self.stopEvent.wait(interval):
+                break
+            sampleStart = time.perf_counter()
+            self.sample()
+            self.sampleSeconds += time.perf_counter() - sampleStart
+
+            # stretch the interval if sampling costs too much
+            elapsed = time.monotonic() - startTime
+            if elapsed > 0 and self.sampleSeconds > MAX_OVERHEAD * elapsed:
+                interval = min(interval * 2, 1.0)
+        try:
+            self.write()
+        except OSError:
+            self.lastFile = None
+
+    def sample(self):
+        '''counts the stack of every thread but this one
+        '''
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        ownIdent = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == ownIdent:
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_DEPTH:
+                frames.append(frameName(frame))
+                frame = frame.f_back
+            # C threads calling into Python (GPIO callbacks) have no threading name
+            frames.append(names.get(ident, 'thread ' + str(ident)))
+            stack = ';'.join(reversed(frames))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def write(self):
+        '''the collapsed stacks, most sampled first
+        '''
+        with open(self.filePathName + '.tmp', 'w') as file:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                file.write(stack + ' ' + str(count) + '\n')
+        os.replace(self.filePathName + '.tmp', self.filePathName)
+        self.lastFile = (self.filePathName, self.samples)
+
+
+def installSignal(handler, signalNumber=signal.SIGUSR1):
+    '''calls handler() on the signal from a thread waiting for it, False where signals cannot be set
+    - call it from the main thread before starting other threads: the signal is blocked
+      here and in the threads started after, only the waiting thread takes it
+    - a Python handler is set too, for a thread started before (it runs on the main thread)
+    '''
+    try:
+        signal.signal(signalNumber, lambda number, frame: handler())
+    except (ValueError, AttributeError, OSError):
+        return False
+    if not hasattr(signal, 'pthread_sigmask'):
+        return True
+
+    def waitSignal():
+        while True:
+            signal.sigwait({signalNumber})
+            handler()
+
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signalNumber})
+    threading.Thread(target=waitSignal, name='signal', daemon=True).start()
+    return True
+
+
+if __name__ == '__main__':
+    import ctypes
+    import tempfile
+
+    # USR1 while the main thread is stuck in a C call that never checks for signals
+    signalled = []
+    installSignal(lambda: signalled.append((time.monotonic(), threading.current_thread().name)))
+    if hasattr(signal, 'pthread_sigmask'):
+        threading.Timer(.5, os.kill, (os.getpid(), signal.SIGUSR1)).start()
+        blockedStart = time.monotonic()
+        ctypes.CDLL(None).sleep(2)
+        blockedEnd = time.monotonic()
+        print('USR1 taken', '{:.2f}'.format(signalled[0][0] - blockedStart), 's into a',
+            '{:.1f}'.format(blockedEnd - blockedStart), 's blocking call, on thread', signalled[0][1])
+        assert signalled[0][1] == 'signal' and signalled[0][0] < blockedEnd - 1 and blockedEnd - blockedStart > 1.9
+
+    def busy(seconds):
+        '''pure Python work for seconds, returns the loops done
+        '''
+        loops = 0
+        endTime = time.perf_counter() + seconds
+        while time.perf_counter() < endTime:
+            total = 0
+            for number in range(1000):
+                total += number % 7
+            loops += 1
+        return loops
+
+    def helperThread(stopEvent):
+        while not stopEvent.is_set():
+            busy(.05)
+            stopEvent.wait(.05)
+
+    stopEvent = threading.Event()
+    helper = threading.Thread(target=helperThread, args=(stopEvent,), name='helper', daemon=True)
+    helper.start()
+
+    base = busy(5)
+    profiler = sampleProfiler()
+    filePathName = os.path.join(tempfile.mkdtemp(), 'profile.folded')
+    profiler.start(5, filePathName)
+    profiled = busy(5)
+    profiler.stop()
+    stopEvent.set()
+
+    print('samples', profiler.samples, ', sampler seconds', '{:.3f}'.format(profiler.sampleSeconds))
+    print('overhead: ', '{:.1f}'.format(100 * (1 - profiled / base)), '% fewer loops (noisy), sampler ',
+        '{:.2f}'.format(100 * profiler.sampleSeconds / 5), '% of a CPU')
+    with open(filePathName) as file:
+        lines = file.readlines()
+    print(''.join(lines[:3]), end='')
+    assert any(line.startswith('MainThread;') and 'busy (sampleProfiler.py' in line for line in lines)
+    assert any(line.startswith('helper;') for line in lines)
+    assert all(line.rsplit(' ', 1)[1].strip().isdigit() for line in lines)
+    assert profiler.sampleSeconds < MAX_OVERHEAD * 5 * 1.5
+    print('ok')
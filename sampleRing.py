@@ -0,0 +1,166 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# sampleRing.py
+# Rev 0
+"""sampleRing - fixed size ring of raw 5 second samples on the SD card
+
+The ring is a memory mapped file with a small header and fixed size records:
+    timestamp (double, epoch seconds), temp, RH, lux (float32),
+    wind pulses, rain tips (uint32)
+
+Appending is O(1) and the file never grows, the oldest samples are
+overwritten. Readers get zero-copy memoryviews (or NumPy views) of the raw
+records, in time order as at most two segments.
+"""
+
+import os
+import mmap
+import struct
+
+# Rev 0 - first release
+
+MAGIC = b'PWRG'
+VERSION = 1
+
+ringHeader = struct.Struct('<4sHHQQ')  # magic, version, record size, capacity, count
+HEADER_SIZE = 64
+
+sampleRecord = struct.Struct('<dfffII')
+sampleOrder = ('timestamp', 'temp', 'RH', 'lux', 'windPulses', 'rainTips')
+
+# samples per day at the 5 second sample rate
+SAMPLES_PER_DAY = 17280
+
+
+def numpyType():
+    '''structured dtype matching sampleRecord (NumPy is only needed by readers)
+    '''
+    import numpy
+    return numpy.dtype([
+        ('timestamp', '<f8'),
+        ('temp', '<f4'),
+        ('RH', '<f4'),
+        ('lux', '<f4'),
+        ('windPulses', '<u4'),
+        ('rainTips', '<u4')])
+
+
+class sampleRing():
+    '''memory mapped ring buffer of samples
+    '''
+    def __init__(self, filePathName, capacity):
+        self.filePathName = filePathName
+        self.capacity = capacity
+        fileSize = HEADER_SIZE + capacity * sampleRecord.size
+
+        # a new file, or a ring of a different size, starts empty
+        newRing = True
+        try:
+            if os.path.getsize(filePathName) == fileSize:
+                with open(filePathName, 'rb') as file:
+                    magic, version, recordSize, oldCapacity, count = ringHeader.unpack(file.read(ringHeader.size))
+                newRing = (magic != MAGIC or version != VERSION or
+                    recordSize != sampleRecord.size or oldCapacity != capacity)
+        except FileNotFoundError:
+            pass
+
+        if newRing is True:
+            with open(filePathName, 'wb') as file:
+                file.write(ringHeader.pack(MAGIC, VERSION, sampleRecord.size, capacity, 0))
+                file.truncate(fileSize)
+
+        self.file = open(filePathName, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), fileSize)
+        self.records = memoryview(self.map)[HEADER_SIZE:]
+        self.count = ringHeader.unpack_from(self.map, 0)[4]
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, temp, RH, lux, windPulses, rainTips):
+        '''writes one sample over the oldest one, O(1)
+        '''
+        offset = (self.count % self.capacity) * sampleRecord.size
+        sampleRecord.pack_into(self.records, offset, timestamp, temp, RH, lux, windPulses, rainTips)
+        # count last, a crash between the two only loses this sample
+        self.count += 1
+        struct.pack_into('<Q', self.map, 16, self.count)
+
+    def flush(self):
+        '''push the mapped pages to the SD card (the OS also does this on its own)
+        '''
+        self.map.flush()
+
+    def segments(self):
+        '''zero-copy memoryviews of the raw records, oldest first
+        '''
+        if self.count <= self.capacity:
+            return [self.records[:self.count * sampleRecord.size]]
+        split = (self.count % self.capacity) * sampleRecord.size
+        if split == 0:
+            return [self.records]
+        return [self.records[split:], self.records[:split]]
+
+    def arrays(self):
+        '''zero-copy NumPy structured views of segments()
+        '''
+        import numpy
+        dtype = numpyType()
+        return [numpy.frombuffer(segment, dtype=dtype) for segment in self.segments()]
+
+    def toArray(self):
+        '''all samples in one NumPy array (a copy)
+        '''
+        import numpy
+        return numpy.concatenate(self.arrays())
+
+    def sample(self, index):
+        '''sample as a tuple, index 0 is the oldest, -1 the newest
+        '''
+        length = len(self)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError('sampleRing index out of range')
+        first = self.count - length
+        offset = ((first + index) % self.capacity) * sampleRecord.size
+        return sampleRecord.unpack_from(self.records, offset)
+
+    def latest(self, number):
+        '''newest number samples as tuples, oldest first
+        '''
+        length = len(self)
+        number = min(number, length)
+        return [self.sample(index) for index in range(length - number, length)]
+
+    def since(self, timestamp):
+        '''samples at or after timestamp, oldest first (binary search)
+        '''
+        low = 0
+        high = len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.sample(middle)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return [self.sample(index) for index in range(low, len(self))]
+
+    def close(self):
+        self.records.release()
+        self.map.close()
+        self.file.close()
+
+
+if __name__ == '__main__':
+    import time
+    import tempfile
+
+    ring = sampleRing(tempfile.gettempdir() + '/weatherSamples.test', SAMPLES_PER_DAY)
+    startTime = time.time()
+    for i in range(2 * SAMPLES_PER_DAY):
+        ring.append(1570000000 + i * 5, 25.0, 80.0, 40000.0, 3, 0)
+    print('append: ', '{:.2f}'.format((time.time() - startTime) * 1e6 / (2 * SAMPLES_PER_DAY)), 'us each')
+    print(len(ring), ring.sample(0), ring.sample(-1))
+    print([len(segment) for segment in ring.segments()])
+    print(len(ring.since(1570000000 + 2 * SAMPLES_PER_DAY * 5 - 60)))
@@ -0,0 +1,299 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# soilFit.py
+# Rev 0
+"""soilFit - fits the soil constants of the water balance to soil moisture readings
+
+The hourly water loss and rain of a station's weatherData file (with the
+Full / Partial Irrigation comments) are replayed through the water balance
+for a grid of candidate soil constants, each candidate one column of a NumPy
+array:
+    maximumAbsorption, maximumDry, partialIrrigation
+
+The replayed water loss is fitted against field soil moisture readings
+(moisture = a + b * water loss, b <= 0) and the candidate with the lowest
+RMSE is reported with the RMSE profile along each constant.
+config.minimumIrrigation only changes what the irrigation screen shows, not
+the water balance, so soil moisture readings cannot fit it.
+
+Soil moisture file, one reading per line after a header:
+    DateTime,Soil moisture (%)
+    2019-10-10:14:00,31.5
+
+    python3 soilFit.py fit <weatherData.csv> <soil moisture.csv> [steps per constant]
+    python3 soilFit.py benchmark
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+import config
+import stationLoader
+import waterBalance
+import reprocess
+
+# Rev 0 - first release
+
+# constant: (low, high) of the candidate grid
+fitRanges = {
+    'maximumAbsorption': (-60.0, -5.0),
+    'maximumDry': (20.0, 200.0),
+    'partialIrrigation': (1.0, 12.0)
+    }
+fitOrder = ('maximumAbsorption', 'maximumDry', 'partialIrrigation')
+
+
+#### INPUTS ####
+def readObservations(filePathName):
+    '''soil moisture file -> (datetime64[m] times, moisture)
+    '''
+    times = []
+    moisture = []
+    with open(filePathName) as file:
+        file.readline()
+        for line in file:
+            values = line.split(',')
+            timestamp = values[0].strip()
+            for timeFormat in ('%Y-%m-%d:%H:%M', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+                try:
+                    observationTime = datetime.strptime(timestamp.replace(': ', ':0'), timeFormat)
+                    break
+                except ValueError:
+                    observationTime = None
+            try:
+                value = float(values[1])
+            except (ValueError, IndexError):
+                continue
+            if observationTime is not None:
+                times.append(observationTime)
+                moisture.append(value)
+    return np.array(times, dtype='datetime64[m]'), np.array(moisture)
+
+
+def stationPeriods(filePathName):
+    '''hourly inputs of the replay from a weatherData file
+    returns dictionary: times, waterLoss, rain, full, partial, start
+    '''
+    rows, info = stationLoader.loadFile(filePathName)
+    fullBit = stationLoader.flagBit('Full Irrigation/')
+    partialBit = stationLoader.flagBit('Partial Irrigation/')
+    start = 0.0
+    if len(rows) > 0 and np.isfinite(rows['waterLossCumulative'][0]):
+        start = float(rows['waterLossCumulative'][0] - np.nan_to_num(rows['waterLoss'][0]))
+    return {
+        'times': rows['time'],
+        'waterLoss': np.nan_to_num(rows['waterLoss']),
+        'rain': reprocess.periodRain(rows['time'], rows['rainTotalDay']),
+        'full': (rows['flags'] & fullBit) != 0,
+        'partial': (rows['flags'] & partialBit) != 0,
+        'start': start
+        }
+
+
+def observationRows(periodTimes, observationTimes):
+    '''period row each reading follows (-1 before the first row)
+    '''
+    return np.searchsorted(periodTimes, observationTimes, side='right') - 1
+
+
+#### REPLAY ####
+def candidateGrid(steps, ranges=None):
+    '''every combination of steps values per constant -> {constant: column array}, axes
+    '''
+    if ranges is None:
+        ranges = fitRanges
+    axes = [np.linspace(ranges[name][0], ranges[name][1], steps) for name in fitOrder]
+    grids = np.meshgrid(*axes, indexing='ij')
+    return dict((name, grid.ravel()) for name, grid in zip(fitOrder, grids)), axes
+
+
+def replayScalar(periods, captureRows, maximumAbsorption, maximumDry, partialIrrigation):
+    '''the station's own logic for one candidate, water loss at captureRows
+    '''
+    captured = {}
+    captureSet = set(captureRows.tolist())
+    waterLossCumulative = periods['start']
+    lastRow = int(captureRows.max())
+    for row in range(lastRow + 1):
+        if periods['full'][row]:
+            waterLossCumulative = waterBalance.applyIrrigation(waterLossCumulative, True)
+        elif periods['partial'][row]:
+            waterLossCumulative = waterBalance.applyIrrigation(waterLossCumulative, False, partialIrrigation)
+        waterLossCumulative = waterBalance.updateWaterLoss(waterLossCumulative,
+            periods['waterLoss'][row], periods['rain'][row], maximumDry, maximumAbsorption)
+        if row in captureSet:
+            captured[row] = waterLossCumulative
+    return np.array([captured[row] for row in captureRows.tolist()])
+
+
+def replayCandidates(periods, captureRows, candidates):
+    '''the water balance for every candidate at once -> (readings, candidates)
+    - one pass over the hours, each step a few operations on the candidate vector
+    '''
+    maximumAbsorption = candidates['maximumAbsorption']
+    maximumDry = candidates['maximumDry']
+    partialIrrigation = candidates['partialIrrigation']
+    state = np.full(len(maximumDry), periods['start'])
+    captured = np.empty((len(captureRows), len(maximumDry)))
+
+    net = (periods['waterLoss'] - periods['rain']).tolist()
+    full = set(np.flatnonzero(periods['full']).tolist())
+    partial = set(np.flatnonzero(periods['partial']).tolist())
+    order = np.argsort(captureRows, kind='stable')
+    sortedRows = captureRows[order].tolist()
+    nextCapture = 0
+
+    for row in range(int(captureRows.max()) + 1):
+        if row in full:
+            state[:] = 0
+        elif row in partial:
+            state -= partialIrrigation
+        state += net[row]
+        np.clip(state, maximumAbsorption, maximumDry, out=state)
+        while nextCapture < len(sortedRows) and sortedRows[nextCapture] == row:
+            captured[order[nextCapture]] = state
+            nextCapture += 1
+    return captured
+
+
+#### FIT ####
+def fitMoisture(waterLoss, moisture):
+    '''least squares moisture = a + b * water loss for every candidate column
+    returns (rmse, intercept, slope) arrays, slope limited to <= 0
+    '''
+    waterLossMean = waterLoss.mean(axis=0)
+    moistureMean = moisture.mean()
+    waterLossCentered = waterLoss - waterLossMean
+    moistureCentered = moisture - moistureMean
+    variance = (waterLossCentered ** 2).sum(axis=0)
+    covariance = moistureCentered @ waterLossCentered
+    slope = np.where(variance > 0, covariance / np.maximum(variance, 1e-12), 0.0)
+    slope = np.minimum(slope, 0.0)  # drier soil can not hold more water
+    residual = moistureCentered[:, None] - slope * waterLossCentered
+    rmse = np.sqrt((residual ** 2).mean(axis=0))
+    return rmse, moistureMean - slope * waterLossMean, slope
+
+
+def fitStation(periods, observationTimes, moisture, steps=16):
+    '''grid search over the soil constants
+    returns dictionary: best constants, rmse, intercept, slope, sensitivity
+    '''
+    captureRows = observationRows(periods['times'], observationTimes)
+    keep = captureRows >= 0
+    captureRows = captureRows[keep]
+    moisture = moisture[keep]
+    if len(captureRows) < 3:
+        raise ValueError('at least 3 soil moisture readings inside the weather data are needed')
+
+    candidates, axes = candidateGrid(steps)
+    waterLoss = replayCandidates(periods, captureRows, candidates)
+    rmse, intercept, slope = fitMoisture(waterLoss, moisture)
+
+    best = int(np.argmin(rmse))
+    bestIndex = np.unravel_index(best, (steps,) * len(fitOrder))
+    rmseGrid = rmse.reshape((steps,) * len(fitOrder))
+
+    # rmse along each constant with the others at their best values
+    sensitivity = {}
+    for axis, name in enumerate(fitOrder):
+        index = list(bestIndex)
+        index[axis] = slice(None)
+        profile = rmseGrid[tuple(index)]
+        nearBest = axes[axis][profile <= rmse[best] * 1.05]
+        sensitivity[name] = {
+            'values': axes[axis].tolist(),
+            'rmse': profile.tolist(),
+            # constants inside this range fit within 5 % of the best rmse
+            'within5percent': [float(nearBest.min()), float(nearBest.max())]
+            }
+
+    return {
+        'best': dict((name, float(candidates[name][best])) for name in fitOrder),
+        'rmse': float(rmse[best]),
+        'intercept': float(intercept[best]),
+        'slope': float(slope[best]),
+        'candidates': len(rmse),
+        'readings': len(captureRows),
+        'sensitivity': sensitivity
+        }
+
+
+def printReport(result):
+    print(result['candidates'], 'candidates, ', result['readings'], 'readings')
+    print('moisture = {:.2f} {:+.4f} * water loss, rmse {:.3f}'.format(
+        result['intercept'], result['slope'], result['rmse']))
+    for name in fitOrder:
+        low, high = result['sensitivity'][name]['within5percent']
+        print('{:20s}{:8.2f}   (config {:6.1f}, within 5% rmse: {:.1f} to {:.1f})'.format(
+            name, result['best'][name], getattr(config, name), low, high))
+    print('{:20s}not fitted, only changes the irrigation screen'.format('minimumIrrigation'))
+
+
+#### BENCHMARK ####
+def syntheticPeriods(hours, random):
+    '''a year like series: daytime water loss, rain showers, some irrigations
+    '''
+    hourOfDay = np.arange(hours) % 24
+    waterLoss = np.clip(np.sin((hourOfDay - 6) / 12 * np.pi), 0, None) * random.uniform(.2, .6, hours)
+    rain = np.where(random.random(hours) < .02, random.exponential(6, hours), 0.0)
+    return {
+        'times': np.datetime64('2019-01-01T00:00') + np.arange(hours).astype('timedelta64[h]').astype('timedelta64[m]'),
+        'waterLoss': waterLoss,
+        'rain': rain,
+        'full': random.random(hours) < .002,
+        'partial': random.random(hours) < .004,
+        'start': 0.0
+        }
+
+
+def benchmark(hours=8760, steps=16, scalarCandidates=20):
+    '''recovers known constants from synthetic readings and times both replays
+    '''
+    import time
+
+    random = np.random.default_rng(3)
+    periods = syntheticPeriods(hours, random)
+    truth = {'maximumAbsorption': np.array([-30.0]), 'maximumDry': np.array([80.0]), 'partialIrrigation': np.array([5.0])}
+    captureRows = np.sort(random.choice(hours, 200, replace=False))
+    trueWaterLoss = replayCandidates(periods, captureRows, truth)[:, 0]
+    moisture = 35 - .12 * trueWaterLoss + random.normal(0, .3, len(captureRows))
+
+    candidates, axes = candidateGrid(steps)
+    startTime = time.time()
+    for number in range(scalarCandidates):
+        replayScalar(periods, captureRows, candidates['maximumAbsorption'][number],
+            candidates['maximumDry'][number], candidates['partialIrrigation'][number])
+    scalarEach = (time.time() - startTime) / scalarCandidates
+
+    startTime = time.time()
+    result = fitStation(periods, periods['times'][captureRows], moisture, steps)
+    vectorTime = time.time() - startTime
+    vectorEach = vectorTime / len(candidates['maximumDry'])
+
+    # both replays agree
+    check = replayCandidates(periods, captureRows, dict((name, values[:3]) for name, values in candidates.items()))
+    for number in range(3):
+        scalar = replayScalar(periods, captureRows, candidates['maximumAbsorption'][number],
+            candidates['maximumDry'][number], candidates['partialIrrigation'][number])
+        assert np.allclose(scalar, check[:, number])
+
+    return result, scalarEach, vectorEach, vectorTime
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) >= 4 and sys.argv[1] == 'fit':
+        periods = stationPeriods(sys.argv[2])
+        observationTimes, moisture = readObservations(sys.argv[3])
+        printReport(fitStation(periods, observationTimes, moisture, int(sys.argv[4]) if len(sys.argv) > 4 else 16))
+    elif len(sys.argv) == 2 and sys.argv[1] == 'benchmark':
+        result, scalarEach, vectorEach, vectorTime = benchmark()
+        printReport(result)
+        print('true: maximumAbsorption -30, maximumDry 80, partialIrrigation 5')
+        print('scalar {:.2f} ms, vectorised {:.4f} ms per candidate ({:.2f} s total), {:.0f}x'.format(
+            scalarEach * 1000, vectorEach * 1000, vectorTime, scalarEach / vectorEach))
+    else:
+        print('usage: soilFit.py fit <weatherData.csv> <soil moisture.csv> [steps per constant]')
+        print('       soilFit.py benchmark')
@@ -0,0 +1,316 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# spatialGrid.py
+# Rev 0
+"""spatialGrid - rain, ET and temperature grids interpolated between stations
+
+A layout file gives the station positions and the grid:
+    {
+     "bbox": [lonMin, latMin, lonMax, latMax],
+     "shape": [rows, columns],
+     "stations": {"station001": [lat, lon], ...}
+    }
+
+Interpolation (inverse distance or ordinary kriging) only depends on the
+layout, so the weight matrix (cells x stations) is computed once and cached
+in an .npz file named by a hash of the layout and method. Each new day is
+then one matrix product for all fields together. Days with stations missing
+use weights for that set of stations (renormalised for inverse distance,
+solved again for kriging), kept in a small cache as well.
+
+    python3 spatialGrid.py grid <store dir> <layout.json> <out.npz> [idw|kriging]
+    python3 spatialGrid.py benchmark
+"""
+
+import os
+import json
+import math
+import zlib
+
+import numpy as np
+
+import config
+import climatology
+
+# Rev 0 - first release
+
+EARTH_RADIUS = 6371.0  # km
+
+# weather fields on the grids: field -> weatherHistory column
+gridFields = {
+    'rain': 5,
+    'tempMax': 1,
+    'tempMin': 2
+    }
+
+
+#### GEOMETRY ####
+def projectKm(lat, lon, originLat):
+    '''equirectangular projection to km, fine over a watershed
+    '''
+    x = np.radians(lon) * EARTH_RADIUS * math.cos(math.radians(originLat))
+    y = np.radians(lat) * EARTH_RADIUS
+    return np.column_stack([x, y])
+
+
+def gridCenters(bbox, shape):
+    '''(lat, lon) of every cell center, row major, first row at latMin
+    '''
+    lonMin, latMin, lonMax, latMax = bbox
+    rows, columns = shape
+    lat = latMin + (np.arange(rows) + .5) * (latMax - latMin) / rows
+    lon = lonMin + (np.arange(columns) + .5) * (lonMax - lonMin) / columns
+    lonGrid, latGrid = np.meshgrid(lon, lat)
+    return latGrid.ravel(), lonGrid.ravel()
+
+
+def distances(fromPoints, toPoints):
+    '''(len(fromPoints), len(toPoints)) distances in km
+    '''
+    difference = fromPoints[:, None, :] - toPoints[None, :, :]
+    return np.sqrt((difference ** 2).sum(axis=2))
+
+
+#### WEIGHTS ####
+def idwWeights(cellPoints, stationPoints, power=2.0):
+    '''inverse distance weights, rows sum to 1
+    - a cell on a station takes that station's value
+    '''
+    cellDistances = distances(cellPoints, stationPoints)
+    onStation = cellDistances < 1e-9
+    weights = 1.0 / np.maximum(cellDistances, 1e-9) ** power
+    exact = onStation.any(axis=1)
+    weights[exact] = onStation[exact]
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def variogram(distance, rangeKm, nugget):
+    '''exponential variogram with unit sill
+    '''
+    return nugget + (1.0 - nugget) * (1.0 - np.exp(-3.0 * distance / rangeKm))
+
+
+def krigingWeights(cellPoints, stationPoints, rangeKm, nugget=0.0):
+    '''ordinary kriging weights, rows sum to 1
+    - one solve of the (stations + 1) system for all cells at once
+    '''
+    stationCount = len(stationPoints)
+    system = np.ones((stationCount + 1, stationCount + 1))
+    system[:stationCount, :stationCount] = variogram(distances(stationPoints, stationPoints), rangeKm, nugget)
+    np.fill_diagonal(system[:stationCount, :stationCount], 0.0)
+    system[stationCount, stationCount] = 0.0
+
+    rightSide = np.ones((stationCount + 1, len(cellPoints)))
+    rightSide[:stationCount] = variogram(distances(stationPoints, cellPoints), rangeKm, nugget)
+    solution = np.linalg.solve(system, rightSide)
+    return np.ascontiguousarray(solution[:stationCount].T)
+
+
+class gridInterpolator():
+    '''weights for one station layout, grid and method, cached on disk
+    '''
+    def __init__(self, layout, method='idw', cachePath=None, power=2.0, rangeKm=None, nugget=.1):
+        self.stations = sorted(layout['stations'])
+        self.bbox = [float(value) for value in layout['bbox']]
+        self.shape = tuple(int(value) for value in layout['shape'])
+        self.method = method
+
+        stationLatLon = np.array([layout['stations'][station] for station in self.stations], dtype=float)
+        cellLat, cellLon = gridCenters(self.bbox, self.shape)
+        originLat = (self.bbox[1] + self.bbox[3]) / 2
+        self.stationPoints = projectKm(stationLatLon[:, 0], stationLatLon[:, 1], originLat)
+        self.cellPoints = projectKm(cellLat, cellLon, originLat)
+
+        if rangeKm is None:
+            # half the grid diagonal
+            rangeKm = float(np.sqrt(((self.cellPoints.max(axis=0) - self.cellPoints.min(axis=0)) ** 2).sum())) / 2
+        self.parameters = {'power': power} if method == 'idw' else {'rangeKm': rangeKm, 'nugget': nugget}
+
+        self.layoutHash = '{:08x}'.format(zlib.crc32(json.dumps(
+            [self.stations, stationLatLon.tolist(), self.bbox, self.shape, method, self.parameters]).encode('utf-8')))
+        self.cachePath = cachePath
+        self.partialWeights = {}
+        self.weights = self.loadWeights()
+
+    def computeWeights(self, stationMask=None):
+        stationPoints = self.stationPoints if stationMask is None else self.stationPoints[stationMask]
+        if self.method == 'idw':
+            return idwWeights(self.cellPoints, stationPoints, self.parameters['power'])
+        return krigingWeights(self.cellPoints, stationPoints, self.parameters['rangeKm'], self.parameters['nugget'])
+
+    def loadWeights(self):
+        '''weights from the cache file, computed and saved if not there
+        '''
+        if self.cachePath is None:
+            return self.computeWeights()
+        filePathName = self.cachePath + '/gridWeights_' + self.layoutHash + '.npz'
+        try:
+            with np.load(filePathName) as saved:
+                return saved['weights']
+        except (FileNotFoundError, KeyError, ValueError):
+            pass
+        weights = self.computeWeights()
+        os.makedirs(self.cachePath, exist_ok=True)
+        np.savez(filePathName + '.tmp.npz', weights=weights)
+        os.replace(filePathName + '.tmp.npz', filePathName)
+        return weights
+
+    def weightsFor(self, stationMask):
+        '''weights for the stations in stationMask only (kept per mask)
+        '''
+        if stationMask.all():
+            return self.weights
+        key = np.packbits(stationMask).tobytes()
+        if key not in self.partialWeights:
+            if len(self.partialWeights) >= 16:
+                self.partialWeights.pop(next(iter(self.partialWeights)))
+            weights = np.zeros_like(self.weights)
+            if self.method == 'idw':
+                # inverse distance weights of the other stations only need renormalising
+                weights[:, stationMask] = self.weights[:, stationMask]
+                weightSums = weights.sum(axis=1, keepdims=True)
+                if (weightSums > 0).all():
+                    weights /= weightSums
+                else:
+                    # a cell sits on a missing station
+                    weights[:, stationMask] = self.computeWeights(stationMask)
+            else:
+                weights[:, stationMask] = self.computeWeights(stationMask)
+            self.partialWeights[key] = weights
+        return self.partialWeights[key]
+
+    def interpolate(self, values):
+        '''values (stations,) or (stations, fields) in self.stations order -> grids
+        - NaN values are left out, returns (fields, rows, columns)
+        '''
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1:
+            values = values[:, None]
+        grids = np.empty((values.shape[1],) + self.shape)
+
+        # fields known at the same stations share one product
+        masks = ~np.isnan(values)
+        patterns, inverse = np.unique(masks, axis=1, return_inverse=True)
+        for pattern in range(patterns.shape[1]):
+            stationMask = patterns[:, pattern]
+            fields = np.flatnonzero(inverse.ravel() == pattern)
+            if not stationMask.any():
+                grids[fields] = np.nan
+                continue
+            product = self.weightsFor(stationMask) @ np.nan_to_num(values[:, fields])
+            grids[fields] = product.T.reshape((len(fields),) + self.shape)
+        return grids
+
+    def interpolateDay(self, dayValues):
+        '''{field: {station: value}} -> {field: grid}
+        '''
+        fields = sorted(dayValues)
+        values = np.full((len(self.stations), len(fields)), np.nan)
+        for column, field in enumerate(fields):
+            for row, station in enumerate(self.stations):
+                value = dayValues[field].get(station)
+                if value is not None:
+                    values[row, column] = value
+        grids = self.interpolate(values)
+        return dict(zip(fields, grids))
+
+
+#### STATION DATA ####
+def tailLines(filePathName, lineCount):
+    '''last lineCount lines of a file (text, oldest first)
+    '''
+    try:
+        with open(filePathName, 'rb') as file:
+            file.seek(0, 2)
+            file.seek(max(0, file.tell() - 200 * lineCount))
+            lines = file.read().decode('utf-8', 'replace').split('\n')
+    except FileNotFoundError:
+        return []
+    return [line for line in lines[1:] if line != ''][-lineCount:]
+
+
+def latestDay(storePath, stations, day=None):
+    '''{field: {station: value}} for one day (the newest in the store if None)
+    - ET is the day's weatherData water loss, as in climatology
+    '''
+    lastRows = {}
+    for station in stations:
+        for row in tailLines(storePath + '/' + station + '/' + config.historyFileName, 8):
+            lastRows.setdefault(station, {})[row.split(',')[0]] = row.split(',')
+    if day is None:
+        days = [max(rows) for rows in lastRows.values()]
+        if days == []:
+            return day, {}
+        day = max(days)
+
+    dayValues = dict((field, {}) for field in list(gridFields) + ['ET'])
+    for station in stations:
+        values = lastRows.get(station, {}).get(day)
+        if values is not None:
+            for field, column in gridFields.items():
+                try:
+                    dayValues[field][station] = float(values[column])
+                except (ValueError, IndexError):
+                    pass
+        dataRows = tailLines(storePath + '/' + station + '/' + config.dataFileName, 200)
+        waterLoss = climatology.waterLossByDay(dataRows).get(day)
+        if waterLoss is not None:
+            dayValues['ET'][station] = waterLoss
+    return day, dayValues
+
+
+def benchmark(stationCount=200, shape=(100, 100), fieldCount=4, days=100):
+    '''weights setup and per day interpolation times for a random layout
+    '''
+    import time
+    import tempfile
+
+    random = np.random.default_rng(1)
+    layout = {
+        'bbox': [-86.0, 12.0, -85.5, 12.5],
+        'shape': list(shape),
+        'stations': dict(('station{:03d}'.format(number), [12.0 + .5 * random.random(), -86.0 + .5 * random.random()])
+            for number in range(stationCount))
+        }
+    results = {}
+    cachePath = tempfile.mkdtemp()
+    for method in ('idw', 'kriging'):
+        startTime = time.time()
+        interpolator = gridInterpolator(layout, method, cachePath)
+        results[method + ' weights'] = time.time() - startTime
+
+        startTime = time.time()
+        interpolator = gridInterpolator(layout, method, cachePath)
+        results[method + ' cached weights'] = time.time() - startTime
+
+        values = random.random((stationCount, fieldCount)) * 30
+        startTime = time.time()
+        for day in range(days):
+            interpolator.interpolate(values)
+        results[method + ' per day'] = (time.time() - startTime) / days
+
+        values[:3, 0] = np.nan
+        startTime = time.time()
+        interpolator.interpolate(values)
+        results[method + ' day, 3 missing'] = time.time() - startTime
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) >= 5 and sys.argv[1] == 'grid':
+        with open(sys.argv[3]) as file:
+            layout = json.load(file)
+        method = sys.argv[5] if len(sys.argv) > 5 else 'idw'
+        interpolator = gridInterpolator(layout, method, os.path.dirname(os.path.abspath(sys.argv[3])))
+        day, dayValues = latestDay(sys.argv[2], interpolator.stations)
+        grids = interpolator.interpolateDay(dayValues)
+        np.savez(sys.argv[4], day=day, bbox=interpolator.bbox, **grids)
+        print(day, ': ', ', '.join(field + ' ' + str(len(dayValues[field])) + ' stations' for field in sorted(dayValues)))
+    elif len(sys.argv) == 2 and sys.argv[1] == 'benchmark':
+        for name, seconds in benchmark().items():
+            print('{:28s}{:9.2f} ms'.format(name, seconds * 1000))
+    else:
+        print('usage: spatialGrid.py grid <store dir> <layout.json> <out.npz> [idw|kriging]')
+        print('       spatialGrid.py benchmark')
@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# stateCheckpoint.py
+# Rev 0
+"""stateCheckpoint - binary checkpoint of the station accumulators on the SD card
+
+The checkpoint file has two slots, each on its own page of a memory mapped
+file. Every write goes to the older slot with the next sequence number and a
+crc32, so a power cut during a write always leaves the other slot intact.
+On boot the newest slot with a good crc is used.
+
+slot layout (little endian):
+    magic 'PWCK', version, value count, sequence, date ordinal, hour,
+    values (doubles, in checkpointOrder), crc32 of everything before it
+"""
+
+import os
+import mmap
+import struct
+import zlib
+
+# Rev 0 - replaces the hourly text weatherDataBackup
+
+MAGIC = b'PWCK'
+VERSION = 1
+
+# order of values in a slot, do not reorder without changing VERSION
+checkpointOrder = (
+    # day accumulators (stationData.dayWeatherVariables)
+    'tempMax', 'tempMin', 'RHMax', 'RHMin', 'rainTotalDay',
+    'windAvrMax', 'windAvrMin', 'windGustMax', 'solarTotalDay',
+    # carried across days
+    'waterLossCumulative',
+    # period accumulators and counters
+    'windAvrPeriod', 'windGust', 'rainThisPeriod', 'windAvrCount'
+    )
+
+slotHeader = struct.Struct('<4sHHQiH')
+slotValues = struct.Struct('<' + 'd' * len(checkpointOrder))
+slotCRC = struct.Struct('<I')
+
+# each slot on its own page so a slot can be flushed by itself
+SLOT_SIZE = mmap.PAGESIZE
+
+
+class stateCheckpoint():
+    '''double buffered checkpoint file
+    '''
+    def __init__(self, filePathName):
+        self.filePathName = filePathName
+
+        # create or resize the file to exactly two slots
+        try:
+            fileSize = os.path.getsize(filePathName)
+        except FileNotFoundError:
+            fileSize = -1
+        if fileSize != 2 * SLOT_SIZE:
+            with open(filePathName, 'wb') as file:
+                file.write(bytes(2 * SLOT_SIZE))
+
+        self.file = open(filePathName, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 2 * SLOT_SIZE)
+
+        newest = self.newestSlot()
+        if newest is None:
+            self.sequence = 0
+        else:
+            self.sequence = newest[0]
+
+    def readSlot(self, slot):
+        '''returns (sequence, dateOrdinal, hour, values) or None if not valid
+        '''
+        offset = slot * SLOT_SIZE
+        crcOffset = offset + slotHeader.size + slotValues.size
+        magic, version, valueCount, sequence, dateOrdinal, hour = slotHeader.unpack_from(self.map, offset)
+        if magic != MAGIC or version != VERSION or valueCount != len(checkpointOrder):
+            return None
+        crc, = slotCRC.unpack_from(self.map, crcOffset)
+        if crc != zlib.crc32(self.map[offset:crcOffset]):
+            return None
+        values = slotValues.unpack_from(self.map, offset + slotHeader.size)
+        return sequence, dateOrdinal, hour, values
+
+    def newestSlot(self):
+        '''newest valid slot contents or None
+        '''
+        newest = None
+        for slot in (0, 1):
+            contents = self.readSlot(slot)
+            if contents is not None and (newest is None or contents[0] > newest[0]):
+                newest = contents
+        return newest
+
+    def write(self, state, dateOrdinal, hour):
+        '''writes state (dictionary with the checkpointOrder keys) to the older slot
+        '''
+        self.sequence += 1
+        slot = self.sequence % 2
+        offset = slot * SLOT_SIZE
+        crcOffset = offset + slotHeader.size + slotValues.size
+
+        slotHeader.pack_into(self.map, offset, MAGIC, VERSION, len(checkpointOrder),
+            self.sequence, dateOrdinal, hour)
+        slotValues.pack_into(self.map, offset + slotHeader.size,
+            *[float(state[datum]) for datum in checkpointOrder])
+        slotCRC.pack_into(self.map, crcOffset, zlib.crc32(self.map[offset:crcOffset]))
+        self.map.flush(offset, SLOT_SIZE)
+
+    def read(self):
+        '''returns (state, dateOrdinal, hour) from the newest valid slot, or None
+        '''
+        newest = self.newestSlot()
+        if newest is None:
+            return None
+        sequence, dateOrdinal, hour, values = newest
+        return dict(zip(checkpointOrder, values)), dateOrdinal, hour
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+if __name__ == '__main__':
+    import time
+    import tempfile
+
+    filePathName = tempfile.gettempdir() + '/weatherState.test'
+    checkpoint = stateCheckpoint(filePathName)
+    state = dict.fromkeys(checkpointOrder, 1.25)
+    startTime = time.time()
+    for i in range(1000):
+        state['windAvrCount'] = i
+        checkpoint.write(state, 737342, 14)
+    print('write: ', '{:.1f}'.format((time.time() - startTime) * 1000), 'us each')
+    print(stateCheckpoint(filePathName).read())
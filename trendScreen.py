@@ -0,0 +1,303 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# trendScreen.py
+# Rev 0
+"""trendScreen - 24 hour sparklines of temperature, rain and water loss on the LCD
+
+The last 24 closed hours come from the hour rollups (no data file is read)
+and are drawn on lines 2 and 3 as 20 columns of bars 0 to 16 pixels high,
+made of the bar1..bar7 glyphs of glyphCache and the ROM full block:
+    Temp 24h       31°C
+    ▁▂▂▃▅▇██▇▆▅▃▂▂▁▁▁▁▁▁
+    ...
+    <- page        18°C
+
+A screen is a frame of 4 x 20 cells, each a ROM code or a glyph name.
+Frames are kept per trend until the hour changes, so paging between trends
+does no rollup lookups, and only cells that differ from what is on the LCD
+(the shadow frame) are written.
+
+Self check and timings (two synthetic days of rollups, no hardware):
+    python3 trendScreen.py
+"""
+
+import math
+from datetime import datetime, timedelta
+
+import waterBalance
+import messageCatalog
+
+# Rev 0 - first release
+
+LINES = 4
+COLUMNS = 20
+HOURS = 24
+BAR_LINES = (2, 3)  # top line first
+BLANK = 32
+FULL = 255
+NO_DATA = ord('.')
+
+# title, how hours are drawn: 'range' bars from the lowest hour, 'total' bars from 0
+trends = (
+    ('Temp 24h', 'range'),
+    ('Rain 24h', 'total'),
+    ('ET 24h', 'total')
+    )
+
+
+#### VALUES ####
+def hourValue(bucket, title):
+    '''value of one hour rollup for a trend, None without data
+    - ET is penmanMonteith of the hour means, as periodActions does
+    '''
+    if bucket is None:
+        return None
+    if title == 'Temp 24h':
+        return bucket.value('temp', 'mean')
+    if title == 'Rain 24h':
+        return bucket.value('rain', 'sum')
+    means = [bucket.value(field, 'mean') for field in ('temp', 'RH', 'wind', 'solarLux')]
+    if None in means:
+        return None
+    return waterBalance.penmanMonteith(*means)
+
+
+def hourValues(rollups, title, endTime, hours=HOURS):
+    '''values of the hours closed before endTime, oldest first
+    '''
+    endHour = endTime.replace(minute=0, second=0, microsecond=0)
+    values = []
+    for hoursBack in range(hours, 0, -1):
+        key = (endHour - timedelta(hours=hoursBack)).strftime('%Y-%m-%d %H')
+        values.append(hourValue(rollups.bucket('hour', key), title))
+    return values
+
+
+def columnValues(values, kind, columns=COLUMNS):
+    '''hours onto the columns, some columns hold two hours
+    - 'range' columns are the mean of their hours, 'total' the sum
+    '''
+    combined = []
+    for column in range(columns):
+        start = column * len(values) // columns
+        end = (column + 1) * len(values) // columns
+        known = [value for value in values[start:end] if value is not None]
+        if known == []:
+            combined.append(None)
+        elif kind == 'range':
+            combined.append(sum(known) / len(known))
+        else:
+            combined.append(sum(known))
+    return combined
+
+
+def barHeights(values, kind, pixels=8 * len(BAR_LINES)):
+    '''pixel height of each column, None without data
+    - 'range': the lowest value is 1 pixel, the highest full
+    - 'total': 0 is no bar, the highest full
+    '''
+    known = [value for value in values if value is not None]
+    if known == []:
+        return [None] * len(values)
+    low = min(known) if kind == 'range' else 0.0
+    high = max(known)
+
+    heights = []
+    for value in values:
+        if value is None:
+            heights.append(None)
+        elif high <= low:
+            heights.append(pixels // 2 if kind == 'range' else 0)
+        elif kind == 'range':
+            heights.append(1 + int(round((value - low) / (high - low) * (pixels - 1))))
+        else:
+            heights.append(int(math.ceil(value / high * pixels)))
+    return heights
+
+
+def barCells(height, line):
+    '''cell of one column on a bar line (0 is the bottom line)
+    '''
+    if height is None:
+        return NO_DATA if line == 0 else BLANK
+    pixels = min(max(height - 8 * line, 0), 8)
+    if pixels == 0:
+        return BLANK
+    if pixels == 8:
+        return FULL
+    return 'bar' + str(pixels)
+
+
+#### FRAMES ####
+def textCells(encoded, width):
+    return list(encoded[:width]) + [BLANK] * (width - len(encoded[:width]))
+
+
+def valueText(value, title):
+    if value is None:
+        return b''
+    if title == 'Temp 24h':
+        return messageCatalog.encode('{:.0f}{{degree}}C'.format(value))
+    return messageCatalog.encode('{:.1f}mm'.format(value))
+
+
+def renderFrame(title, kind, values):
+    '''4 lines of 20 cells for the hour values of a trend
+    - line 1 title and highest (temperature) or 24 hour total
+    - line 4 navigation and lowest temperature
+    '''
+    known = [value for value in values if value is not None]
+    if kind == 'range':
+        topValue = max(known) if known != [] else None
+        bottomValue = min(known) if known != [] else None
+    else:
+        topValue = sum(known) if known != [] else None
+        bottomValue = None
+
+    frame = []
+    top = valueText(topValue, title)
+    frame.append(textCells(messageCatalog.getBytes(title), COLUMNS - 1 - len(top)) + [BLANK] + list(top))
+
+    heights = barHeights(columnValues(values, kind), kind)
+    for line in range(len(BAR_LINES) - 1, -1, -1):
+        frame.append([barCells(height, line) for height in heights])
+
+    bottom = valueText(bottomValue, title)
+    navigation = [127, BLANK] + list(messageCatalog.getBytes('page'))
+    frame.append(textCells(navigation, COLUMNS - 1 - len(bottom)) + [BLANK] + list(bottom))
+    return frame
+
+
+def blankFrame():
+    return [[BLANK] * COLUMNS for line in range(LINES)]
+
+
+class trendDisplay():
+    '''rendered trend frames and the shadow of what the LCD shows
+    '''
+    def __init__(self):
+        self.frames = {}  # title: frame, for the hour in frameHour
+        self.frameHour = None
+        self.shadow = blankFrame()
+        self.cellWrites = 0  # cells sent to the LCD, for the self check
+
+    def frame(self, rollups, title, endTime):
+        '''frame of a trend, rendered once per hour
+        '''
+        hour = endTime.strftime('%Y-%m-%d %H') + messageCatalog.current().language
+        if hour != self.frameHour:
+            self.frames = {}
+            self.frameHour = hour
+        if title not in self.frames:
+            kind = dict(trends)[title]
+            self.frames[title] = renderFrame(title, kind, hourValues(rollups, title, endTime))
+        return self.frames[title]
+
+    def cleared(self):
+        '''the LCD was cleared, it shows blanks
+        '''
+        self.shadow = blankFrame()
+
+    def show(self, glyphs, frame):
+        '''writes the cells that differ from the shadow, one write per run of cells
+        - glyphs of a run are uploaded before the cursor is placed
+        '''
+        for line in range(LINES):
+            shown = self.shadow[line]
+            wanted = frame[line]
+            column = 0
+            while column < COLUMNS:
+                if shown[column] == wanted[column]:
+                    column += 1
+                    continue
+                start = column
+                while column < COLUMNS and shown[column] != wanted[column]:
+                    column += 1
+                codes = [cell if isinstance(cell, int) else glyphs.code(cell) for cell in wanted[start:column]]
+                glyphs.flush()
+                glyphs.mylcd.lcd_display_bytes(bytes(codes), line + 1, start)
+                self.cellWrites += column - start
+            self.shadow[line] = list(wanted)
+
+
+if __name__ == '__main__':
+    import time
+    import random
+    import tempfile
+
+    import rollups
+    import glyphCache
+
+    class countingLCD():
+        def __init__(self):
+            self.writes = 0
+            self.screen = blankFrame()
+
+        def lcd_write(self, command, mode=0):
+            self.writes += 1
+
+        def lcd_write_char(self, value, mode=1):
+            self.writes += 1
+
+        def lcd_display_bytes(self, data, line=1, pos=0):
+            self.writes += 1 + len(data)
+            self.screen[line - 1][pos:pos + len(data)] = list(data)
+
+        def lcd_display_string(self, string, line=1, pos=0):
+            self.lcd_display_bytes(string.encode('ascii'), line, pos)
+
+        def lcd_clear(self):
+            self.writes += 1
+            self.screen = blankFrame()
+
+    # two days of 5 second samples, a shower in the afternoon
+    engine = rollups.rollupEngine(tempfile.mkdtemp())
+    random.seed(1)
+    start = datetime(2019, 10, 10)
+    for sample in range(2 * 17280):
+        sampleTime = start + timedelta(seconds=5 * sample)
+        sun = max(math.sin((sampleTime.hour + sampleTime.minute / 60 - 6) / 12 * math.pi), 0.0)
+        engine.addSample(sampleTime.timestamp(), {
+            'temp': 20 + 10 * sun + random.random(), 'RH': 90 - 30 * sun, 'wind': 3 + 5 * sun,
+            'solarLux': 90000 * sun, 'solarEnergy': 1.0,
+            'rain': .2 if sampleTime.hour == 15 and sample % 40 == 0 else 0.0})
+
+    lcd = countingLCD()
+    glyphs = glyphCache.glyphCache(lcd)
+    display = trendDisplay()
+    endTime = datetime(2019, 10, 11, 20, 10)
+
+    glyphs.clear()
+    display.cleared()
+    lcd.writes = 0
+    startTime = time.perf_counter()
+    display.show(glyphs, display.frame(engine, 'Temp 24h', endTime))
+    firstTime = time.perf_counter() - startTime
+    print('first trend: ', lcd.writes, 'LCD writes, {:.1f} ms'.format(firstTime * 1000))
+    for line in display.shadow:
+        # bar glyphs as their height, the full block as #
+        print('    ', ''.join(cell[-1] if isinstance(cell, str) else '#' if cell == FULL else
+            chr(cell) if 32 <= cell < 127 else '?' for cell in line))
+
+    for title, kind in trends[1:] + trends[:1]:
+        display.show(glyphs, display.frame(engine, title, endTime))
+
+    # paging again: frames come from the cache, only changed cells are written
+    writes = lcd.writes
+    cellWrites = display.cellWrites
+    startTime = time.perf_counter()
+    for title, kind in trends[1:] + trends[:1]:
+        display.show(glyphs, display.frame(engine, title, endTime))
+    pageTime = (time.perf_counter() - startTime) / len(trends)
+    print('cached page: {:.2f} ms, '.format(pageTime * 1000), (lcd.writes - writes) // len(trends),
+        'LCD writes,', (display.cellWrites - cellWrites) // len(trends), 'of', LINES * COLUMNS, 'cells')
+    assert display.cellWrites - cellWrites < len(trends) * LINES * COLUMNS
+
+    # what the LCD shows is the frame, glyph cells hold their glyph
+    for line in range(LINES):
+        for column in range(COLUMNS):
+            cell = display.shadow[line][column]
+            code = lcd.screen[line][column]
+            assert cell == code or glyphs.slotNames[code] == cell
+    print('slots', glyphs.slotNames, ', uploads', glyphs.uploads)
+    print('ok')
@@ -9,8 +9,10 @@ datasheet:
 http://ams.com/eng/Products/Light-Sensors/Light-to-Digital-Sensors/TSL25911
 
 '''
-import smbus
-import time
+from hardware import smbus  # or the simulated bus
+import clock  # sleeps are virtual in replays
+
+import RPiUtilities
 
 VISIBLE = 2  # channel 0 - channel 1
 INFRARED = 1  # channel 1
@@ -66,7 +68,7 @@ class Tsl2591(object):
                  integration=INTEGRATIONTIME_100MS,
                  gain=GAIN_LOW
                  ):
-        self.bus = smbus.SMBus(i2c_bus)
+        self.bus = RPiUtilities.lockedBus(smbus.SMBus(i2c_bus))
         self.sendor_address = sensor_address
         self.integration_time = integration
         self.gain = gain
@@ -155,7 +157,7 @@ class Tsl2591(object):
 
     def get_full_luminosity(self):
         self.enable()
-        time.sleep(0.120*self.integration_time+1)  # not sure if we need it "// Wait x ms for ADC to complete"
+        clock.sleep(0.120 * (self.integration_time + 1))  # 120 ms per 100 ms integration step, as the Adafruit library waits
         full = self.bus.read_word_data(
                     self.sendor_address, COMMAND_BIT | REGISTER_CHAN0_LOW
                     )
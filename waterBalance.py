@@ -0,0 +1,146 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+# waterBalance.py
+# Rev 0
+"""waterBalance - Penman-Monteith water loss and the soil water balance
+
+No hardware is used here so weather.py, the reprocessing engine and the
+planning tools share one implementation. Calibration values default to
+config and can be passed in for reprocessing with another calibration.
+"""
+
+import math
+
+import config
+
+# Rev 0 - moved from weatherStation.penmanMonteith and the hourly actions
+
+
+def penmanMonteith(hourTemp, hourRH, hourWindAvr, hourLux, printFactor=False, luminousEff=None):
+    ''' Calculates mm water lost in 1 hour
+    ONLY WORKS FOR 1 HOUR PERIOD
+    '''
+    if luminousEff is None:
+        luminousEff = config.luminousEff
+    if printFactor is True: print(hourTemp, 'deg C, ', hourRH, '% ', hourWindAvr, 'km/hr, ', hourLux, 'Lux')
+
+    # Solar Radiation
+    solarRadiation = hourLux * luminousEff * (3600/1e6) # (MJ/m^2-hr)
+
+    outgoingRadiation = 0 # equation 39 but am assuming this is small
+    netRadiation = ((1 - .23) * solarRadiation) -  outgoingRadiation # equation 38 gives the .23 constant
+    if printFactor is True: print('netRadiation: ', '{:3.6f}'.format(netRadiation))
+
+    #Ground Heat Flux
+    if hourLux > 3000:
+        soilHeatFlux = .1 * netRadiation  # Daytime Gn MJ/m^-hr
+    else:
+        soilHeatFlux = .5 * netRadiation  # Night Gn MJ/m^-hr
+
+    #psychometric constant is .067 at sea level and .060 at 3000 feet in kPa/deg C
+    psychometricConstant = .0665 # (kPa/deg C)
+
+    # e sub zero(T)  saturation vapor pressure at air temp T
+    saturationVaporPressure = .6108 * (math.exp((17.27 * hourTemp)/(hourTemp + 273))) # (kPa/deg C)
+
+
+    # saturation slope vapor pressure at air temperature
+    saturationVaporSlope = (4098 * saturationVaporPressure) / ((hourTemp +237.3)**2) # KPa/deg C
+
+    vaporPressure = saturationVaporPressure * (hourRH/100) # e sub a kPa
+    windSpeed = hourWindAvr * .278  # wind speed converted to m/sec
+
+    # Penman Monteith Equation in three parts then the whole
+    solarComponent = ((.408 * saturationVaporSlope) * (netRadiation - soilHeatFlux))
+    if printFactor is True: print('solar component: ', '{:4.3f}'.format(solarComponent))
+
+    windComponent = (psychometricConstant * (37 / (hourTemp + 273))) * windSpeed * (saturationVaporPressure - vaporPressure)
+    if printFactor is True: print('wind component: ', '{:4.3f}'.format(windComponent))
+
+    workingDenominator = saturationVaporSlope + (psychometricConstant * (1 + (.34 * windSpeed)))
+    if printFactor is True: print('denominator: ', '{:4.3f}'.format(workingDenominator))
+    if printFactor is True: print('')
+
+    # final Penman-Monteith
+    evapoTranspiration = (solarComponent + windComponent) / workingDenominator
+
+    return evapoTranspiration  # mm of water lost in that one hour
+
+
+def penmanMonteithArray(hourTemp, hourRH, hourWindAvr, hourLux, luminousEff=None):
+    '''penmanMonteith over NumPy arrays of hours (luminousEff may be an array too)
+    '''
+    import numpy as np
+
+    if luminousEff is None:
+        luminousEff = config.luminousEff
+
+    netRadiation = (1 - .23) * (hourLux * luminousEff * (3600/1e6))
+    soilHeatFlux = np.where(hourLux > 3000, .1, .5) * netRadiation
+    psychometricConstant = .0665
+
+    saturationVaporPressure = .6108 * np.exp((17.27 * hourTemp)/(hourTemp + 273))
+    saturationVaporSlope = (4098 * saturationVaporPressure) / ((hourTemp + 237.3)**2)
+    vaporPressure = saturationVaporPressure * (hourRH/100)
+    windSpeed = hourWindAvr * .278
+
+    solarComponent = (.408 * saturationVaporSlope) * (netRadiation - soilHeatFlux)
+    windComponent = (psychometricConstant * (37 / (hourTemp + 273))) * windSpeed * (saturationVaporPressure - vaporPressure)
+    workingDenominator = saturationVaporSlope + (psychometricConstant * (1 + (.34 * windSpeed)))
+    return (solarComponent + windComponent) / workingDenominator
+
+
+def updateWaterLoss(waterLossCumulative, waterLoss, rain, maximumDry=None, maximumAbsorption=None):
+    '''one period of the soil water balance
+    - adds the period water loss, subtracts the period rain
+    - limited to maximumDry (soil fully dry) and maximumAbsorption
+      (soil saturated), config values unless given
+    '''
+    if maximumDry is None:
+        maximumDry = config.maximumDry
+    if maximumAbsorption is None:
+        maximumAbsorption = config.maximumAbsorption
+
+    waterLossCumulative = waterLossCumulative + waterLoss - rain
+
+    # limit water loss to when soil is fully dry
+    if waterLossCumulative > maximumDry:
+        waterLossCumulative = maximumDry
+
+    # water loss can't be negative (soil can only be saturated)
+    if waterLossCumulative < maximumAbsorption:
+        waterLossCumulative = maximumAbsorption
+
+    return waterLossCumulative
+
+
+def applyIrrigation(waterLossCumulative, full, partialIrrigation=None):
+    '''water loss after an irrigation the farmer entered
+    - full irrigation puts water loss at 0, partial removes partialIrrigation mm
+    '''
+    if full is True:
+        return 0
+    if partialIrrigation is None:
+        partialIrrigation = config.partialIrrigation
+    return waterLossCumulative - partialIrrigation
+
+
+def waterLossSeries(waterLossCumulative, waterLoss, rain, full=None, partial=None):
+    '''runs updateWaterLoss over sequences of periods, returns the cumulative list
+    - each period depends on the one before, so this stays a loop
+    - full and partial (True for a period with that irrigation entered) apply
+      applyIrrigation before the period's update, as the station does
+    '''
+    if full is None:
+        full = [False] * len(waterLoss)
+    if partial is None:
+        partial = [False] * len(waterLoss)
+    series = []
+    for periodLoss, periodRain, periodFull, periodPartial in zip(waterLoss, rain, full, partial):
+        if periodFull:
+            waterLossCumulative = applyIrrigation(waterLossCumulative, True)
+        elif periodPartial:
+            waterLossCumulative = applyIrrigation(waterLossCumulative, False)
+        waterLossCumulative = updateWaterLoss(waterLossCumulative, periodLoss, periodRain)
+        series.append(waterLossCumulative)
+    return series
@@ -8,19 +8,34 @@
 
 # Rev A.1.0 - Field test release 10/10/19
 
-import time
-from datetime import datetime
-import RPi.GPIO as GPIO
-import math
+from datetime import datetime, timedelta
+from hardware import GPIO  # RPi.GPIO or simulated (PONTIS_HARDWARE)
 import random
+import threading
 
 # files required in folder
-import I2C_LCD_driver3
+import displays
 import tsl2591
 import HIH6121
 import RPiUtilities
 import config
-import EnglishSpanish
+import clock
+import messageCatalog
+import glyphCache
+import trendScreen
+import dataArchive
+import recordCheck
+import stateCheckpoint
+import sampleRing
+import rollups
+import waterBalance
+import climatology
+import irrigationPlan
+import etForecast
+import acquisition
+import buttonInput
+import loopTiming
+import sampleProfiler
 
 
 class stationData():
@@ -33,6 +48,27 @@ class stationData():
     '''
     def __init__(self):
         self.clearSensorError()
+        self.waterLossCumulative = 0
+
+        # period counters kept by weatherStation, restored from the checkpoint
+        self.periodCounters = {
+            'rainThisPeriod': 0,
+            'windAvrCount': 0
+            }
+
+        # binary checkpoint of the accumulators on the SD card
+        try:
+            self.checkpoint = stateCheckpoint.stateCheckpoint(config.SDFilePath + '/' + 'weatherState.ckpt')
+        except OSError:
+            print('no checkpoint file')
+            self.checkpoint = None
+
+        # minute, hour and day aggregates of every sample
+        try:
+            self.rollups = rollups.rollupEngine(config.SDFilePath + '/' + 'rollups', config.rollupMinuteDays)
+        except OSError:
+            print('no rollups')
+            self.rollups = None
 
     def clearSensorError(self):
         self.sensorError = {
@@ -79,116 +115,129 @@ class stationData():
 
 
     def resetDayVariables(self, forceDefaults, ignoreSomeDefaults, ignoreSomeBackups):
-        '''checks SD card for backup file, uses, or sets defaults
-        - forceDefaults is used at midnight to clear variables, it precludes using the backup file values
+        '''checks SD card for the state checkpoint, uses, or sets defaults
+        - forceDefaults is used at midnight to clear variables, it precludes using the checkpoint values
         - ignoreSomeDefaults allows some variables to stay when others are cleared
-        - ignoreSomeBackups is not currently used
+        - ignoreSomeBackups keeps the current waterLossCumulative instead of the checkpoint value
+        note: day values are only restored on the same day, period values in the same hour,
+            waterLossCumulative carries across days
         '''
         useDefaults = True
+        usePeriod = False
 
-        # check SD for weatherDataBackup
-        filePathName = config.SDFilePath + '/' + 'weatherDataBackup'
-        try:
-            with open(filePathName, newline='') as file:
-                # read full file
-                fileText = file.read()
-                # split into lines
-                lines = fileText.split('\n')
-                # import backupData as a string
-                backupData = lines[0]
-                if len(backupData) < 12 or backupData.isspace() == True:
-                    useDefaults = True
-                else:
-                    # check if backupData is from today
-                    today = datetime.now().strftime('%Y-%m-%d')
-                    backupDate = backupData[:10]
-                    print(today, ' / ', backupDate)
-                    if backupDate == today:
-                        useDefaults = False
-        except FileNotFoundError:
-            useDefaults = True 
+        # check SD for the checkpoint
+        backup = None
+        if self.checkpoint is not None:
+            backup = self.checkpoint.read()
+
+        if backup is not None:
+            backupState, backupDate, backupHour = backup
+            now = clock.now()
+            print(now.toordinal(), ' / ', backupDate)
+            if backupDate == now.toordinal():
+                useDefaults = False
+                usePeriod = backupHour == now.hour
 
         if forceDefaults is True:
             useDefaults = True
+            usePeriod = False
+
+        # assign default values
+        self.dayWeatherVariables = {
+            'tempMax': 0,
+            'tempMin': 100,
+            'RHMax': 0,
+            'RHMin': 100,
+            'rainTotalDay': 0,
+            'windAvrMax': 0,
+            'windAvrMin': 100, 
+            'windGustMax': 0, 
+            'solarTotalDay': 0
+            }  
+
+        self.dayOrder = ('tempMax', 'tempMin', 'RHMax', 'RHMin', 'rainTotalDay', 'windAvrMax', 'windAvrMin', 'windGustMax', 'solarTotalDay')
+        self.dayLabels = ('Temp max', 'Temp min', 'RH max', 'RH min', 'Rain total', 'Wind max', 'Wind min', 'Wind gust', 'Solar total')
 
         if useDefaults is True:
             print('useDefaults')
-            # assign default values
-            tempMax = 0
-            tempMin = 100
-            RHMax = 0
-            RHMin = 100
-            rainTotalDay = 0
-            windAvrMax = 0
-            windAvrMin = 100
-            windGustMax = 0
-            solarTotalDay = 0
             if ignoreSomeDefaults is False:
                 self.waterLossCumulative = 0
-            
         else:
-            print('use backupData')
-            # clip the date and time off backup data and convert to list of data
-            backupDataList = backupData[17:].split(',')
-            #use data from backup
-            tempMax = int(backupDataList[0])
-            if(tempMax > 100 or tempMax < -32): tempMax = 0
-
-            tempMin = int(backupDataList[1])
-            if(tempMin > 100 or tempMin < -32): tempMin = 100
-
-            RHMax = int(backupDataList[2])
-            if(RHMax > 100 or RHMax < 0): RHMax = 0
-
-            RHMin = int(backupDataList[3])
-            if(RHMin > 100 or RHMin < 0): RHMin = 100
-
-            rainTotalDay = float(backupDataList[4])
-            if(rainTotalDay > 100 or rainTotalDay < 0): rainTotalDay = 0
-
-            windAvrMax = int(backupDataList[5])
-            if(windAvrMax > 200 or windAvrMax < 0): windAvrMax = 0
-
-            windAvrMin = int(backupDataList[6])
-            if(windAvrMin > 200 or windAvrMin < 0): windAvrMin = 100
-
-            windGustMax = int(backupDataList[7])
-            if(windGustMax > 200 or windGustMax < 0): windGustMax = 0
+            print('use checkpoint')
+            for datum in self.dayOrder:
+                self.dayWeatherVariables[datum] = backupState[datum]
+
+        # water loss is not a day variable, it carries over from any checkpoint
+        if backup is not None and forceDefaults is False and ignoreSomeBackups is False:
+            self.waterLossCumulative = backupState['waterLossCumulative']
+
+        if usePeriod is True:
+            print('use checkpoint period')
+            self.periodWeatherVariables['windAvrPeriod'] = backupState['windAvrPeriod']
+            self.periodWeatherVariables['windGust'] = backupState['windGust']
+            self.periodCounters['rainThisPeriod'] = backupState['rainThisPeriod']
+            self.periodCounters['windAvrCount'] = int(backupState['windAvrCount'])
+        else:
+            self.periodCounters['rainThisPeriod'] = 0
+            self.periodCounters['windAvrCount'] = 0
 
-            solarTotalDay = float(backupDataList[8])
-            if(solarTotalDay > 100000 or solarTotalDay < 0): solarTotalDay = 0
+    def addSample(self, timestamp, rainIncrement, solarEnergy):
+        '''folds the current readings into the rollups (every 5 seconds)
+        - readings with a sensor error are left out
+        '''
+        if self.rollups is None:
+            return
+
+        sample = {
+            'temp': self.periodWeatherVariables['tempCurrent'],
+            'RH': self.periodWeatherVariables['RHCurrent'],
+            'wind': self.periodWeatherVariables['windCurrent'],
+            'solarLux': self.periodWeatherVariables['solarLux'],
+            'rain': rainIncrement,
+            'solarEnergy': solarEnergy
+            }
+        if self.sensorError['TempError'] != '':
+            sample['temp'] = None
+        if self.sensorError['RHError'] != '':
+            sample['RH'] = None
+        if self.sensorError['LuxError'] != '':
+            sample['solarLux'] = None
+            sample['solarEnergy'] = None
 
-            if ignoreSomeBackups is False:
-                self.waterLossCumulative = float(backupDataList[9])
-            if(self.waterLossCumulative > 1000 or self.waterLossCumulative < 0): self.waterLossCumulative = 0
+        try:
+            self.rollups.addSample(timestamp, sample)
+        except OSError:
+            print('rollup failed')
 
-        self.dayWeatherVariables = {
-            'tempMax': tempMax,
-            'tempMin': tempMin,
-            'RHMax': RHMax,
-            'RHMin': RHMin,
-            'rainTotalDay': rainTotalDay,
-            'windAvrMax': windAvrMax,
-            'windAvrMin': windAvrMin, 
-            'windGustMax': windGustMax, 
-            'solarTotalDay': solarTotalDay
-            }  
+    def daySummary(self, day):
+        '''values for the weatherHistory line, a lookup in the day rollup
+        - falls back to dayWeatherVariables if the day is not in the rollups
+        '''
+        summary = None
+        if self.rollups is not None:
+            summary = self.rollups.daySummary(day)
+        if summary is None:
+            summary = self.dayWeatherVariables
+        return summary
+
+    def writeCheckpoint(self, rainThisPeriod, windAvrCount):
+        '''write the accumulators to the SD checkpoint (cheap, called every minute)
+        '''
+        if self.checkpoint is None:
+            return
 
-        self.dayOrder = ('tempMax', 'tempMin', 'RHMax', 'RHMin', 'rainTotalDay', 'windAvrMax', 'windAvrMin', 'windGustMax', 'solarTotalDay')
-        self.dayLabels = ('Temp max', 'Temp min', 'RH max', 'RH min', 'Rain total', 'Wind max', 'Wind min', 'Wind gust', 'Solar total')
+        state = dict(self.dayWeatherVariables)
+        state['waterLossCumulative'] = self.waterLossCumulative
+        state['windAvrPeriod'] = self.periodWeatherVariables['windAvrPeriod']
+        state['windGust'] = self.periodWeatherVariables['windGust']
+        state['rainThisPeriod'] = rainThisPeriod
+        state['windAvrCount'] = windAvrCount
 
-    def writeDataBackupSD(self):
-        ''' write weather backup file (one line)
-        '''
-        filePathName = config.SDFilePath + '/' + 'weatherDataBackup'
-        with open(filePathName, 'w') as file:
-            dateTimeNow = '{:%Y-%m-%d:%_H:%M}'.format(datetime.now())
-            file.write(dateTimeNow + ',')
-            # write data from dayWeatherVariables
-            for datum in self.dayOrder:
-                file.write(str('{:.0f}'.format(self.dayWeatherVariables[datum])) + ',')
-            file.write(str('{:.3f}'.format(self.waterLossCumulative)))
-            file.write('\n')
+        now = clock.now()
+        try:
+            self.checkpoint.write(state, now.toordinal(), now.hour)
+        except (OSError, ValueError):
+            print('checkpoint write failed')
 
 
 class weatherStation():
@@ -202,9 +251,22 @@ class weatherStation():
         #### SET KEY OPERATING PARAMETERS ####
         self.historyFileName = config.historyFileName
         self.dataFileName = config.dataFileName
+        self.timingFileName = config.timingFileName
 
         self.comment = ''
 
+        # the screens and the acquisition thread both change the water
+        # balance and the comment (irrigation entries), the trend pages
+        # read the rollups
+        self.dataLock = threading.RLock()
+
+        # phase latency histograms, MX 'timing' page and the hourly timing file
+        self.timing = loopTiming.loopTiming()
+
+        # stack sampling of a hanging station (MX 'profile' page, kill -USR1)
+        self.profiler = sampleProfiler.sampleProfiler(config.profileInterval)
+        sampleProfiler.installSignal(self.startProfile)
+
         #### UI - Display, LED, BUTTONS  ####
         # initialize rpi gpio
         GPIO.setmode(GPIO.BOARD)
@@ -216,25 +278,23 @@ class weatherStation():
         GPIO.setup(self.powerLEDpin, GPIO.OUT, initial=GPIO.LOW)
 
 
-        # buttonState: 0 is no button pressed, 99 is any button when backlight is off, (1-3) button pressed
-        self.buttonState = 0
-
-        # buttonAction indicates whether the requested action is complete (1) or yet to be completed (0)
-        self.buttonAction = 0
-
         # buttons
         self.pinButton1 = 33
         self.pinButton2 = 31
         self.pinButton3 = 29
         GPIO.setup([self.pinButton1, self.pinButton2, self.pinButton3], GPIO.IN)
 
-        # debounce time in milliseconds
+        # sensor interrupt debounce time in milliseconds
         self.buttonDebounce = 300
 
         #### INTERRUPTS - BUTTONS ####
-        GPIO.add_event_detect(self.pinButton1, GPIO.RISING, bouncetime=self.buttonDebounce, callback=self.reactToButton)
-        GPIO.add_event_detect(self.pinButton2, GPIO.RISING, bouncetime=self.buttonDebounce, callback=self.reactToButton)
-        GPIO.add_event_detect(self.pinButton3, GPIO.RISING, bouncetime=self.buttonDebounce, callback=self.reactToButton)
+        # both edges to the debounce state machines, screens read the events
+        self.buttons = buttonInput.buttonInput(
+            {self.pinButton1: 1, self.pinButton2: 2, self.pinButton3: 3}, GPIO.input,
+            clock=clock.monotonic)
+        GPIO.add_event_detect(self.pinButton1, GPIO.BOTH, callback=self.buttons.edge)
+        GPIO.add_event_detect(self.pinButton2, GPIO.BOTH, callback=self.buttons.edge)
+        GPIO.add_event_detect(self.pinButton3, GPIO.BOTH, callback=self.buttons.edge)
 
 
         # backlight timer (backlightOFFTime is also used for screen time outs)
@@ -254,7 +314,7 @@ class weatherStation():
             self.mylcd.lcd_display_string('No USB Drive!', 1, 0)
             self.mylcd.lcd_display_string('replace USB', 2, 2)
             self.mylcd.lcd_display_string('and Reboot', 3, 0)
-            time.sleep(5)
+            clock.sleep(5)
             self.MXscreenSelect(8)   # goes to MX screen then to reboot
 
         if self.debugON == True: print('usbPath: ', self.usbPath)
@@ -267,8 +327,8 @@ class weatherStation():
         data.resetDayVariables(False, False, False)
         self.comment = '/'
 
-        # windAvrCount used to calculate windAvr
-        self.windAvrCount = 0
+        # windAvrCount used to calculate windAvr (restored with the checkpoint)
+        self.windAvrCount = data.periodCounters['windAvrCount']
 
 
         #### START SENSORS
@@ -292,7 +352,7 @@ class weatherStation():
                 data.sensorError['RHError'] ==  '' and\
                 data.sensorError['LuxError'] == '':
             if self.debugON == True: print('no errors at startup')
-            self.mylcd.lcd_display_string(EnglishSpanish.getWord('no errors'), 3, 0)
+            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('no errors'), 3, 0)
         else:
             self.comment = self.comment + data.sensorError['TempError']\
                 + data.sensorError['RHError'] + data.sensorError['LuxError']
@@ -305,26 +365,47 @@ class weatherStation():
 
 
         #### INTERRUPTS - SENSORS ####
+        # MX test page counting a sensor ('anemometer', 'rain gage') instead of the data
+        self.sensorTest = None
+        self.sensorTestCounter = 0
+
         # anemometer
         self.windCounter = 0
         GPIO.setup(18, GPIO.IN)
         GPIO.add_event_detect(18, GPIO.RISING, bouncetime=self.buttonDebounce, callback=self.windCount)
 
         self.rainCounter = 0
-        self.rainThisPeriod = 0
+        self.rainThisPeriod = data.periodCounters['rainThisPeriod']
         GPIO.setup(16, GPIO.IN)
         GPIO.add_event_detect(16, GPIO.RISING, bouncetime=self.buttonDebounce, callback=self.rainCount)
 
         #### Set Up Data Files ####
         self.initializeDataFiles()
 
+        # ring of recent 5 second samples on the SD card
+        try:
+            self.sampleRing = sampleRing.sampleRing(config.SDFilePath + '/' + 'weatherSamples.ring',
+                config.sampleRingDays * sampleRing.SAMPLES_PER_DAY)
+        except OSError:
+            if self.debugON == True: print('no sample ring')
+            self.sampleRing = None
+
+        # day of year climate normals for the rain screen
+        self.climatology = self.loadClimatology()
+
+        # hourly water loss forecast for the irrigation screen
+        self.etForecast = etForecast.etForecast(config.SDFilePath + '/' + 'etForecast.json')
+
+        # 24 hour trend pages, frames rendered from the hour rollups
+        self.trends = trendScreen.trendDisplay()
+
         #### START SCREEN ERROR DISPLAY ####
         if self.comment != '/':
             self.mylcd.lcd_display_string(self.comment, 3, 0)
 
         # Animation for 8 second delay
         self.runFunGrowAnimation(1, 8, 6, 4)
-        time.sleep(4)
+        clock.sleep(4)
         
 
         # Clear comments, sensor errors will re-add during a read
@@ -335,7 +416,7 @@ class weatherStation():
 
         # LCD - first mainscreen
         self.readTempRH()
-        self.mylcd.lcd_clear()
+        self.glyphs.clear()
         self.mainScreen()
         
         self.mainScreenRefresh()
@@ -350,104 +431,98 @@ class weatherStation():
     #### TIMER FUNCTIONS ####
     def runTimer(self):
         '''main operating loop for weather station
+        - buttons and the LCD, data acquisition runs in its own thread
         '''
         # set timer variables
         lastSecond = 0
         lastFloatSecond = 0
-        lastMinute = 0
-        yesterday = datetime.now().strftime('%Y-%m-%d')
 
-        self.readTempRH()
-        self.readSolar()
+        self.startAcquisition()
 
         runWeather = True
         while runWeather is True:
             #### CONTINUOUS POLLING ####
             # too fast of polling causes LCD problems, so this sets the timing         
-            thisSecond = float(datetime.now().strftime('%S.%f'))
-            thisMinute = int(datetime.now().strftime('%M'))
-            today = datetime.now().strftime('%Y-%m-%d')
+            thisSecond = float(clock.now().strftime('%S.%f'))
 
-            if lastFloatSecond + self.pollingDelay >= 60:
-                lastFloatSecond = 0
+            # the minute turned over since the last poll
+            if thisSecond < lastFloatSecond:
+                lastFloatSecond -= 60
 
             #### PACED POLLING ####
             if thisSecond > lastFloatSecond + self.pollingDelay:
-                if self.debug2ON == True: print(datetime.now().strftime('%H:%M:%S.%f'))
+                if self.debug2ON == True: print(clock.now().strftime('%H:%M:%S.%f'))
                 # index the timer
                 lastFloatSecond = thisSecond
 
-                # check and react to buttonState
-                if self.buttonState != 0 and self.buttonAction == 0:
-                    if self.buttonState == 1:
-                        self.buttonAction = 1
+                # check and react to button presses
+                start = loopTiming.now()
+                buttonPressed = self.nextButton()
+                self.timing.record('buttons', start)
+                if buttonPressed != 0:
+                    if buttonPressed == 1:
                         # take action
                         self.rainScreen()
+                        self.sparklineScreen()
                         self.irrigation()
                         self.Iirrigated()
 
                         # refresh LCD
-                        self.mylcd.lcd_clear()
+                        self.glyphs.clear()
                         self.mainScreen()
                         self.clockRefresh()
                         self.mainScreenRefresh()
 
                         # set for polling
-                        lastFloatSecond = float(datetime.now().strftime('%S.%f'))
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
 
-                    elif self.buttonState == 2:
-                        self.buttonAction = 1
+                    elif buttonPressed == 2:
                         
                         # take action
                         self.MXscreenSelect(0)
 
                         # refresh LCD
-                        self.mylcd.lcd_clear()
+                        self.glyphs.clear()
                         self.mainScreen()
                         self.clockRefresh()
                         self.mainScreenRefresh()
 
                         # set for polling
-                        lastFloatSecond = float(datetime.now().strftime('%S.%f'))
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
 
-                    elif self.buttonState == 3:
-                        self.buttonAction = 1
+                    elif buttonPressed == 3:
                         pass
 
-                    elif self.buttonState == 99:
+                    elif buttonPressed == 99:
                         self.backlightON()
 
                     else:
                         pass
 
-                # Require buttons to be released before next press
-                self.buttonCheckRelease()
-
                 if self.debug2ON == True: print('before Every Second')
 
-                #### EVERY SECOND ACTIONS ####
+                #### EVERY SECOND DISPLAY ACTIONS ####
                 thisSecond = int(thisSecond)
                 if thisSecond != lastSecond:
-                    # flash the pulse green LED on JH board, all of the time)
-                    if thisSecond % 2 == 0:
-                        GPIO.output(self.powerLEDpin, GPIO.LOW)
-                    else:
-                        GPIO.output(self.powerLEDpin, GPIO.HIGH)
-
-
-                    if self.debug2ON == True: print('after pulse')
-
                     # turn backlight off (1 indicates ON)
                     if self.backlightTimer < self.backlightOffTime:
                         # Display actions
                         self.backlightTimer += 1
                         # flash the pulse (on LCD)
+                        start = loopTiming.now()
                         if thisSecond % 2 == 0:
                             # self.mylcd.lcd_display_string('*', 1, 19)
-                            self.mylcd.lcd_display_string('', 1, 19)
-                            self.mylcd.lcd_write_char(self.custom['flower'])
+                            self.glyphs.write('flower', 1, 19)
                         else:
                             self.mylcd.lcd_display_string(' ', 1, 19)
+                        self.timing.record('LCD second', start)
+
+                        # new readings every 5 seconds
+                        if thisSecond % 5 == 0:
+                            start = loopTiming.now()
+                            self.mainScreen()
+                            self.mainScreenRefresh()
+                            self.timing.record('LCD main screen', start)
                         
                     elif self.backlightTimer == self.backlightOffTime:
                         self.mylcd.backlight(0)
@@ -455,121 +530,214 @@ class weatherStation():
                     else:
                         pass
 
-                    if self.debug2ON == True: print('end every second')
-
-                    #### EVERY 5 SECONDS ####
-                    if thisSecond % 5 == 0 or thisSecond == 0:
-                        self.readWind(5)
-                        self.readSolar()
-
-                        if self.debug2ON == True: print('every 5 second')
+                    lastSecond = thisSecond
+                    if self.debug2ON == True: print('end every second display')
 
-                        # rain total counts (resets rainCounter)
-                        workingRainIncrement = (self.rainCounter * config.rainGageVolume)
-                        data.dayWeatherVariables['rainTotalDay'] = data.dayWeatherVariables['rainTotalDay'] + workingRainIncrement
-                        self.rainThisPeriod = self.rainThisPeriod + workingRainIncrement
-                        self.rainCounter = 0
 
-                        # Total solar for the day (kilojoules)
-                        if data.sensorError['LuxError'] != 'no Solar/':
-                            solarEnergyK = (config.luminousEff * data.periodWeatherVariables['solarLux'] * 5) / 1000
-                            data.dayWeatherVariables['solarTotalDay'] = data.dayWeatherVariables['solarTotalDay'] + solarEnergyK
+    ##############################################################
+    #### DATA ACQUISITION ########################################
+    ##############################################################
 
-                        # Display actions
-                        if self.backlightTimer < self.backlightOffTime:
-                            self.mainScreen()
-                            self.mainScreenRefresh()
+    def startAcquisition(self, startThread=True):
+        '''starts the acquisition thread, sampling from the next second
+        - startThread False: a replay calls self.acquisition.runSlot itself
+        '''
+        self.readTempRH()
+        self.readSolar()
 
-                        # Low Battery check
-                        if(GPIO.input(10) == False):
-                            if self.debugON == True: print('low battery ',self.lowBattery)
-                            self.lowBattery = self.lowBattery + 1
-                            self.batteryCheck()
+        now = clock.now()
+        self.lastFiveSecond = None
+        self.lastThirtySecond = int(clock.time() // 30)
+        self.lastMinute = now.minute
+        self.lastPeriodHour = now.hour
+        self.yesterday = now.strftime('%Y-%m-%d')
+
+        self.acquisition = acquisition.acquisitionThread(
+            self.timing.timed('tick', self.acquisitionTick), 1.0, self.debugON)
+        if startThread is True:
+            self.acquisition.start()
+
+    def acquisitionTick(self, slotTime):
+        '''one second of data acquisition, called by the acquisition thread
+        - a late tick does the 5 second work once, over the seconds since the
+          last sample (wind speed and solar energy of the real interval), and
+          the 30 second read once
+        '''
+        now = datetime.fromtimestamp(slotTime)
+        thisSecond = now.second
+        thisMinute = now.minute
+        today = now.strftime('%Y-%m-%d')
+        # the whole second's work, recorded at both returns
+        secondStart = loopTiming.now()
+
+        # flash the pulse green LED on JH board, all of the time)
+        if thisSecond % 2 == 0:
+            GPIO.output(self.powerLEDpin, GPIO.LOW)
+        else:
+            GPIO.output(self.powerLEDpin, GPIO.HIGH)
+
+        #### EVERY 5 SECONDS ####
+        fiveSecond = int(slotTime // 5)
+        if fiveSecond != self.lastFiveSecond:
+            start = loopTiming.now()
+            # the clock was set or stepped (clockSet, setRTC): a new first sample
+            if self.lastFiveSecond is not None:
+                if not 0 < 5 * (fiveSecond - self.lastFiveSecond) <= acquisition.MAX_LATE_SECONDS:
+                    self.lastFiveSecond = None
+            # seconds since the last sample, more than 5 if ticks were missed
+            sampleSeconds = 5
+            if self.lastFiveSecond is not None:
+                sampleSeconds = 5 * (fiveSecond - self.lastFiveSecond)
+            self.lastFiveSecond = fiveSecond
+            # raw counts for the sample ring, readWind clears windCounter
+            # tips taken off the counter now, the conversion waits below are long
+            # and tips during them count in the next sample
+            windPulses = self.windCounter
+            rainTips = self.rainCounter
+            self.rainCounter -= rainTips
+            with self.dataLock:
+                self.readWind(sampleSeconds)
+            self.readSolar()
+
+            if self.debug2ON == True: print('every 5 second')
+
+            # the day totals and rollups, the screens read and change them too
+            with self.dataLock:
+                # rain total counts (rainTips already taken off rainCounter)
+                workingRainIncrement = (rainTips * config.rainGageVolume)
+                data.dayWeatherVariables['rainTotalDay'] = data.dayWeatherVariables['rainTotalDay'] + workingRainIncrement
+                self.rainThisPeriod = self.rainThisPeriod + workingRainIncrement
+
+                # Total solar for the day (kilojoules)
+                solarEnergyK = 0
+                if data.sensorError['LuxError'] != 'no Solar/':
+                    solarEnergyK = (config.luminousEff * data.periodWeatherVariables['solarLux'] * sampleSeconds) / 1000
+                    data.dayWeatherVariables['solarTotalDay'] = data.dayWeatherVariables['solarTotalDay'] + solarEnergyK
+
+                # minute, hour and day rollups
+                data.addSample(slotTime, workingRainIncrement, solarEnergyK)
+
+            # raw sample to the ring
+            if self.sampleRing is not None:
+                self.sampleRing.append(slotTime,
+                    data.periodWeatherVariables['tempCurrent'],
+                    data.periodWeatherVariables['RHCurrent'],
+                    data.periodWeatherVariables['solarLux'],
+                    windPulses, rainTips)
+
+            # Low Battery check
+            if(GPIO.input(10) == False):
+                if self.debugON == True: print('low battery ',self.lowBattery)
+                self.lowBattery = self.lowBattery + 1
+                self.batteryCheck()
+
+            self.timing.record('every 5 seconds', start)
+            if self.debug2ON == True: print('end every 5 second')
+
+        #### EVERY 30 SECONDS ####
+        thirtySecond = int(slotTime // 30)
+        if thirtySecond != self.lastThirtySecond:
+            start = loopTiming.now()
+            self.lastThirtySecond = thirtySecond
+            if self.debug2ON == True: print('every 30 second')
+            self.readTempRH()
+            self.timing.record('every 30 seconds', start)
+
+        #### MINUTE ACTIONS ####
+        if thisMinute == self.lastMinute:
+            self.timing.record('every second', secondStart)
+            return
+        self.lastMinute = thisMinute
+
+        with self.dataLock:
+            #### 30 MINUTE ACTIONS ####
+            if self.debug2ON == True: print('every minute')
+            if thisMinute % 30 == 0 or thisMinute == 0:
+                ## reset lowBattery (this makes it have to go over 3 within 30 minutes)
+                self.lowBattery = 0
+
+            #### ON THE HOUR ACTIONS ####
+            # by the hour changing, so a late minute 0 still records the period
+            if now.hour != self.lastPeriodHour:
+                self.lastPeriodHour = now.hour
+                start = loopTiming.now()
+                self.periodActions()
+                self.timing.record('hourly', start)
+
+                # the hour's phase timings to the USB drive
+                try:
+                    self.timing.dumpHour(self.usbPath + '/' + self.timingFileName, '{:%Y-%m-%d:%_H:%M}'.format(now))
+                except OSError:
+                    if self.debugON == True: print('timing file write failed')
+
+            #### MIDNIGHT ACTIONS ####
+            if today != self.yesterday:
+                start = loopTiming.now()
+                if self.debug2ON == True: print('midnight actions')
+                self.writeDailySummary(self.yesterday)
+                self.addClimatologyDay(self.yesterday)
+
+                # first day of the month, close last month's partitions
+                if today[:7] != self.yesterday[:7]:
+                    self.rotateArchive()
+
+                data.resetDayVariables(True, True, True)
+
+                self.rainCounter = 0
+
+                self.yesterday = today
+                self.timing.record('midnight', start)
+
+            #### CHECKPOINT ####
+            # every minute, after the period and midnight resets
+            data.writeCheckpoint(self.rainThisPeriod, self.windAvrCount)
+            if self.sampleRing is not None:
+                self.sampleRing.flush()
+        self.timing.record('every second', secondStart)
+
+    def periodActions(self):
+        '''hourly water loss and weatherData record
+        '''
+        if self.debug2ON == True: print('every hour')
+        if self.debugON == True: print('record weatherData at ', '{:%_H:%M}'.format(clock.now()))
+        if self.debugON == True:
+            data.printPeriodVariables()
+            print('rainThisPeriod: ', self.rainThisPeriod)
 
-                        if self.debug2ON == True: print('end every 5 second')
+        if self.debug2ON == True: print('period actions')
+        # use Penman-Monteith to calculate water loss during this period
+        workingPrintFactor = False
+        if self.debugON == True:
+            workingPrintFactor = True      
+
+        waterLoss = self.penmanMonteith(
+            data.periodWeatherVariables['tempCurrent'],
+            data.periodWeatherVariables['RHCurrent'],
+            data.periodWeatherVariables['windAvrPeriod'],
+            data.periodWeatherVariables['solarLux'],
+            workingPrintFactor)
+        # add this waterloss and subtract the rain during this period
+        # (limited to the fully dry and saturated soil values)
+        data.waterLossCumulative = waterBalance.updateWaterLoss(
+            data.waterLossCumulative, waterLoss, self.rainThisPeriod)
+        self.updateForecast(waterLoss, self.rainThisPeriod)
+        self.rainThisPeriod = 0
 
+        # acquisition seconds missed this period (should be none)
+        missedSlots = self.acquisition.takeMissed()
+        if missedSlots > 0:
+            self.comment = self.comment + 'missed ' + str(missedSlots) + 's/'
 
-                    #### EVERY 30 SECONDS ####
-                    if thisSecond == 30 or thisSecond == 0:
-                        if self.debug2ON == True: print('every 30 second')
-                        self.readTempRH()
+        if self.debugON == True: print('waterLoss: ', waterLoss, ' / ', data.waterLossCumulative)
+        # Record weather variables to weatherData
+        self.writePeriodDataLine(waterLoss)
 
-                    lastSecond = thisSecond
-                    if self.debug2ON == True: print('end full every second')
-
-                #### MINUTE ACTIONS ####
-                if thisMinute != lastMinute:
-                    #### 30 MINUTE ACTIONS ####
-                    if self.debug2ON == True: print('every minute')
-                    if thisMinute % 30 == 0 or thisMinute == 0:
-                        ## reset lowBattery (this makes it have to go over 3 within 30 minutes)
-                        self.lowBattery = 0
-                    if self.debug2ON == True: print('end every minute')
-
-                    #### ON THE HOUR ACTIONS ####
-                    if thisMinute == 0:
-                        if self.debug2ON == True: print('every hour')
-                        if self.debugON == True: print('record weatherData at ', '{:%_H:%M}'.format(datetime.now()))
-                        if self.debugON == True:
-                            data.printPeriodVariables()
-                            print('rainThisPeriod: ', self.rainThisPeriod)
-
-                        #####################################################
-                        #### PERFORM PERIOD ACTIONS #########################
-                        #####################################################
-                        if self.debug2ON == True: print('period actions')
-                        # use Penman-Monteith to calculate water loss during this period
-                        workingPrintFactor = False
-                        if self.debugON == True:
-                            workingPrintFactor = True      
-
-                        waterLoss = self.penmanMonteith(
-                            data.periodWeatherVariables['tempCurrent'],
-                            data.periodWeatherVariables['RHCurrent'],
-                            data.periodWeatherVariables['windAvrPeriod'],
-                            data.periodWeatherVariables['solarLux'],
-                            workingPrintFactor)
-                        # add this waterloss to the cumulative water loss
-                        data.waterLossCumulative = data.waterLossCumulative + waterLoss
-
-                        # subtract rain during this period from waterLoss
-                        data.waterLossCumulative = data.waterLossCumulative - self.rainThisPeriod
-                        self.rainThisPeriod = 0
-
-                        # limit water loss to when soil is fully dry
-                        if data.waterLossCumulative > config.maximumDry:
-                            data.waterLossCumulative = config.maximumDry
-
-                        # water loss can't be negative (soil can only be saturated)
-                        if data.waterLossCumulative < config.maximumAbsorption:
-                            data.waterLossCumulative = config.maximumAbsorption
-
-                        if self.debugON == True: print('waterLoss: ', waterLoss, ' / ', data.waterLossCumulative)
-                        # Record weather variables to weatherData
-                        self.writePeriodDataLine(waterLoss)
-
-                        ## Clear averaging variables
-                        data.periodWeatherVariables['windAvrPeriod'] = 0
-                        self.windAvrCount = 0
-                        data.periodWeatherVariables['windGust'] = 0
-
-                        if self.debug2ON == True: print('end period actions')
-
-                        #### END PERIOD ACTIONS ####
-
-                    lastMinute = thisMinute
-
-                    #### MIDNIGHT ACTIONS ####
-                    if today != yesterday:
-                        if self.debug2ON == True: print('midnight actions')
-                        self.writeDailySummary(yesterday)
-
-                        data.resetDayVariables(True, True, True)
-
-                        self.rainCounter = 0
-
-                        yesterday = today
+        ## Clear averaging variables
+        data.periodWeatherVariables['windAvrPeriod'] = 0
+        self.windAvrCount = 0
+        data.periodWeatherVariables['windGust'] = 0
 
+        if self.debug2ON == True: print('end period actions')
 
     ##############################################################
     ##############################################################
@@ -579,50 +747,29 @@ class weatherStation():
     def penmanMonteith(self, hourTemp, hourRH, hourWindAvr, hourLux, printFactor):
         ''' Calculates mm water lost in 1 hour
         ONLY WORKS FOR 1 HOUR PERIOD
+        - the equation is in waterBalance, shared with the reprocessing tools
         '''
-        if printFactor is True: print(hourTemp, 'deg C, ', hourRH, '% ', hourWindAvr, 'km/hr, ', hourLux, 'Lux')
-
-        # Solar Radiation
-        solarRadiation = hourLux * config.luminousEff * (3600/1e6) # (MJ/m^2-hr)
-
-        outgoingRadiation = 0 # equation 39 but am assuming this is small
-        netRadiation = ((1 - .23) * solarRadiation) -  outgoingRadiation # equation 38 gives the .23 constant
-        if printFactor is True: print('netRadiation: ', '{:3.6f}'.format(netRadiation))
-
-        #Ground Heat Flux
-        if hourLux > 3000:
-            soilHeatFlux = .1 * netRadiation  # Daytime Gn MJ/m^-hr
-        else:
-            soilHeatFlux = .5 * netRadiation  # Night Gn MJ/m^-hr
-
-        #psychometric constant is .067 at sea level and .060 at 3000 feet in kPa/deg C
-        psychometricConstant = .0665 # (kPa/deg C)
-
-        # e sub zero(T)  saturation vapor pressure at air temp T
-        saturationVaporPressure = .6108 * (math.exp((17.27 * hourTemp)/(hourTemp + 273))) # (kPa/deg C)
+        return waterBalance.penmanMonteith(hourTemp, hourRH, hourWindAvr, hourLux, printFactor)
 
+    def updateForecast(self, waterLoss, rain):
+        '''adds the period to the water loss forecast (every hour)
+        '''
+        self.etForecast.update(clock.now().hour, waterLoss, rain)
+        try:
+            self.etForecast.save()
+        except OSError:
+            if self.debugON == True: print('forecast write failed')
+        if self.debugON == True: print('irrigation in: ', self.etForecast.hoursUntil(data.waterLossCumulative), 'hours')
 
-        # saturation slope vapor pressure at air temperature
-        saturationVaporSlope = (4098 * saturationVaporPressure) / ((hourTemp +237.3)**2) # KPa/deg C
-
-        vaporPressure = saturationVaporPressure * (hourRH/100) # e sub a kPa
-        windSpeed = hourWindAvr * .278  # wind speed converted to m/sec
-
-        # Penman Monteith Equation in three parts then the whole
-        solarComponent = ((.408 * saturationVaporSlope) * (netRadiation - soilHeatFlux))
-        if printFactor is True: print('solar component: ', '{:4.3f}'.format(solarComponent))
-
-        windComponent = (psychometricConstant * (37 / (hourTemp + 273))) * windSpeed * (saturationVaporPressure - vaporPressure)
-        if printFactor is True: print('wind component: ', '{:4.3f}'.format(windComponent))
-
-        workingDenominator = saturationVaporSlope + (psychometricConstant * (1 + (.34 * windSpeed)))
-        if printFactor is True: print('denominator: ', '{:4.3f}'.format(workingDenominator))
-        if printFactor is True: print('')
-
-        # final Penman-Monteith
-        evapoTranspiration = (solarComponent + windComponent) / workingDenominator
-
-        return evapoTranspiration  # mm of water lost in that one hour
+    def forecastText(self):
+        '''hours until the forecast deficit needs irrigation, 'regar  18h'
+        '''
+        hours = self.etForecast.hoursUntil(data.waterLossCumulative)
+        if hours is None:
+            if not self.etForecast.ready():
+                return ''
+            hours = '>' + str(config.forecastHours)
+        return messageCatalog.getWord('water') + '{:>5s}'.format(str(hours) + 'h')
 
     #### POWER MANAGEMENT ####
     def batteryCheck(self):
@@ -632,12 +779,12 @@ class weatherStation():
         '''
         if(self.lowBattery > 3):
             if self.debugON == True: print('low battery shutdown')
-            self.mylcd.lcd_clear()
-            self.mylcd.lcd_display_string(EnglishSpanish.getWord('Low Battery Shutdown'), 1, 0)
+            self.glyphs.clear()
+            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Low Battery Shutdown'), 1, 0)
             #### Write last line of data including lowBattery comment
             self.comment = self.comment + 'LOW BATTERY SHUTDOWN/'
             self.writePeriodDataLine(0)
-            time.sleep(5)
+            clock.sleep(5)
             GPIO.output(self.powerOFFholdpin, GPIO.LOW) #turn power off
             GPIO.cleanup()
             RPiUtilities.shutdownRPI()
@@ -677,6 +824,43 @@ class weatherStation():
             except OSError:
                 self.systemError('wrong USB', 'format')
 
+        # name the station so collected USB drives can be merged by ingest.py
+        stationName = config.stationName
+        if stationName == '':
+            stationName = RPiUtilities.stationId()
+        try:
+            with open(self.usbPath + '/' + config.stationFileName, 'w') as file:
+                file.write(stationName + '\n')
+        except OSError:
+            if self.debugON == True: print('station file write failed')
+
+        # remove torn or garbled rows (USB pulled during a write)
+        for fileName in (self.historyFileName, self.dataFileName):
+            try:
+                rowsRemoved = recordCheck.verifyTail(self.usbPath + '/' + fileName)
+            except OSError:
+                rowsRemoved = 0
+            if rowsRemoved > 0:
+                if self.debugON == True: print(fileName, ' bad rows removed: ', rowsRemoved)
+                self.comment = self.comment + 'bad rows ' + str(rowsRemoved) + '/'
+
+        # move rows from closed months into the archive partitions
+        self.rotateArchive()
+
+    def rotateArchive(self):
+        '''moves closed months of the data files into monthly partitions
+        '''
+        try:
+            rowsMoved = dataArchive.rotateAll(self.usbPath, clock.now().strftime('%Y-%m'))
+            if self.debugON == True: print('archived rows: ', rowsMoved)
+            if rowsMoved > 0:
+                # live files were rewritten, index the new end of file
+                recordCheck.updateIndex(self.usbPath + '/' + self.dataFileName)
+                recordCheck.updateIndex(self.usbPath + '/' + self.historyFileName)
+        except OSError:
+            if self.debugON == True: print('archive rotation failed')
+            self.comment = self.comment + 'archive fail/'
+
     def writePeriodDataLine(self, periodWaterLoss):
         '''writes one line of data to weatherData.CSV
         '''
@@ -689,7 +873,7 @@ class weatherStation():
         # create comments for sensor errors
         self.comment = self.comment + data.sensorError['TempError'] + data.sensorError['RHError'] + data.sensorError['LuxError']
         
-        data.writeDataBackupSD()
+        data.writeCheckpoint(self.rainThisPeriod, self.windAvrCount)
 
         filePathName = self.usbPath + '/' + self.dataFileName
         try:
@@ -697,26 +881,28 @@ class weatherStation():
         except FileNotFoundError:
             self.systemError(self, 'No USB data file', 'Check USB and reboot')
         else:
-            with open(filePathName, 'a') as file:
-                dateTimeNow = '{:%Y-%m-%d:%_H:%M}'.format(datetime.now())
-                file.write(dateTimeNow + ',')
-                # write data from periodWeatherVariables
-                for datum in data.periodOrder:
-                    if datum == 'rainTotalDay':
-                        file.write(str('{:.0f}'.format(data.dayWeatherVariables['rainTotalDay'])) + ',')
-                    else:
-                        file.write(str('{:.0f}'.format(data.periodWeatherVariables[datum])) + ',')
+            dateTimeNow = '{:%Y-%m-%d:%_H:%M}'.format(clock.now())
+            line = dateTimeNow + ','
+            # write data from periodWeatherVariables
+            for datum in data.periodOrder:
+                if datum == 'rainTotalDay':
+                    line = line + str('{:.0f}'.format(data.dayWeatherVariables['rainTotalDay'])) + ','
+                else:
+                    line = line + str('{:.0f}'.format(data.periodWeatherVariables[datum])) + ','
 
-                # waterLoss and cumulative
-                file.write(str('{:.3f}'.format(periodWaterLoss)) + ',')
-                file.write(str('{:.3f}'.format(data.waterLossCumulative)) + ',')
-                # comment
-                file.write(str(self.comment) + ',')
+            # waterLoss and cumulative
+            line = line + str('{:.3f}'.format(periodWaterLoss)) + ','
+            line = line + str('{:.3f}'.format(data.waterLossCumulative)) + ','
+            # comment
+            line = line + str(self.comment) + ','
 
-                # clear comment
-                self.comment = '/'
+            # clear comment
+            self.comment = '/'
 
-                file.write('\n')
+            # one write per record, stamped with its crc
+            with open(filePathName, 'a') as file:
+                file.write(recordCheck.stampRecord(line))
+            recordCheck.updateIndex(filePathName)
 
     def writeDailySummary(self, yesterday):
         ''' writes one line to weather history files
@@ -727,23 +913,24 @@ class weatherStation():
         except FileNotFoundError:
             self.systemError(self, 'No USB history file', 'Check USB and reboot')
         else:
+            # day summary is a lookup in the day rollup
+            summary = data.daySummary(yesterday)
+
+            line = yesterday + ','
+            for datum in data.dayOrder:
+                line = line + str('{:.0f}'.format(summary[datum])) + ','
+
+            # one write per record, stamped with its crc
             with open(filePathName, 'a') as file:
-                file.write(yesterday + ',')
-                # write data from dayWeatherVariables
-                for datum in data.dayOrder:
-                    file.write(str('{:.0f}'.format(data.dayWeatherVariables[datum])) + ',')
-                file.write('\n')
+                file.write(recordCheck.stampRecord(line))
+            recordCheck.updateIndex(filePathName)
 
     def getFileSummary(self, fileName):
         '''get summary of file for MX screen
         '''
-        filePathName = self.usbPath + '/' + fileName
-        
-        # count rows and get last line
-        with open(filePathName,'r') as file:
-            opened_file = file.readlines()
-            rowsInFile = len(opened_file) - 1  # subtract 1 for header
-            lastLine = opened_file[-1].split(',')[0]
+        # count rows (live file and archive partitions) and get last line
+        rowsInFile = dataArchive.totalRows(self.usbPath, fileName)
+        lastLine = dataArchive.lastTimestamp(self.usbPath, fileName)
 
         if fileName == self.dataFileName:
             dataFileMessage = str(rowsInFile) + 'L ' + lastLine[5:19]
@@ -752,35 +939,75 @@ class weatherStation():
         return dataFileMessage
 
     def getRainList(self, lengthRainList):
-        filePathName = self.usbPath + '/weatherHistory.csv'
+        '''rain totals of the last days from weatherHistory, newest first
+        - early in the month the older days come from the archive partitions
+        '''
         rainList = []
+        for row in dataArchive.tailRows(self.usbPath, self.historyFileName, lengthRainList):
+            rainList.append(row.split(',')[5])
 
-        # count rows and get last line
-        with open(filePathName,'r') as file:
-            opened_file = file.readlines()
-            rowsInFile = len(opened_file) - 1  # subtract 1 for header
-
-        for i, row in enumerate(reversed(opened_file)):
-            if i > (lengthRainList - 1):
-                return rainList
-            if i < rowsInFile:
-                rainList.append(row.split(',')[5])
-            else:
-                rainList.append('ND')
-
-        if i < lengthRainList:
-            for j in range ((lengthRainList - 1) - i):
-                rainList.append('ND')
+        # 'ND' for days without data
+        for i in range(lengthRainList - len(rainList)):
+            rainList.append('ND')
 
         return rainList
 
 
 
+    def loadClimatology(self):
+        '''climate normals from the SD card, built from the USB files the first time
+        '''
+        try:
+            stationClimatology = climatology.climatology(config.SDFilePath + '/' + 'climatology.json')
+            if stationClimatology.lastDay is None:
+                if self.debugON == True: print('building climatology')
+                stationClimatology.addHistory(
+                    dataArchive.readRows(self.usbPath, self.historyFileName),
+                    dataArchive.readRows(self.usbPath, self.dataFileName))
+        except OSError:
+            if self.debugON == True: print('no climatology')
+            return None
+        return stationClimatology
+
+    def addClimatologyDay(self, day):
+        '''adds a finished day to the climate normals (midnight)
+        '''
+        summary = data.daySummary(day)
+        if self.climatology is None or summary is None:
+            return
+        dataRows = dataArchive.tailRows(self.usbPath, self.dataFileName, 25)
+        try:
+            self.climatology.addDay(day, {
+                'rain': summary['rainTotalDay'],
+                'tempMax': summary['tempMax'],
+                'tempMin': summary['tempMin'],
+                'ET': climatology.waterLossByDay(dataRows).get(day)
+                })
+        except OSError:
+            if self.debugON == True: print('climatology write failed')
+
+    def weekRainAnomaly(self):
+        '''last 7 full days of rain against normal, '7d -45%', '' if not known
+        '''
+        if self.climatology is None:
+            return ''
+        try:
+            weekRain = sum(float(rain) for rain in self.getRainList(7))
+        except ValueError:
+            return ''  # days without data
+        yesterday = (clock.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        anomaly = self.climatology.anomaly('rainWeek', yesterday, weekRain)
+        if anomaly is None or anomaly['percent'] is None:
+            return ''
+        return '7d' + '{:+4.0f}'.format(max(min(anomaly['percent'], 999), -999)) + '%'
+
+
     #### SENSOR CALLS AND WEATHER FUNCTIONS ####
 
     def readWind(self, timeUnit):
         '''calculate wind speed, update history, display on LCD
         '''
+        start = loopTiming.now()
         # convert revelutions to distance (meters)
         windDist =  self.windCounter * 3.1415 * (2 * config.anemometerRadius) * .00001
 
@@ -801,62 +1028,82 @@ class weatherStation():
         self.windCounter = 0
 
         data.periodWeatherVariables['windCurrent'] = windCurrent
+        self.timing.record('readWind', start)
 
     def readTempRH(self):
         '''reads tempurature, humidity, sets variables, determines min/max
         '''
+        start = loopTiming.now()
+        sensorFail = False
         try:
             RHCurrent, tempCurrent, tempF = self.tempSensor.returnTempRH()
         except OSError:
             if self.debugON == True: print('tempSensor OSError')
             tempCurrent = 0
-            if data.sensorError['TempError'] != 'no Temp/':
-                self.comment = self.comment + 'temp or RH sensor fail/'
-            data.sensorError['TempError'] = 'no Temp/'
-            RHCurrent = 0
-            data.sensorError['RHError'] = 'no RH/'
-
-        # React to no sensor read (NoneType)
-        if RHCurrent is None:
             RHCurrent = 0
-            data.updateRHError('no RH/')
-        else:
-            if RHCurrent > data.dayWeatherVariables['RHMax']:
-                data.dayWeatherVariables['RHMax'] = RHCurrent
-            if RHCurrent < data.dayWeatherVariables['RHMin']:
-                data.dayWeatherVariables['RHMin'] = RHCurrent
-
-        if tempCurrent is None:
-            tempCurrent = 0
-            data.sensorError['TempError'] = 'no Temp/'
-        else:
-            if tempCurrent > data.dayWeatherVariables['tempMax']:
-                data.dayWeatherVariables['tempMax'] = tempCurrent
-            if tempCurrent < data.dayWeatherVariables['tempMin']:
-                data.dayWeatherVariables['tempMin'] = tempCurrent
-
-        data.periodWeatherVariables['tempCurrent'] = tempCurrent
-        data.periodWeatherVariables['RHCurrent'] = RHCurrent
+            sensorFail = True
+
+        # the read is outside the lock, the screens add to the comment and
+        # read the day variables under it
+        with self.dataLock:
+            if sensorFail == True:
+                if data.sensorError['TempError'] != 'no Temp/':
+                    self.comment = self.comment + 'temp or RH sensor fail/'
+                data.sensorError['TempError'] = 'no Temp/'
+                data.sensorError['RHError'] = 'no RH/'
+
+            # React to no sensor read (NoneType)
+            if RHCurrent is None:
+                RHCurrent = 0
+                data.updateRHError('no RH/')
+            else:
+                if RHCurrent > data.dayWeatherVariables['RHMax']:
+                    data.dayWeatherVariables['RHMax'] = RHCurrent
+                if RHCurrent < data.dayWeatherVariables['RHMin']:
+                    data.dayWeatherVariables['RHMin'] = RHCurrent
+
+            if tempCurrent is None:
+                tempCurrent = 0
+                data.sensorError['TempError'] = 'no Temp/'
+            else:
+                if tempCurrent > data.dayWeatherVariables['tempMax']:
+                    data.dayWeatherVariables['tempMax'] = tempCurrent
+                if tempCurrent < data.dayWeatherVariables['tempMin']:
+                    data.dayWeatherVariables['tempMin'] = tempCurrent
+
+            data.periodWeatherVariables['tempCurrent'] = tempCurrent
+            data.periodWeatherVariables['RHCurrent'] = RHCurrent
+        self.timing.record('readTempRH', start)
         
     def readSolar(self):
         '''reads solar sensor
         '''
+        start = loopTiming.now()
         if self.lightSensor != 0:
-            full, ir = self.lightSensor.get_full_luminosity()  # read raw values (full spectrum and ir spectrum)
-            solarLux = self.lightSensor.calculate_lux(full, ir)  # convert raw values to lux
-            data.sensorError['LuxError'] = ''
+            try:
+                full, ir = self.lightSensor.get_full_luminosity()  # read raw values (full spectrum and ir spectrum)
+                solarLux = self.lightSensor.calculate_lux(full, ir)  # convert raw values to lux
+                luxError = ''
+            except OSError:
+                # a failed read must not lose the rest of the 5 second sample
+                if self.debugON == True: print('lightSensor OSError')
+                solarLux = 0
+                luxError = 'no Solar/'
         else:
             solarLux = 0
-            data.sensorError['LuxError'] = 'no Solar/'
+            luxError = 'no Solar/'
 
-        data.periodWeatherVariables['solarLux'] = solarLux
+        with self.dataLock:
+            data.sensorError['LuxError'] = luxError
+            data.periodWeatherVariables['solarLux'] = solarLux
+        self.timing.record('readSolar', start)
 
     #### SCREEN FUNCTIONS ####
     def restartLCD(self):
         '''re-initializes LCD, can be used at various times in case
         there was an ESD event at the LCD
         '''
-        self.mylcd = I2C_LCD_driver3.lcd()
+        self.mylcd = displays.openDisplay()
         
         # turn backlight on (1 indicates ON)
         if self.backlightTimer < self.backlightOffTime:
@@ -864,44 +1111,15 @@ class weatherStation():
         else:
             self.mylcd.backlight(0)
 
-        customWeatherCharacters = [
-            # Char 0 - flower
-            [0x4, 0xa, 0x4, 0x0, 0x0, 0x1f, 0xe, 0xe],
-            # Char 1 - water drop 
-            [0x0, 0x4, 0x4, 0xa, 0x11, 0x11, 0x11, 0xe],
-            # Char 2 - maiz 1
-            [0x0,0x0,0x0,0x0,0x0,0x0, 0x4, 0x1f],
-            # Char 3 - maiz 2
-            [0x0,0x0, 0x0,0x4, 0xc, 0x6, 0x4, 0x1f],
-            # Char 4 - maiz 3
-            [0x0, 0x4, 0xc, 0x5, 0x16, 0xc, 0x4, 0x1f],
-            # Char 5 - maiz 4
-            [0x4, 0xc, 0x5, 0x16, 0xd, 0x6, 0x4, 0x1f],
-            # Char 6 - up arrow
-            [0x0, 0x4, 0xe, 0x1f, 0x0, 0x1f, 0x0, 0x0],
-            # Char 7 - down arrow
-            [0x0, 0x0, 0x1f, 0x0, 0x1f, 0xe, 0x4,  0x0]
-            ]
-
-        self.custom = {
-            'flower': 0,
-            'water drop': 1,
-            'maiz1': 2,
-            'maiz2': 3,
-            'maiz3': 4,
-            'maiz4': 5,
-            'up arrow': 6,
-            'down arrow': 7}
-
-        # load custom characters
-        self.mylcd.lcd_load_custom_chars(customWeatherCharacters)
+        # custom characters are loaded into CGRAM as screens draw them
+        self.glyphs = glyphCache.glyphCache(self.mylcd)
 
     def startScreen(self, programFilePathName):
         '''screen during startup then goes away
         '''
-        self.mylcd.lcd_clear()
+        self.glyphs.clear()
         self.mylcd.lcd_display_string('Pontis', 1, 0)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Weather Station'), 2, 0)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Weather Station'), 2, 0)
 
         # get software rev from weather.py file
         swNow, swNew = self.getSWrev(config.updateFilePath)
@@ -916,9 +1134,8 @@ class weatherStation():
             self.mylcd.lcd_display_string('          ', line, space)
             for spaceGap in range(0, repeats):
                 thisSpace = space + (spaceGap * 2)
-                self.mylcd.lcd_display_string('', line, thisSpace)
-                self.mylcd.lcd_write_char(self.custom[plant])
-            time.sleep(totalTime/4)
+                self.glyphs.write(plant, line, thisSpace)
+            clock.sleep(totalTime/4)
 
     def runFunGrowAnimation(self, line, space, repeats, totalTime):
         '''animation of plants growing randomly
@@ -928,8 +1145,7 @@ class weatherStation():
         for plantNumber in range (0, repeats):
             plant[plantNumber] = 1;
             thisSpace = space + (plantNumber * 2)
-            self.mylcd.lcd_display_string('', line, thisSpace)
-            self.mylcd.lcd_write_char(self.custom['maiz1'])
+            self.glyphs.write('maiz1', line, thisSpace)
 
         grow = True
 
@@ -939,14 +1155,13 @@ class weatherStation():
             if(plant[whichPlant] < 4):
                 plant[whichPlant] +=1
                 thisSpace = space + (whichPlant * 2)
-                self.mylcd.lcd_display_string('', line, thisSpace)
                 if(plant[whichPlant] == 2):
-                    self.mylcd.lcd_write_char(self.custom['maiz2'])
+                    self.glyphs.write('maiz2', line, thisSpace)
                 elif(plant[whichPlant] == 23):
-                    self.mylcd.lcd_write_char(self.custom['maiz3'])
+                    self.glyphs.write('maiz3', line, thisSpace)
                 else:
-                    self.mylcd.lcd_write_char(self.custom['maiz4'])
-                time.sleep(totalTime/12)
+                    self.glyphs.write('maiz4', line, thisSpace)
+                clock.sleep(totalTime/12)
             else:
                 workingTest = 0
                 for plantNumber in range (0, repeats):
@@ -962,25 +1177,25 @@ class weatherStation():
         '''writes the main screen on LCD minus the variables
         '''
         # Line 1 date
-        self.mylcd.lcd_display_string('{:%b %d}'.format(datetime.now()), 1, 0)
+        self.mylcd.lcd_display_string('{:%b %d}'.format(clock.now()), 1, 0)
 
         # Line 4 navigation
         self.mylcd.lcd_display_string('', 4, 0)
         self.mylcd.lcd_write_char(127)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord("page"), 4, 2)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes("page"), 4, 2)
         self.mylcd.lcd_display_string('MX ', 4, 16)
         self.mylcd.lcd_write_char(126)
 
     def clockRefresh(self):
         '''LCD prints clock display
         '''
-        self.mylcd.lcd_display_string('{:%_I:%M %p}'.format(datetime.now()), 1, 10)
+        self.mylcd.lcd_display_string('{:%_I:%M %p}'.format(clock.now()), 1, 10)
 
     def mainScreenRefresh(self):
         ''' writes the temp and RH lines with data
         '''
         # Time display
-        self.mylcd.lcd_display_string('{:%_I:%M %p}'.format(datetime.now()), 1, 10)
+        self.mylcd.lcd_display_string('{:%_I:%M %p}'.format(clock.now()), 1, 10)
 
         # Temp display
         if data.sensorError['TempError'] == 'no Temp/':
@@ -1017,24 +1232,19 @@ class weatherStation():
 
         # Irrigation water drops
         if data.waterLossCumulative >= 2:
-            self.mylcd.lcd_display_string('', 4, 9)
-            self.mylcd.lcd_write_char(self.custom['water drop'])
+            self.glyphs.write('water drop', 4, 9)
 
         if data.waterLossCumulative >= 4:
-            self.mylcd.lcd_display_string('', 4, 10)
-            self.mylcd.lcd_write_char(self.custom['water drop'])
+            self.glyphs.write('water drop', 4, 10)
 
         if data.waterLossCumulative >= 6:
-            self.mylcd.lcd_display_string('', 4, 11)
-            self.mylcd.lcd_write_char(self.custom['water drop'])
+            self.glyphs.write('water drop', 4, 11)
 
         if data.waterLossCumulative >= 8:
-            self.mylcd.lcd_display_string('', 4, 12)
-            self.mylcd.lcd_write_char(self.custom['water drop'])
+            self.glyphs.write('water drop', 4, 12)
 
         if data.waterLossCumulative >= 12:
-            self.mylcd.lcd_display_string('', 4, 13)
-            self.mylcd.lcd_write_char(self.custom['water drop'])
+            self.glyphs.write('water drop', 4, 13)
 
 
     def rainScreen(self):
@@ -1042,13 +1252,15 @@ class weatherStation():
         '''
         sixDayRainList = self.getRainList(6)
 
-        self.buttonState = 0
-        self.mylcd.lcd_clear()
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Rain (mm)'), 1, 0)
+        self.buttons.clear()
+        self.glyphs.clear()
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Rain (mm)'), 1, 0)
+        # this week against the climate normal
+        self.mylcd.lcd_display_string(self.weekRainAnomaly(), 1, 13)
 
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Today'), 2, 0)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Today'), 2, 0)
         self.mylcd.lcd_display_string('{:4.0f}'.format(data.dayWeatherVariables['rainTotalDay']), 2, 4)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Ystrdy'), 2, 10)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Ystrdy'), 2, 10)
         self.mylcd.lcd_display_string(sixDayRainList[0], 2, 17)
 
         self.mylcd.lcd_display_string(sixDayRainList[1], 3, 0)
@@ -1059,7 +1271,7 @@ class weatherStation():
 
         self.mylcd.lcd_display_string('', 4, 0)
         self.mylcd.lcd_write_char(127)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord("page"), 4, 2)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes("page"), 4, 2)
 
         # XXXX DEV XXXX
         self.mylcd.lcd_display_string('{:2.3f}'.format(data.waterLossCumulative), 4, 12)
@@ -1073,38 +1285,106 @@ class weatherStation():
             #### CONTINUOUS POLLING ####
             # too fast of polling causes LCD problems, so this sets the timing
             
-            thisSecond = float(datetime.now().strftime('%S.%f'))
+            thisSecond = float(clock.now().strftime('%S.%f'))
 
-            if lastFloatSecond + self.pollingDelay >= 60:
-                lastFloatSecond = 0
+            # the minute turned over since the last poll
+            if thisSecond < lastFloatSecond:
+                lastFloatSecond -= 60
 
             if thisSecond > lastFloatSecond + self.pollingDelay:
                 # index the timer
                 lastFloatSecond = thisSecond
 
-                # check and react to buttonState
-                if self.buttonState != 0 and self.buttonAction == 0:
-                    if self.buttonState == 1:
-                        self.buttonAction = 1
+                # check and react to button presses
+                buttonPressed = self.nextButton()
+                if buttonPressed != 0:
+                    if buttonPressed == 1:
                         screenTimer = 0
                         if self.debugON == True: print('exit rain screen')
                         i = False
                         # set for polling
-                        lastFloatSecond = float(datetime.now().strftime('%S.%f'))
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
 
-                    elif self.buttonState == 2:
-                        self.buttonAction = 1
+                    elif buttonPressed == 2:
                         screenTimer = 0
                         pass
-                    elif self.buttonState == 3:
-                        self.buttonAction = 1
+                    elif buttonPressed == 3:
                         screenTimer = 0
                         pass
                     else:
                         pass
 
-            # Require buttons to be released before next press
-            self.buttonCheckRelease()
+            #### EVERY SECOND FUNCTIONS AND SCREEN TIMEOUT ####
+            # use int of the float thisSecond
+            if int(thisSecond) != lastSecond:
+                # screen time out
+                if screenTimer > self.backlightOffTime:
+                    i = False
+
+                lastSecond = int(thisSecond)
+                screenTimer += 1
+
+    def sparklineScreen(self):
+        '''24 hour trends of temperature, rain and ET from the hour rollups
+        - buttons 2 and 3 page between trends, only changed cells are written
+        '''
+        if data.rollups is None:
+            return
+
+        self.buttons.clear()
+        self.glyphs.clear()
+        self.trends.cleared()
+
+        trendNumber = 0
+        trendHour = None
+
+        lastSecond = 0
+        lastFloatSecond = 0
+        screenTimer = 0
+
+        i = True
+        while i is True:
+            #### CONTINUOUS POLLING ####
+            # too fast of polling causes LCD problems, so this sets the timing
+            thisSecond = float(clock.now().strftime('%S.%f'))
+
+            # the minute turned over since the last poll
+            if thisSecond < lastFloatSecond:
+                lastFloatSecond -= 60
+
+            if thisSecond > lastFloatSecond + self.pollingDelay:
+                # index the timer
+                lastFloatSecond = thisSecond
+
+                # check and react to button presses
+                buttonPressed = self.nextButton()
+                if buttonPressed != 0:
+                    if buttonPressed == 1:
+                        screenTimer = 0
+                        if self.debugON == True: print('exit trend screen')
+                        i = False
+                        # set for polling
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
+                        continue
+
+                    elif buttonPressed == 2:
+                        screenTimer = 0
+                        trendNumber = (trendNumber - 1) % len(trendScreen.trends)
+                        trendHour = None
+                    elif buttonPressed == 3:
+                        screenTimer = 0
+                        trendNumber = (trendNumber + 1) % len(trendScreen.trends)
+                        trendHour = None
+                    else:
+                        pass
+
+                # a new trend, or an hour closed while it is shown
+                now = clock.now()
+                if trendHour != now.hour:
+                    trendHour = now.hour
+                    with self.dataLock:
+                        frame = self.trends.frame(data.rollups, trendScreen.trends[trendNumber][0], now)
+                    self.trends.show(self.glyphs, frame)
 
             #### EVERY SECOND FUNCTIONS AND SCREEN TIMEOUT ####
             # use int of the float thisSecond
@@ -1119,8 +1399,8 @@ class weatherStation():
     def irrigation(self):
         '''Irrigation screen, runs through them sequentially
         '''
-        self.buttonState = 0
-        self.mylcd.lcd_clear()
+        self.buttons.clear()
+        self.glyphs.clear()
 
         irrigationScreenNumber = 0
         irrigationScreenList = (
@@ -1130,23 +1410,27 @@ class weatherStation():
             'Corn (l)'
             )
 
+        # fields sharing the water supply add a plan page
+        irrigationFields = irrigationPlan.stationFields(self.usbPath)
+        if irrigationFields != []:
+            irrigationScreenList = irrigationScreenList + ('Irrigation plan',)
+
         # line 1 is displayed below as it changes with crops
 
-        self.mylcd.lcd_display_string('', 2, 0)
-        self.mylcd.lcd_write_char(self.custom['maiz1'])
+        self.glyphs.write('maiz1', 2, 0)
 
-        self.mylcd.lcd_display_string('', 2, 8)
-        self.mylcd.lcd_write_char(self.custom['maiz2'])
+        self.glyphs.write('maiz2', 2, 8)
 
-        self.mylcd.lcd_display_string('', 3, 0)
-        self.mylcd.lcd_write_char(self.custom['maiz3'])
+        self.glyphs.write('maiz3', 3, 0)
 
-        self.mylcd.lcd_display_string('', 3, 8)
-        self.mylcd.lcd_write_char(self.custom['maiz4'])
+        self.glyphs.write('maiz4', 3, 8)
 
         self.mylcd.lcd_display_string('', 4, 0)
         self.mylcd.lcd_write_char(127)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord("page"), 4, 2)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes("page"), 4, 2)
+
+        # forecast hours until irrigation
+        self.mylcd.lcd_display_string(self.forecastText(), 4, 10)
 
         # initialize with first screen
         self.irrigationCropRefresh(irrigationScreenList[irrigationScreenNumber])   
@@ -1159,19 +1443,20 @@ class weatherStation():
         while i is True:
             #### CONTINUOUS POLLING ####
             # too fast of polling causes LCD problems, so this sets the timing           
-            thisSecond = float(datetime.now().strftime('%S.%f'))
+            thisSecond = float(clock.now().strftime('%S.%f'))
 
-            if lastFloatSecond + self.pollingDelay >= 60:
-                lastFloatSecond = 0
+            # the minute turned over since the last poll
+            if thisSecond < lastFloatSecond:
+                lastFloatSecond -= 60
 
             if thisSecond > lastFloatSecond + self.pollingDelay:
                 # index the timer
                 lastFloatSecond = thisSecond
 
-                # check and react to buttonState
-                if self.buttonState != 0 and self.buttonAction == 0:
-                    if self.buttonState == 1:
-                        self.buttonAction = 1
+                # check and react to button presses
+                buttonPressed = self.nextButton()
+                if buttonPressed != 0:
+                    if buttonPressed == 1:
                         screenTimer = 0
 
                         irrigationScreenNumber +=1
@@ -1179,24 +1464,21 @@ class weatherStation():
                             if self.debugON == True: print('exit irrigation screen')
                             i = False
                             # set for polling
-                            lastFloatSecond = float(datetime.now().strftime('%S.%f'))
+                            lastFloatSecond = float(clock.now().strftime('%S.%f'))
+                        elif irrigationScreenList[irrigationScreenNumber] == 'Irrigation plan':
+                            self.irrigationPlanRefresh(irrigationFields)
                         else:
                             self.irrigationCropRefresh(irrigationScreenList[irrigationScreenNumber])   
 
-                    elif self.buttonState == 2:
-                        self.buttonAction = 1
+                    elif buttonPressed == 2:
                         screenTimer = 0
                         pass
-                    elif self.buttonState == 3:
-                        self.buttonAction = 1
+                    elif buttonPressed == 3:
                         screenTimer = 0
                         pass
                     else:
                         pass
 
-            # Require buttons to be released before next press
-            self.buttonCheckRelease()
-
             #### EVERY SECOND FUNCTIONS AND SCREEN TIMEOUT ####
             # use int of the float thisSecond
             if int(thisSecond) != lastSecond:
@@ -1210,25 +1492,25 @@ class weatherStation():
     def Iirrigated(self):
         '''last irrigation screen, can indicate irrigation was completed
         '''
-        self.buttonState = 0
-        self.mylcd.lcd_clear()
+        self.buttons.clear()
+        self.glyphs.clear()
 
 
         # line 1 is displayed below as it changes with crops
 
         self.mylcd.lcd_display_string('Irrigation Action', 1, 2)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Irrigation Action'), 1, 0)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Irrigation Action'), 1, 0)
 
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('partial'), 2, 10)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('partial'), 2, 10)
         self.mylcd.lcd_display_string('', 2, 19)
         self.mylcd.lcd_write_char(126)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('full'), 3, 10)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('full'), 3, 10)
         self.mylcd.lcd_display_string('', 3, 19)
         self.mylcd.lcd_write_char(126)
 
         self.mylcd.lcd_display_string('', 4, 0)
         self.mylcd.lcd_write_char(127)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord("page"), 4, 2)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes("page"), 4, 2)
 
         lastSecond = 0
         lastFloatSecond = 0
@@ -1238,57 +1520,55 @@ class weatherStation():
         while i is True:
             #### CONTINUOUS POLLING ####
             # too fast of polling causes LCD problems, so this sets the timing           
-            thisSecond = float(datetime.now().strftime('%S.%f'))
+            thisSecond = float(clock.now().strftime('%S.%f'))
 
-            if lastFloatSecond + self.pollingDelay >= 60:
-                lastFloatSecond = 0
+            # the minute turned over since the last poll
+            if thisSecond < lastFloatSecond:
+                lastFloatSecond -= 60
 
             if thisSecond > lastFloatSecond + self.pollingDelay:
                 # index the timer
                 lastFloatSecond = thisSecond
 
-                # check and react to buttonState
-                if self.buttonState != 0 and self.buttonAction == 0:
-                    if self.buttonState == 1:
-                        self.buttonAction = 1
+                # check and react to button presses
+                buttonPressed = self.nextButton()
+                if buttonPressed != 0:
+                    if buttonPressed == 1:
                         screenTimer = 0
                         if self.debugON == True: print('exit irrigation screen')
                         i = False
                         # set for polling
-                        lastFloatSecond = float(datetime.now().strftime('%S.%f'))
-                    elif self.buttonState == 2:  # full irrigation
-                        self.buttonAction = 1
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
+                    elif buttonPressed == 2:  # full irrigation
                         screenTimer = 0
                         # full irrigation puts waterLoss at 0
-                        data.waterLossCumulative = 0
+                        with self.dataLock:
+                            data.waterLossCumulative = waterBalance.applyIrrigation(data.waterLossCumulative, True)
+                            self.comment = self.comment + 'Full Irrigation/'
                         if self.debugON == True: print('full irrigation')
-                        self.mylcd.lcd_clear()
-                        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Full Irrigation'), 1, 0)
-                        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Complete'), 2, 5)
-                        self.comment = self.comment + 'Full Irrigation/'
-                        time.sleep(5)
+                        self.glyphs.clear()
+                        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Full Irrigation'), 1, 0)
+                        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Complete'), 2, 5)
+                        clock.sleep(5)
                         i = False
                         # set for polling
-                        lastFloatSecond = float(datetime.now().strftime('%S.%f'))
-                    elif self.buttonState == 3:  # partial irrigation
-                        self.buttonAction = 1
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
+                    elif buttonPressed == 3:  # partial irrigation
                         screenTimer = 0
-                        data.waterLossCumulative  = data.waterLossCumulative  - config.partialIrrigation
+                        with self.dataLock:
+                            data.waterLossCumulative = waterBalance.applyIrrigation(data.waterLossCumulative, False)
+                            self.comment = self.comment + 'Partial Irrigation/'
                         if self.debugON == True: print('partial irrigation')
-                        self.mylcd.lcd_clear()
-                        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Partial Irrigation'), 1, 0)
-                        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Complete'), 2, 5)
-                        self.comment = self.comment + 'Partial Irrigation/'
-                        time.sleep(5)
+                        self.glyphs.clear()
+                        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Partial Irrigation'), 1, 0)
+                        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Complete'), 2, 5)
+                        clock.sleep(5)
                         i = False
                         # set for polling
-                        lastFloatSecond = float(datetime.now().strftime('%S.%f'))
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
                     else:
                         pass
 
-            # Require buttons to be released before next press
-            self.buttonCheckRelease()
-
             #### EVERY SECOND FUNCTIONS AND SCREEN TIMEOUT ####
             # use int of the float thisSecond
             if int(thisSecond) != lastSecond:
@@ -1327,7 +1607,7 @@ class weatherStation():
         self.mylcd.lcd_display_string('      ', 2, 10)
         self.mylcd.lcd_display_string('      ', 3, 2)
         self.mylcd.lcd_display_string('      ', 3, 10)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord(crop), 1)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes(crop), 1)
         
         kList = cropFactorLookup[crop][0]
 
@@ -1343,6 +1623,28 @@ class weatherStation():
             self.mylcd.lcd_display_string('0', 3, 10)
 
 
+    def irrigationPlanRefresh(self, irrigationFields):
+        ''' shows the fields to water first with the daily water budget
+        - liters for the top 2 fields from irrigationPlan
+        '''
+        plan = irrigationPlan.planIrrigation(irrigationFields, data.waterLossCumulative)
+
+        for line in (1, 2, 3):
+            self.mylcd.lcd_display_string('                    ', line, 0)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Irrigation plan'), 1, 0)
+        # 5 columns are left after the title, kilolitres from 10000 l
+        budget = config.dailyWaterBudget
+        if budget < 9999.5:
+            budgetText = '{:4.0f}l'.format(budget)
+        else:
+            budgetText = '{:3.0f}kl'.format(budget / 1000)
+        self.mylcd.lcd_display_string(budgetText, 1, 15)
+
+        for line, recommendation in zip((2, 3), plan):
+            if recommendation[1] < 1:
+                break
+            self.mylcd.lcd_display_string('{:12s}{:7.0f}l'.format(recommendation[0][:12], recommendation[1]), line, 0)
+        if self.debugON == True: print('irrigation plan: ', plan[:5])
 
 
     #### MX SCREENS ####
@@ -1351,9 +1653,8 @@ class weatherStation():
         '''first maintenance screen where others can be selected,
         generally the mxFunction is set at 0 but others can be sent
         '''
-        self.buttonState = 0
+        self.buttons.clear()
         self.MXscreenRefresh()
-        tempRainCounter = self.rainCounter  # used to reset if rain gage is tested
 
         lastSecond = 0
         lastFloatSecond = 0
@@ -1370,57 +1671,50 @@ class weatherStation():
                         'rain gage',
                         's/w update',
                         'reboot',
-                        'shutdown']
+                        'shutdown',
+                        'timing',
+                        'profile']
+        # names in the LCD language, encoded when the catalog loaded
+        mxDisplayList = [messageCatalog.getBytes(name) for name in mxFunctionList]
         lastmxFunction = 999
+        # phase shown on the timing page, button 1 shows the next
+        timingPhases = list(self.timing.phases)
+        timingPhase = 0
 
         i = 1
         while i < 10:
             #### CONTINUOUS POLLING ####
             # too fast of polling causes LCD problems, so this sets the timing
             
-            thisSecond = float(datetime.now().strftime('%S.%f'))
+            thisSecond = float(clock.now().strftime('%S.%f'))
 
-            if lastFloatSecond + self.pollingDelay >= 60:
-                lastFloatSecond = 0
+            # the minute turned over since the last poll
+            if thisSecond < lastFloatSecond:
+                lastFloatSecond -= 60
 
             if thisSecond > lastFloatSecond + self.pollingDelay:
                 # index the timer
                 lastFloatSecond = thisSecond
 
                 #### DISPLAYS DATA ON MAINTENANCE SCREEN ####
-                if config.language == 'Spanish':
-                    mxDisplayList = [
-                        'SALIR MX',
-                        'expulsar USB',
-                        'mira datos',
-                        'mira historia',
-                        'configuar reloj',
-                        'anemometro',
-                        'pluviometro',
-                        'actualizar update',
-                        'reiniciar',
-                        'apagar']
-                else:
-                    mxDisplayList = mxFunctionList
-
                 if mxFunction != lastmxFunction:
                     self.MXscreenRefresh()
                     # update line
                     self.mylcd.lcd_display_string('                   ', 2, 0)
                     self.mylcd.lcd_display_string('                   ', 3, 0)
-                    self.mylcd.lcd_display_string(mxDisplayList[mxFunction], 2, 1)
+                    self.mylcd.lcd_display_bytes(mxDisplayList[mxFunction], 2, 1)
+                    # only a test page counts its sensor for itself
+                    self.sensorTest = None
 
                     # some MX function require an init:
-                    if mxFunctionList[mxFunction] == 'anemometer':
-                        self.windCounter = 0
-                        self.mylcd.lcd_display_string(EnglishSpanish.getWord('sensor count: '), 3, 0)
-
-                    elif mxFunctionList[mxFunction] == 'rain gage':
-                        self.rainCounter = 0
-                        self.mylcd.lcd_display_string(EnglishSpanish.getWord('sensor count: '), 3, 0)
+                    if mxFunctionList[mxFunction] in ('anemometer', 'rain gage'):
+                        # pulses go to the test count, not to the wind and rain data
+                        self.sensorTestCounter = 0
+                        self.sensorTest = mxFunctionList[mxFunction]
+                        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('sensor count: '), 3, 0)
 
                     elif mxFunctionList[mxFunction] == 'set clock':
-                        self.mylcd.lcd_display_string('{:%Y-%m-%d %_H:%M}'.format(datetime.now()), 3, 0)
+                        self.mylcd.lcd_display_string('{:%Y-%m-%d %_H:%M}'.format(clock.now()), 3, 0)
 
                     elif mxFunctionList[mxFunction] == 'check Data File':
                         dataFileMessage = self.getFileSummary(self.dataFileName)
@@ -1435,34 +1729,33 @@ class weatherStation():
                         message = swNow + ' to ' + swNew
                         self.mylcd.lcd_display_string(message, 3, 0)
 
+                    elif mxFunctionList[mxFunction] == 'timing':
+                        self.timingPage(timingPhases[timingPhase])
+
+                    elif mxFunctionList[mxFunction] == 'profile':
+                        self.profilePage()
+
                     lastmxFunction = mxFunction
 
                 # Display values for sensor troubleshooting
-                if mxFunctionList[mxFunction] == 'anemometer':
-                    self.mylcd.lcd_display_string('{:.0f}'.format(self.windCounter), 3, 14)
-                elif mxFunctionList[mxFunction] == 'rain gage':
-                    self.mylcd.lcd_display_string('{:.0f}'.format(self.rainCounter), 3, 14)
-
-                # check and react to buttonState
-                if self.buttonState != 0 and self.buttonAction == 0:
-                    if self.buttonState == 1:
-                        self.buttonAction = 1
+                if self.sensorTest is not None:
+                    self.mylcd.lcd_display_string('{:.0f}'.format(self.sensorTestCounter), 3, 14)
+
+                # check and react to button presses
+                buttonPressed = self.nextButton()
+                if buttonPressed != 0:
+                    if buttonPressed == 1:
                         screenTimer = 0
 
                         if mxFunctionList[mxFunction] == 'QUITE MX':
-                            # clear counters used in sensor troubleshooting to avoid
-                            # inaccurate data
-                            self.windCounter = 0
-                            self.rainCounter = tempRainCounter
-
                             i = 999
 
                         elif mxFunctionList[mxFunction] == 'USB eject':
                             RPiUtilities.ejectUSB(self.usbPath)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('Reboot Required!'), 1, 0)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('replace USB'), 2, 2)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('and Reboot'), 3, 0)
-                            time.sleep(5)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Reboot Required!'), 1, 0)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('replace USB'), 2, 2)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('and Reboot'), 3, 0)
+                            clock.sleep(5)
                             mxFunction = 8
 
                         elif mxFunctionList[mxFunction] == 'set clock':
@@ -1473,37 +1766,47 @@ class weatherStation():
                             lastmxFunction = 999
 
                         elif mxFunctionList[mxFunction] == 's/w update':
-                            self.mylcd.lcd_clear()
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('Loading new s/w'), 1, 0)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('please wait'), 2, 2)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('will reboot'), 3, 0)
+                            self.glyphs.clear()
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Loading new s/w'), 1, 0)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('please wait'), 2, 2)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('will reboot'), 3, 0)
                             RPiUtilities.copySW(self.usbPath)
                             RPiUtilities.rebootRPI()
 
                         elif mxFunctionList[mxFunction] == 'reboot':
-                            self.mylcd.lcd_clear()
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('Reboot System'), 1, 0)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('please wait'), 2, 2)
+                            self.glyphs.clear()
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Reboot System'), 1, 0)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('please wait'), 2, 2)
                             GPIO.cleanup()
                             RPiUtilities.rebootRPI()
 
                         elif mxFunctionList[mxFunction] == 'shutdown':
-                            self.mylcd.lcd_clear()
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('Shutdown System'), 1, 0)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('must restart'), 2, 2)
+                            self.glyphs.clear()
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Shutdown System'), 1, 0)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('must restart'), 2, 2)
                             GPIO.cleanup()
                             RPiUtilities.shutdownRPI()
 
-                    elif self.buttonState == 2:
-                        self.buttonAction = 1
+                        elif mxFunctionList[mxFunction] == 'timing':
+                            timingPhase = (timingPhase + 1) % len(timingPhases)
+                            self.timingPage(timingPhases[timingPhase])
+
+                        elif mxFunctionList[mxFunction] == 'profile':
+                            # starts, or ends early and writes
+                            if self.profiler.running():
+                                self.profiler.stop()
+                            else:
+                                self.startProfile()
+                            self.profilePage()
+
+                    elif buttonPressed == 2:
                         screenTimer = 0
 
                         mxFunction = mxFunction - 1
                         if mxFunction < 0:
                             mxFunction = len(mxFunctionList) - 1
 
-                    elif self.buttonState == 3:
-                        self.buttonAction = 1
+                    elif buttonPressed == 3:
                         screenTimer = 0
 
                         mxFunction = mxFunction + 1
@@ -1512,9 +1815,6 @@ class weatherStation():
                     else:
                         pass
 
-                # Require buttons to be released before next press
-                self.buttonCheckRelease()
-
 
                 #### EVERY SECOND FUNCTIONS AND SCREEN TIMEOUT ####
                 # use int of the float thisSecond
@@ -1523,27 +1823,60 @@ class weatherStation():
                     if screenTimer > self.backlightOffTime:
                         i = 999
 
+                    # the timing page follows the histograms, the profile page counts down
+                    if mxFunctionList[mxFunction] == 'timing':
+                        self.timingPage(timingPhases[timingPhase])
+                    elif mxFunctionList[mxFunction] == 'profile':
+                        self.profilePage()
+
                     lastSecond = int(thisSecond)
                     screenTimer += 1
 
+        # pulses count as wind and rain again
+        self.sensorTest = None
+
+    def timingPage(self, phase):
+        '''MX timing page: phase name on line 2, p50/p99/max (ms) and late count on line 3
+        '''
+        name, values = self.timing.lcdLines(phase)
+        self.mylcd.lcd_display_string('{:10}'.format(name[:10]), 2, 9)
+        self.mylcd.lcd_display_string('{:19}'.format(values), 3, 0)
+
+    def startProfile(self):
+        '''samples all threads for config.profileMinutes, stacks to the USB drive
+        - the MX profile page and the USR1 signal thread
+        '''
+        filePathName = self.usbPath + '/' + 'profile_{:%Y-%m-%d_%H%M}.folded'.format(clock.now())
+        if self.profiler.start(config.profileMinutes * 60, filePathName) is True:
+            if self.debugON == True: print('profiling to ', filePathName)
+
+    def profilePage(self):
+        '''MX profile page: time left, samples of the last profile or its length
+        '''
+        if self.profiler.running():
+            remaining = int(self.profiler.remaining())
+            message = 'on ' + str(remaining // 60) + ':' + '{:02d}'.format(remaining % 60)
+        elif self.profiler.lastFile is not None:
+            message = 'saved ' + str(self.profiler.lastFile[1]) + ' samples'
+        else:
+            message = str(config.profileMinutes) + ' min'
+        self.mylcd.lcd_display_string('{:19}'.format(message[:19]), 3, 0)
 
     def MXscreenRefresh(self):
         '''LCD init and refresh for MX screen
         '''
-        self.mylcd.lcd_clear()
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('MX pages'), 1, 0)
+        self.glyphs.clear()
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('MX pages'), 1, 0)
 
-        self.mylcd.lcd_display_string('', 2, 19)
-        self.mylcd.lcd_write_char(self.custom['up arrow'])
+        self.glyphs.write('up arrow', 2, 19)
         #self.mylcd.lcd_display_string('', 2, 19)
         #self.mylcd.lcd_write_char(94)
-        self.mylcd.lcd_display_string('', 3, 19)
-        self.mylcd.lcd_write_char(self.custom['down arrow'])
+        self.glyphs.write('down arrow', 3, 19)
         #self.mylcd.lcd_display_string('', 3, 19)
         #self.mylcd.lcd_write_char(118)
         self.mylcd.lcd_display_string('', 4, 0)
         self.mylcd.lcd_write_char(127)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('do it'), 4, 2)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('do it'), 4, 2)
 
     def getSWrev(self, programFilePathName):
         '''get current and new s/w rev
@@ -1578,25 +1911,23 @@ class weatherStation():
         '''Maintenance screen for setting real time clock
         '''
         # get timing variables from RTC (DS1307)
-        year = int(datetime.now().strftime('%Y'))
-        month = int(datetime.now().strftime('%m'))
-        date = int(datetime.now().strftime('%d'))
-        hour = int(datetime.now().strftime('%H'))
-        minute = int(datetime.now().strftime('%M'))
+        year = int(clock.now().strftime('%Y'))
+        month = int(clock.now().strftime('%m'))
+        date = int(clock.now().strftime('%d'))
+        hour = int(clock.now().strftime('%H'))
+        minute = int(clock.now().strftime('%M'))
 
-        # set buttonState
-        self.buttonState = 0
+        # drop presses made before this screen
+        self.buttons.clear()
 
         # initialize LCD
-        self.mylcd.lcd_clear()
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('Clock set'), 1, 0)
-        self.mylcd.lcd_display_string('', 2, 19)
-        self.mylcd.lcd_write_char(self.custom['up arrow'])
-        self.mylcd.lcd_display_string('', 3, 19)
-        self.mylcd.lcd_write_char(self.custom['down arrow'])
+        self.glyphs.clear()
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Clock set'), 1, 0)
+        self.glyphs.write('up arrow', 2, 19)
+        self.glyphs.write('down arrow', 3, 19)
         self.mylcd.lcd_display_string('', 4, 0)
         self.mylcd.lcd_write_char(127)
-        self.mylcd.lcd_display_string(EnglishSpanish.getWord('next'), 4, 2)
+        self.mylcd.lcd_display_bytes(messageCatalog.getBytes('next'), 4, 2)
 
         # set timing variables
         lastSecond = 0
@@ -1605,8 +1936,7 @@ class weatherStation():
 
         # set lists for screen control
         screenList = ['YEAR', 'MONTH', 'DATE', 'HOUR', 'MINUTE', 'exit and set clock']
-        if config.language == "Spanish":
-            screenList = ['ANO', 'MES', 'FECHA', 'HORA', 'MINUTO', 'configurar el reloj']
+        screenDisplayList = [messageCatalog.getBytes(name) + b'   ' for name in screenList]
         varList = [year, month, date, hour, minute, 999]
         setScreen = 0
 
@@ -1617,13 +1947,13 @@ class weatherStation():
             # too fast of polling causes LCD problems, so this sets the timing
             # pollingDelay is the timing and is set in init
             
-            thisSecond = float(datetime.now().strftime('%S.%f'))
+            thisSecond = float(clock.now().strftime('%S.%f'))
 
             # update set time on LCD
             if setScreen == 5:
-                self.mylcd.lcd_display_string(EnglishSpanish.getWord('Set Clock and Exit  '), 1, 0)
+                self.mylcd.lcd_display_bytes(messageCatalog.getBytes('Set Clock and Exit  '), 1, 0)
             else:
-                self.mylcd.lcd_display_string(screenList[setScreen] + '   ', 1, 10)
+                self.mylcd.lcd_display_bytes(screenDisplayList[setScreen], 1, 10)
             year = varList[0]
             month = varList[1]
             date = varList[2]
@@ -1635,38 +1965,39 @@ class weatherStation():
             self.mylcd.lcd_display_string(setTime, 3, 0)
 
             if setScreen == 5:
-                self.mylcd.lcd_display_string(EnglishSpanish.getWord('exit'), 2, 14)
-                self.mylcd.lcd_display_string(EnglishSpanish.getWord('exit'), 3, 14)
-                self.mylcd.lcd_display_string(EnglishSpanish.getWord('set clock'), 4, 2)  
+                self.mylcd.lcd_display_bytes(messageCatalog.getBytes('exit'), 2, 14)
+                self.mylcd.lcd_display_bytes(messageCatalog.getBytes('exit'), 3, 14)
+                self.mylcd.lcd_display_bytes(messageCatalog.getBytes('set clock'), 4, 2)  
 
-            if lastFloatSecond + self.pollingDelay >= 60:
-                lastFloatSecond = 0
+            # the minute turned over since the last poll
+            if thisSecond < lastFloatSecond:
+                lastFloatSecond -= 60
 
             if thisSecond > lastFloatSecond + self.pollingDelay:
                 # index the timer
                 lastFloatSecond = thisSecond
 
-                # check and react to buttonState
-                if self.buttonState != 0 and self.buttonAction == 0:
-                    if self.buttonState == 1:
-                        self.buttonAction = 1
+                # check and react to button presses
+                # holding up or down keeps stepping
+                buttonPressed = self.nextButton(True)
+                if buttonPressed != 0:
+                    if buttonPressed == 1:
                         screenTimer = 0
                         setScreen = setScreen + 1
                         if setScreen > 5:
                             # this is to alert due to delay in clock setting
-                            self.mylcd.lcd_clear()
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('WAIT'), 1, 0)
-                            self.mylcd.lcd_display_string(EnglishSpanish.getWord('while clock sets'), 2, 2)
+                            self.glyphs.clear()
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('WAIT'), 1, 0)
+                            self.mylcd.lcd_display_bytes(messageCatalog.getBytes('while clock sets'), 2, 2)
 
                             # this sets the RTC to the variables
                             RPiUtilities.setRTC(year, month, date, hour, minute)
                             i = 999
 
                         # set for polling
-                        lastFloatSecond = float(datetime.now().strftime('%S.%f'))
+                        lastFloatSecond = float(clock.now().strftime('%S.%f'))
 
-                    elif self.buttonState == 2:
-                        self.buttonAction = 1
+                    elif buttonPressed == 2:
                         screenTimer = 0
                         if setScreen == 5:
                             i = 999
@@ -1685,8 +2016,7 @@ class weatherStation():
 
                         screenTimer = 0
                         
-                    elif self.buttonState == 3:
-                        self.buttonAction = 1
+                    elif buttonPressed == 3:
                         screenTimer = 0
                         if setScreen == 5:
                             i = 999
@@ -1707,9 +2037,6 @@ class weatherStation():
                     else:
                         pass
 
-                # Require buttons to be released before next press
-                self.buttonCheckRelease()
-
 
                 #### EVERY SECOND FUNCTIONS AND SCREEN TIMEOUT ####
                 # use int of the float thisSecond
@@ -1724,7 +2051,7 @@ class weatherStation():
     def systemError(self, errorMessage2, errorMessage3):
         '''dead end screen requiring reboot with message for error
         '''
-        self.mylcd.lcd_clear()
+        self.glyphs.clear()
         self.mylcd.lcd_display_string('Act and Reboot', 1, 0)
         self.mylcd.lcd_display_string(errorMessage2, 2, 0)
         self.mylcd.lcd_display_string(errorMessage3, 3, 0)
@@ -1732,29 +2059,24 @@ class weatherStation():
         self.mylcd.lcd_write_char(126)
         i = 1
         while i < 10:
-            # check and react to buttonState
-            if self.buttonState != 0:
-                if self.buttonState == 1:
-                    self.buttonAction = 1
+            # check and react to button presses
+            buttonPressed = self.nextButton()
+            if buttonPressed != 0:
+                if buttonPressed == 1:
                     pass
 
-                elif self.buttonState == 2:
-                    self.buttonAction = 1
-                    self.mylcd.lcd_clear()
+                elif buttonPressed == 2:
+                    self.glyphs.clear()
                     self.mylcd.lcd_display_string('Reboot System', 1, 0)
                     self.mylcd.lcd_display_string('please wait', 2, 2)
                     RPiUtilities.rebootRPI()
 
-                elif self.buttonState == 3:
-                    self.buttonAction = 1
+                elif buttonPressed == 3:
                     pass
 
                 else:
                     pass
 
-                # return buttonState to no pressed state
-                self.buttonState = 0
-
 
 
 
@@ -1762,12 +2084,18 @@ class weatherStation():
     def windCount(self, pin):
         '''interrupt call from anemometer to increment the windCounter
         '''
-        self.windCounter += 1
+        if self.sensorTest == 'anemometer':
+            self.sensorTestCounter += 1
+        else:
+            self.windCounter += 1
 
     def rainCount(self, pin):
         '''interrupt call from tipping bucket rain gage to increment the windCounter
         '''
-        self.rainCounter += 1
+        if self.sensorTest == 'rain gage':
+            self.sensorTestCounter += 1
+        else:
+            self.rainCounter += 1
 
     def backlightON(self):
         '''combined function for turning backlight on and refreshing screen
@@ -1778,45 +2106,25 @@ class weatherStation():
         self.mylcd.backlight(1)
         #self.mainScreen()
         self.mainScreenRefresh()
-        time.sleep(.5)
-        
-        #self.buttonState = 0
-
-    def reactToButton(self, buttonPin):
-        '''function call from button 2 interrupt
-        '''
-        time.sleep(.01) # this is part of the debounce
 
-        # if backlight is off, then turn on only for this press
-        if self.backlightTimer > self.backlightOffTime:
-            self.buttonState = 99
-        else:
-            if buttonPin == self.pinButton1:
-                self.buttonState = 1
-            elif buttonPin == self.pinButton2:
-                self.buttonState = 2
-            elif buttonPin == self.pinButton3:
-                self.buttonState = 3
-            else:
-                self.buttonState = 0
-
-        if self.debugON == True: print('button ', self.buttonState, ' pressed')
-
-    def buttonCheckRelease(self):
-        '''sets self.buttonState to 0 only if all buttons are not pressed
-        - this is the only place self.buttonState can be set to 0
-        - self.buttonState is the button pressed
+    def nextButton(self, repeat=False):
+        '''next button pressed (1-3) from the button events, 0 if none
+        - 99 is any button when the backlight is off
+        - repeat: a held button presses again (long press and repeat events)
         '''
-        time.sleep(.01) # this is part of the debounce
-
-        button1 = GPIO.input(self.pinButton1)
-        button2 = GPIO.input(self.pinButton2)
-        button3 = GPIO.input(self.pinButton3)
-
-        if button1 == False and button2 == False and button3 == False:
-            self.buttonState = 0
-            self.buttonAction = 0
-
+        # the screen loops poll here, frame based displays catch up
+        self.mylcd.flush()
+
+        event = self.buttons.get()
+        while event is not None:
+            if event.kind == buttonInput.PRESS or (repeat is True and event.kind in (buttonInput.LONG_PRESS, buttonInput.REPEAT)):
+                if self.debugON == True: print('button ', event.button, event.kind)
+                # if backlight is off, then turn on only for this press
+                if self.backlightTimer > self.backlightOffTime:
+                    return 99
+                return event.button
+            event = self.buttons.get()
+        return 0
 
 
 if __name__ == '__main__':